@@ -1,10 +1,27 @@
+import os
+import time
+from functools import partial
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-from utils.data_loader import load_data
-from utils.stats import get_extended_stats, detect_outliers, get_correlations
-from visualizations.plots import plot_histogram, plot_boxplot, plot_scatter, plot_line, plot_bar
-from components.custom_metrics import compute_custom_metric, export_result
+import numpy as np
+from utils.data_loader import acquire_parsed, detect_format, read_column_names
+from utils.imputation import NUMERIC_ACTIONS, CATEGORICAL_ACTIONS, GROUP_ACTIONS, DROP, KEEP, MEAN, cached_impute
+from utils.export import EXPORT_FORMATS, serialize_frame
+from utils.cache import dataframe_fingerprint
+from utils.history import History
+from utils.dataset import DiskDataset
+from utils.filters import FilterIndex
+from utils.categorical import CategoricalIndex
+from utils.table_view import PAGE_SIZES, page_count, page_positions, apply_patches, patch_delta
+from utils.stats import cached_extended_stats, cached_outliers, cached_correlations, cached_top_pairs, get_cache_info, record_delta
+from utils.profiling import MemoryTracing, TraceLog, chrome_trace, record_payload, span, start_trace, stop_profiling
+
+# Copy-on-write: срезы и присваивания не копируют данные, пока их не изменят,
+# поэтому состояния в сессии и шаги истории разделяют неизменённые столбцы
+pd.set_option("mode.copy_on_write", True)
+
+# Модули отдельных вкладок (plotly, пул рабочих процессов, сводные таблицы) импортируются
+# внутри своих вкладок: первый показ страницы загрузки в новом процессе их не ждёт
 
 # Настройка страницы
 st.set_page_config(page_title="EDA Assistant", layout="wide")
@@ -16,114 +33,327 @@ if "df" not in st.session_state:
     st.session_state['df'] = None
 if "original_df" not in st.session_state:
     st.session_state['original_df'] = None
+if "dataset" not in st.session_state:
+    st.session_state['dataset'] = None  # Набор данных на диске (режим больших данных)
+if "progressive_job" not in st.session_state:
+    st.session_state['progressive_job'] = None  # Прогрессивная загрузка: оценки по выборке до точного расчёта
 if "history" not in st.session_state:
-    st.session_state.history = []
-    st.session_state.current_step = -1
+    st.session_state.history = None
+if "append_batches" not in st.session_state:
+    st.session_state['append_batches'] = []  # Добавленные пакеты (разобранные) и журнал их добавления
+    st.session_state['batch_log'] = []
 if "filters_applied" not in st.session_state:
     st.session_state.filters_applied = False
 if "prev_stats" not in st.session_state:
     st.session_state['prev_stats'] = None
 if "user_result" not in st.session_state:
     st.session_state['user_result'] = None
+if "trace_log" not in st.session_state:
+    st.session_state['trace_log'] = TraceLog()  # Замеры последних перезапусков для панели диагностики
+
+# Профилирование перезапуска: включается в панели «Диагностика» на боковой панели.
+# tracemalloc общий для всех сессий: сессия держит на него ссылку, пока учитывает память
+track_memory = bool(st.session_state.get('profiling_enabled') and st.session_state.get('profiling_memory'))
+memory_tracing = st.session_state.get('memory_tracing')
+if track_memory and memory_tracing is None:
+    st.session_state['memory_tracing'] = MemoryTracing()
+elif not track_memory and memory_tracing is not None:
+    memory_tracing.release()
+    st.session_state['memory_tracing'] = None
+if st.session_state.get('profiling_enabled'):
+    st.session_state['trace_log'].add(start_trace(time.strftime("%H:%M:%S"), track_memory=track_memory))
+else:
+    stop_profiling()
 
 # --- Функции истории изменений ---
-def save_state(df):
-    st.session_state.history = st.session_state.history[:st.session_state.current_step + 1]
-    st.session_state.history.append(df.copy())
-    st.session_state.current_step += 1
+def save_state(df, label="", changed=None):
+    st.session_state.history.push(df, label, changed=changed)
     st.session_state['df'] = df
 
 def undo_action():
-    if st.session_state.current_step > 0:
-        st.session_state.current_step -= 1
-        st.session_state['df'] = st.session_state.history[st.session_state.current_step]
+    previous_df = st.session_state.history.undo()
+    if previous_df is not None:
+        st.session_state['df'] = previous_df
         st.success("Действие отменено.")
         st.rerun()  # Перерисовываем интерфейс после отмены
     else:
         st.warning("Нет действий для отмены.")
 
+def redo_action():
+    next_df = st.session_state.history.redo()
+    if next_df is not None:
+        st.session_state['df'] = next_df
+        st.success("Действие повторено.")
+        st.rerun()
+    else:
+        st.warning("Нет действий для повтора.")
+
+def lazy_download(label, key, token, make_payload, choose_format=True):
+    """
+    Кнопка скачивания, которая сериализует данные только по нажатию «Подготовить файл».
+    token описывает содержимое: при его смене подготовленный файл считается устаревшим.
+    make_payload(fmt) возвращает (байты, имя файла, MIME-тип).
+    """
+    fmt = EXPORT_FORMATS[st.selectbox(f"Формат: {label}", list(EXPORT_FORMATS), key=f"format_{key}")] if choose_format else None
+    token = (token, fmt)
+    state_key = f"download_{key}"
+    prepared = st.session_state.get(state_key)
+    if prepared is not None and prepared["token"] != token:
+        prepared = st.session_state[state_key] = None
+    if prepared is None and st.button(f"Подготовить файл: {label}", key=f"prepare_{key}"):
+        with span(f"Подготовка файла: {label}", "export"):
+            data, file_name, mime = make_payload(fmt)
+        prepared = st.session_state[state_key] = {"token": token, "data": data, "file_name": file_name, "mime": mime}
+    if prepared is not None:
+        st.download_button(
+            label=label,
+            data=record_payload(f"Файл: {label}", prepared["data"]),
+            file_name=prepared["file_name"],
+            mime=prepared["mime"],
+            key=f"button_{key}"
+        )
+
+def get_categorical_index(frame):
+    """Словарный индекс нечисловых столбцов фрейма; в сессии хранятся индексы двух последних фреймов."""
+    indexes = [index for index in st.session_state.get('categorical_indexes', []) if index.matches(frame)]
+    if indexes:
+        return indexes[0]
+    index = CategoricalIndex(frame)
+    st.session_state['categorical_indexes'] = [index] + st.session_state.get('categorical_indexes', [])[:1]
+    return index
+
+def get_filter_index(base_df):
+    # Индекс строится один раз на датасет и хранит маски фильтров между перезапусками
+    index = st.session_state.get('filter_index')
+    if index is None or not index.matches(base_df):
+        index = st.session_state['filter_index'] = FilterIndex(base_df, get_categorical_index(base_df))
+    return index
+
 def apply_filters_and_sort(base_df, filters, sort_config):
-    filtered_df = base_df.copy()
-    
-    # Применение фильтров
-    for col, config in filters.items():
-        if col in filtered_df.columns:
-            if pd.api.types.is_numeric_dtype(filtered_df[col]):
-                # Числовой фильтр: границы min/max
-                min_val = config.get('min')
-                max_val = config.get('max')
-                mask = pd.Series(True, index=filtered_df.index)  # Маску создаем с правильным индексом
-                if min_val is not None:
-                    mask &= filtered_df[col] >= min_val
-                if max_val is not None:
-                    mask &= filtered_df[col] <= max_val
-                filtered_df = filtered_df[mask]
-            else:
-                # Категориальный фильтр: multiselect
-                selected_values = config.get('selected', [])
-                if selected_values:
-                    filtered_df = filtered_df[filtered_df[col].isin(selected_values)]
-    
-    # Применение сортировки
-    if sort_config:
-        sort_col = sort_config.get('column')
-        sort_order = sort_config.get('order', 'asc')
-        if sort_col in filtered_df.columns and pd.api.types.is_numeric_dtype(filtered_df[sort_col]):
-            ascending = sort_order == 'asc'
-            filtered_df = filtered_df.sort_values(by=sort_col, ascending=ascending)
-    
-    return filtered_df
+    return get_filter_index(base_df).apply(filters, sort_config)
+
+def min_filtered(data, filter_col, filter_value):
+    """Строки, где filter_col >= filter_value; для набора на диске фильтр ленивый."""
+    if filter_col is None or filter_value is None:
+        return data
+    if isinstance(data, DiskDataset):
+        return data.where({filter_col: {'min': filter_value, 'max': None}})
+    return data[data[filter_col] >= filter_value]
+
+def data_token(data):
+    """Ключ содержимого данных для подготовленных файлов и кэшей."""
+    return data.token() if isinstance(data, DiskDataset) else dataframe_fingerprint(data)
+
+def drop_progressive_job():
+    """Останавливает прогрессивную загрузку (её файл удаляется, если набор ещё не передан в хранилище)."""
+    job = st.session_state['progressive_job']
+    if job is not None and st.session_state.get('dataset_lease') is None:
+        job.cancel()
+    st.session_state['progressive_job'] = None
+
+def open_disk_dataset(source, file_format, columns):
+    """Переписывает файл в набор на диске (один раз на файл и выбор столбцов) и делает его текущим."""
+    key = (getattr(source, "name", source), getattr(source, "size", None), tuple(columns))
+    if st.session_state['dataset'] is not None and st.session_state.get('dataset_source') == key:
+        return st.session_state['dataset']
+    start = time.perf_counter()
+    # Набор общий для сессий: файл с тем же содержимым переписывается на диск один раз
+    lease = DiskDataset.acquire(source, file_format, columns or None)
+    drop_progressive_job()
+    release_dataset()
+    st.session_state['dataset_lease'] = lease
+    st.session_state['dataset'] = dataset = lease.value
+    st.session_state['dataset_source'] = key
+    st.session_state['dataset_seconds'] = time.perf_counter() - start
+    reset_loaded_state()
+    return dataset
+
+def start_progressive_load(source, file_format, columns, strata):
+    """
+    Запускает фоновую загрузку файла на диск с выборкой (один раз на файл, столбцы и страты).
+    Пока она идёт, вкладки показывают оценки по выборке; текущий набор заменяется по готовности.
+    """
+    key = (getattr(source, "name", source), getattr(source, "size", None), tuple(columns), strata)
+    job = st.session_state['progressive_job']
+    if job is not None and st.session_state.get('progressive_source') == key:
+        return job
+    from utils.progressive import ProgressiveLoad
+    drop_progressive_job()
+    release_dataset()
+    st.session_state['progressive_job'] = job = ProgressiveLoad(source, file_format, columns or None, strata=strata)
+    st.session_state['progressive_source'] = key
+    st.session_state['dataset_source'] = None
+    reset_loaded_state()
+    st.rerun()  # состояние загрузки показывается вверху страницы со следующего перезапуска
+
+def release_dataset():
+    """Освобождает текущий набор на диске: общий — ссылкой в хранилище, собственный — удалением файла."""
+    lease = st.session_state.get('dataset_lease')
+    if lease is not None:
+        lease.release()
+    elif st.session_state['dataset'] is not None:
+        st.session_state['dataset'].remove()
+    st.session_state['dataset_lease'] = None
+    st.session_state['dataset'] = None
+
+def hold_parsed(lease):
+    """Ссылка сессии на разобранный файл в общем хранилище (прежняя освобождается)."""
+    previous = st.session_state.get('parsed_lease')
+    st.session_state['parsed_lease'] = lease
+    if previous is not None:
+        previous.release()
+
+def reset_loaded_state():
+    """Сбрасывает таблицу в памяти и результаты, привязанные к прежним данным."""
+    hold_parsed(None)
+    st.session_state['df'] = None
+    st.session_state['original_df'] = None
+    st.session_state['categorical_indexes'] = []
+    st.session_state.history = None
+    st.session_state['prev_stats'] = None
+    st.session_state['user_result'] = None
 
 def reset_filters():
     if st.session_state['original_df'] is not None:
-        st.session_state['df'] = st.session_state['original_df'].copy()
+        st.session_state['df'] = st.session_state['original_df']
         st.session_state.filters_applied = False
-        st.session_state.history = [st.session_state['df'].copy()]  # Сброс истории к оригиналу
-        st.session_state.current_step = 0
+        st.session_state.history = History(st.session_state['df'])  # Сброс истории к оригиналу
         st.success("Все фильтры сброшены, возвращена исходная таблица.")
         st.rerun()
 
 def handle_missing_values(df, missing_info):
+    """Виджеты выбора обработки пропусков; возвращает обработанный фрейм и выбранные действия."""
     # Проверяем наличие пропусков
     total_missing = missing_info["total_missing"]
     if total_missing == 0:
-        return df
+        return df, (None, None, None)
 
     st.warning(f"Обнаружено {total_missing} пропусков в датасете. Настройте обработку ниже.")
     
     # Разделяем столбцы на числовые и категориальные
     numeric_cols = missing_info["numeric_cols"]
     categorical_cols = missing_info["categorical_cols"]
+    numeric_action = categorical_action = group_col = None
 
     # Обработка для числовых столбцов
     if numeric_cols:
         with st.expander("Обработка пропусков в числовых столбцах", expanded=True):
             st.write(f"Числовые столбцы: {', '.join(numeric_cols)}")
-            numeric_action = st.selectbox("Действие для числовых пропусков", 
-                                        ["Удалить строки с пропусками", "Оставить пропуски", 
-                                         "Заменить на среднее", "Заменить на медиану", "Заменить на моду"])
-            
-            if numeric_action == "Удалить строки с пропусками":
-                df = df.dropna(subset=numeric_cols)
-            elif numeric_action == "Заменить на среднее":
-                df[numeric_cols] = df[numeric_cols].fillna(df[numeric_cols].mean())
-            elif numeric_action == "Заменить на медиану":
-                df[numeric_cols] = df[numeric_cols].fillna(df[numeric_cols].median())
-            elif numeric_action == "Заменить на моду":
-                df[numeric_cols] = df[numeric_cols].fillna(df[numeric_cols].mode().iloc[0])
+            numeric_action = st.selectbox("Действие для числовых пропусков", NUMERIC_ACTIONS)
+            if numeric_action in GROUP_ACTIONS:
+                # Группы — по категориальному столбцу; при их отсутствии доступны все остальные
+                group_options = categorical_cols or [col for col in df.columns if col not in numeric_cols]
+                if not group_options:
+                    group_options = list(df.columns)
+                group_col = st.selectbox("Столбец групп", group_options)
 
     # Обработка для категориальных столбцов
     if categorical_cols:
         with st.expander("Обработка пропусков в категориальных столбцах", expanded=True):
             st.write(f"Категориальные столбцы: {', '.join(categorical_cols)}")
-            categorical_action = st.selectbox("Действие для категориальных пропусков", 
-                                            ["Оставить пропуски", "Удалить строки с пропусками"])
-            
-            if categorical_action == "Удалить строки с пропусками":
-                df = df.dropna(subset=categorical_cols)
+            categorical_action = st.selectbox("Действие для категориальных пропусков", CATEGORICAL_ACTIONS)
 
+    # Результат кэшируется по файлу и выбору: смена действия не перечитывает файл
+    df = cached_impute(df, missing_info, numeric_action, categorical_action, group_col)
     st.success("Обработка пропусков завершена.")
-    return df
+    return df, (numeric_action, categorical_action, group_col)
+
+def append_batch(name, batch, widen, actions):
+    """
+    Добавляет разобранный пакет в конец исходной и текущей таблиц. Пропуски пакета
+    обрабатываются теми же действиями: среднее — по всем загруженным данным, остальные
+    статистики заполнения — по пакету. Профиль пропусков, индексы фильтров, словари
+    и состояние статистики дополняются только строками пакета. Возвращает число строк,
+    добавленных в исходную и в текущую таблицу.
+    """
+    from utils.append import append_rows, batch_profile, merge_profile
+    from utils.imputation import impute_missing
+    base, current = st.session_state['original_df'], st.session_state['df']
+    profile = batch_profile(batch)
+    merged = st.session_state['missing_profile'] = merge_profile(st.session_state['missing_profile'], profile)
+    if profile["total_missing"]:
+        # Среднее — по суммам всех загруженных данных, как при полной перезагрузке
+        batch = impute_missing(batch, dict(profile, sums=merged["sums"]), *actions)
+    new_base = append_rows(base, batch, widen)
+    record_delta(base, new_base, {"added": len(batch)})
+    categorical = [index for index in st.session_state.get('categorical_indexes', []) if index.matches(base)]
+    if categorical:
+        categorical = categorical[0].extend(new_base, batch)
+        st.session_state['categorical_indexes'] = [categorical]
+    filter_index = st.session_state.get('filter_index')
+    if filter_index is not None and filter_index.matches(base):
+        st.session_state['filter_index'] = filter_index.extend(new_base, batch, categorical or None)
+    st.session_state['original_df'] = new_base
+    if current is base:
+        new_current, shown = new_base, len(batch)
+    else:
+        new_current, shown = append_to_view(current, new_base, batch, widen)
+    # Склейка уже создала новые массивы — шаг истории их не копирует
+    st.session_state.history.push(new_current, f"Добавлен пакет {name}", copy=False)
+    st.session_state['df'] = new_current
+    return len(batch), shown
+
+def append_to_view(current, new_base, batch, widen):
+    """
+    Добавляет строки пакета в текущую таблицу, если она отличается от исходной (правки,
+    фильтры). При применённых фильтрах добавляются только прошедшие их строки (маски
+    дополненного индекса фильтров), затем строки заново упорядочиваются по сортировке.
+    Возвращает новую таблицу и число добавленных в неё строк.
+    """
+    from utils.append import append_rows
+    applied = st.session_state.get('applied_filters') if st.session_state.filters_applied else None
+    filters, sort_config = applied or ({}, {})
+    start = len(new_base) - len(batch)
+    mask = get_filter_index(new_base).filter_mask(filters) if filters else None
+    # Строки пакета с теми же метками индекса, что и в исходной таблице
+    rows = new_base.iloc[start:] if mask is None else new_base.iloc[start:][mask[start:]]
+    rows = rows[[col for col in rows.columns if col in current.columns]]
+    widen = {col: dtype for col, dtype in widen.items() if col in current.columns}
+    appended = append_rows(current, rows, widen, renumber=False)
+    record_delta(current, appended, {"added": len(rows)})
+    sort_col = sort_config.get('column')
+    if sort_col not in appended.columns or not pd.api.types.is_numeric_dtype(appended[sort_col]):
+        return appended, len(rows)
+    order = FilterIndex(appended).sorted_positions(sort_col, sort_config.get('order', 'asc') == 'asc')
+    view = appended.take(order)
+    record_delta(appended, view, {"reordered": True})
+    return view, len(rows)
+
+def replay_batches(actions):
+    """Повторно добавляет ранее добавленные пакеты (после смены обработки пропусков) без разбора файлов."""
+    from utils.append import conform_batch
+    for entry in st.session_state['append_batches']:
+        batch, widen = conform_batch(st.session_state['original_df'], entry["batch"])
+        append_batch(entry["name"], batch, widen, actions)
+
+# --- Прогрессивная загрузка: после точного прохода набор на диске заменяет выборку ---
+progressive_job = st.session_state['progressive_job']
+if progressive_job is not None:
+    from utils.progressive import DONE, FAILED
+    if progressive_job.phase == DONE and st.session_state['dataset'] is None:
+        # Готовый набор переходит в общее хранилище (если там уже есть такой же — берётся он)
+        lease = DiskDataset.adopt(progressive_job.source, progressive_job.dataset, progressive_job.fmt, progressive_job.columns)
+        st.session_state['dataset_lease'] = lease
+        st.session_state['dataset'] = lease.value
+        st.session_state['dataset_source'] = st.session_state['progressive_source'][:3]
+        st.session_state['dataset_seconds'] = progressive_job.load_seconds
+# Выборку показываем, пока точные результаты не готовы
+estimating = progressive_job is not None and progressive_job.estimating and progressive_job.rows_read > 0
+
+@st.fragment(run_every=1.0)
+def progressive_status():
+    """Состояние фоновой загрузки; страница перезапускается при смене этапа или удвоении прочитанных строк."""
+    job = st.session_state['progressive_job']
+    if job is None:
+        return
+    st.caption(job.status())
+    phase, rows = st.session_state.get('progressive_seen', (None, 0))
+    if job.phase != phase or job.rows_read >= 2 * max(rows, 1):
+        st.rerun()
+
+if progressive_job is not None and progressive_job.estimating:
+    st.session_state['progressive_seen'] = (progressive_job.phase, progressive_job.rows_read)
+    progressive_status()
 
 # --- Главное меню ---
 menu = st.sidebar.radio(
@@ -134,26 +364,181 @@ menu = st.sidebar.radio(
 # --- Загрузка данных ---
 if menu == "📂 Загрузка данных":
     st.header("Загрузка данных")
-    uploaded_file = st.file_uploader("Загрузите CSV файл", type=["csv"])
-    if uploaded_file is not None:
-        df, missing_info = load_data(uploaded_file)
+    on_disk = st.checkbox(
+        "Хранить данные на диске (режим больших данных)",
+        help="Файл переписывается в Arrow IPC на локальном диске и читается по пакетам через memory map: "
+             "в память попадают только видимая страница, выборки и агрегаты."
+    )
+    uploaded_file = st.file_uploader("Загрузите CSV, Parquet или Feather файл", type=["csv", "parquet", "feather", "arrow"])
+    server_path = st.text_input("Или путь к файлу на сервере") if on_disk else ""
+    progressive = on_disk and st.checkbox(
+        "Прогрессивный режим: сразу показывать оценки по выборке",
+        help="Файл читается в фоне; пока он загружается, статистика, выбросы, корреляции и графики "
+             "считаются по резервуарной выборке с доверительными интервалами и заменяются точными по готовности."
+    )
+    source = uploaded_file if uploaded_file is not None else (server_path or None)
+    if source is not None and isinstance(source, str) and not os.path.isfile(source):
+        st.error("Файл не найден.")
+        source = None
+    if source is not None:
+        file_format = detect_format(source)
+        engine = st.selectbox("Движок чтения CSV", ["c", "pyarrow"], help="pyarrow читает файл потоково и многопоточно") if file_format == "csv" and not on_disk else None
+        all_columns = read_column_names(source, file_format)
+        columns = st.multiselect("Загружаемые столбцы", all_columns, default=all_columns)
+        if progressive:
+            strata = st.selectbox("Стратифицировать выборку по столбцу", ["Нет"] + columns,
+                                  help="Каждое значение столбца представлено в выборке пропорционально своей доле, "
+                                       "редкие значения — хотя бы одной строкой.")
+            from utils.progressive import DONE, FAILED
+            job = start_progressive_load(source, file_format, columns, strata if strata != "Нет" else None)
+            if job.phase == DONE:
+                st.success(f"Файл загружен за {job.load_seconds:.2f} с, точные результаты посчитаны "
+                           f"за {job.exact_seconds:.2f} с.")
+            elif job.phase == FAILED:
+                st.error(job.status())
+            else:
+                st.info("Файл загружается в фоне — вкладки уже показывают оценки по выборке.")
+            source = None
+        elif on_disk:
+            try:
+                dataset = open_disk_dataset(source, file_format, columns)
+                missing = sum(dataset.null_counts().values())
+                st.caption(f"На диске {dataset.num_rows:,} строк, {dataset.nbytes_on_disk() / 1024 ** 2:.1f} МБ, "
+                           f"преобразование за {st.session_state['dataset_seconds']:.2f} с")
+                if missing:
+                    st.info(f"В данных {missing} пропусков; в режиме данных на диске они сохраняются как есть.")
+                st.success("Файл сохранён на диск, данные читаются по пакетам.")
+            except Exception as e:
+                st.error(f"Ошибка при сохранении данных на диск: {e}")
+            source = None
+    if source is not None:
+        # Разобранный файл общий для сессий; сессия держит ссылку, пока работает с ним
+        lease = acquire_parsed(source, engine=engine, columns=columns or None, fmt=file_format)
+        df = missing_info = None
+        if lease is not None:
+            hold_parsed(lease)
+            df, missing_info = lease.value.view(lease.key, not lease.built)
         if df is not None:
+            report = missing_info["load_report"]
+            peak = f", пик памяти процесса {report['peak_rss_mb']:.0f} МБ" if report["peak_rss_mb"] is not None else ""
+            cached = " (из кэша разбора, файл не перечитывался)" if missing_info["from_cache"] else ""
+            st.caption(f"Прочитано {report['rows']} строк за {report['seconds']:.2f} с "
+                       f"({report['rows_per_sec']:,.0f} строк/с, движок {report['engine']}), "
+                       f"в памяти {report['memory_mb']:.1f} МБ{peak}{cached}")
             # Проверяем и обрабатываем пропуски
-            df = handle_missing_values(df, missing_info)
-            st.session_state['df'] = df.copy()
-            st.session_state['original_df'] = df.copy()  # Исходная таблица
-            st.session_state.history = [df.copy()]
-            st.session_state.current_step = 0
-            st.session_state.filters_applied = False
-            st.session_state['prev_stats'] = None  # Сброс предыдущей статистики
-            st.session_state['user_result'] = None  # Сброс пользовательского результата
-            st.success("Файл загружен и обработан (пропуски устранены).")
+            df, actions = handle_missing_values(df, missing_info)
+            # Состояние сессии сбрасывается только для нового файла или другой обработки пропусков,
+            # а не на каждом перезапуске страницы (правки и история сохраняются)
+            ingest_key = (missing_info["ingest_key"], actions)
+            if st.session_state.get('ingest_key') != ingest_key or st.session_state['df'] is None:
+                previous_key = st.session_state.get('ingest_key')
+                drop_progressive_job()
+                release_dataset()
+                st.session_state['df'] = df
+                st.session_state['original_df'] = df  # Исходная таблица (copy-on-write, без копии)
+                st.session_state['categorical_indexes'] = []
+                get_categorical_index(df)  # Словари нечисловых столбцов — один раз при загрузке
+                st.session_state.history = History(df)
+                st.session_state.filters_applied = False
+                st.session_state['prev_stats'] = None  # Сброс предыдущей статистики
+                st.session_state['user_result'] = None  # Сброс пользовательского результата
+                st.session_state['ingest_key'] = ingest_key
+                st.session_state['missing_profile'] = {key: missing_info[key] for key in ("total_missing", "missing_per_col", "sums")}
+                if previous_key is not None and previous_key[0] == ingest_key[0] and st.session_state.get('append_batches'):
+                    # Тот же файл с другой обработкой пропусков: добавленные пакеты сохраняются
+                    replay_batches(actions)
+                    st.info(f"Добавленные пакеты ({len(st.session_state['append_batches'])}) применены заново.")
+                else:
+                    st.session_state['append_batches'] = []
+                    st.session_state['batch_log'] = []
+                st.success("Файл загружен и обработан (пропуски устранены).")
+            else:
+                st.success("Файл уже загружен — текущая таблица и история изменений сохранены.")
+
+            # Добавление пакетов: разбирается только новый файл, остальное дополняется по его строкам
+            with st.expander("➕ Добавить пакет данных", expanded=bool(st.session_state['batch_log'])):
+                batch_file = st.file_uploader("Файл с теми же столбцами (CSV, Parquet или Feather)",
+                                              type=["csv", "parquet", "feather", "arrow"], key="append_file")
+                per_batch = [action for action in actions[:2] if action not in (None, DROP, KEEP, MEAN)]
+                if per_batch:
+                    st.caption(f"Пропуски пакетов заполняются по строкам самого пакета ({', '.join(per_batch)}); "
+                               "среднее считается по всем загруженным данным.")
+                if batch_file is not None and st.button("Добавить пакет"):
+                    from utils.append import read_batch
+                    try:
+                        start = time.perf_counter()
+                        batch, widen, report = read_batch(batch_file, st.session_state['original_df'], engine=engine or "c")
+                        rows, shown = append_batch(batch_file.name, batch, widen, actions)
+                        st.session_state['append_batches'].append({"name": batch_file.name, "batch": batch})
+                        total = time.perf_counter() - start
+                        st.session_state['batch_log'].append({
+                            "Пакет": batch_file.name, "Строк": report["rows"], "Добавлено": rows,
+                            "В текущей таблице": shown,
+                            "Разбор, с": report["seconds"], "Всего, с": total,
+                            "Строк/с": report["rows"] / total if total > 0 else float("inf"),
+                            "МБ": report["memory_mb"]
+                        })
+                        st.success(f"Пакет добавлен: {rows:,} строк за {total:.2f} с "
+                                   f"({report['rows'] / max(total, 1e-9):,.0f} строк/с).")
+                        if shown != rows:
+                            st.info(f"Применённым фильтрам соответствуют {shown:,} строк пакета — они добавлены в текущую таблицу.")
+                    except Exception as e:
+                        st.error(f"Ошибка при добавлении пакета: {e}")
+                if st.session_state['batch_log']:
+                    profile = st.session_state['missing_profile']
+                    st.caption(f"Строк в таблице: {len(st.session_state['original_df']):,}; "
+                               f"пропусков в загруженных данных (до обработки): {profile['total_missing']:,}")
+                    st.dataframe(pd.DataFrame(st.session_state['batch_log']), hide_index=True)
 
 # --- Работа с таблицей ---
-elif st.session_state['df'] is not None:
-    df = st.session_state['df']
+elif st.session_state['df'] is not None or st.session_state['dataset'] is not None or estimating:
+    dataset = st.session_state['dataset']
+    # Прогрессивная загрузка: до точного расчёта вкладки работают с выборкой (оценки)
+    sample = progressive_job.sample() if estimating and dataset is None else None
+    if sample is not None:
+        sample_total = progressive_job.total_rows()
+    # data — источник расчётов (DataFrame или набор на диске); df — фрейм для виджетов
+    # (у набора на диске — пустой фрейм с типами столбцов, данные в память не читаются)
+    data = dataset if dataset is not None else (sample if sample is not None else st.session_state['df'])
+    df = dataset.meta if dataset is not None else data
+
+    if menu == "📊 Таблица" and sample is not None:
+        st.header("Таблица (выборка)")
+        st.write("Файл ещё загружается: показана случайная выборка строк. Фильтры, сортировка и "
+                 "постраничный просмотр всех строк станут доступны после загрузки.")
+        st.caption(f"Выборка {len(sample):,} строк из {sample_total:,} прочитанных")
+        st.dataframe(record_payload("Выборка", sample.head(1000)), use_container_width=True)
+
+    elif menu == "📊 Таблица" and dataset is not None:
+        st.header("Таблица (данные на диске)")
+        st.write("Просмотр без редактирования: с диска читается только текущая страница.")
+        filters = {}
+        with st.expander("Фильтры и сортировка"):
+            for col in dataset.columns:
+                if pd.api.types.is_numeric_dtype(df[col]):
+                    min_val = st.number_input(f"Минимальное значение для {col}", value=None, key=f"disk_min_{col}")
+                    max_val = st.number_input(f"Максимальное значение для {col}", value=None, key=f"disk_max_{col}")
+                    filters[col] = {'min': min_val, 'max': max_val}
+                else:
+                    selected = st.multiselect(f"Выберите значения для {col}", options=dataset.unique_values(col), key=f"disk_multiselect_{col}")
+                    filters[col] = {'selected': selected}
+            numeric_columns = df.select_dtypes(include=['number']).columns.tolist()
+            sort_col = st.selectbox("Столбец для сортировки", ["Нет"] + numeric_columns, key="disk_sort_col")
+            sort_order = st.radio("Направление сортировки", options=["по возрастанию", "по убыванию"], key="disk_sort_order")
+        sort_config = {'column': sort_col, 'order': 'asc' if sort_order == "по возрастанию" else 'desc'} if sort_col != "Нет" else {}
+        view = dataset.where(filters)
+        total_rows = len(view)
+        col1, col2 = st.columns(2)
+        with col1:
+            page_size = st.selectbox("Строк на странице", [50, 100, 500, 1000], index=1)
+        n_pages = max(1, -(-total_rows // page_size))
+        with col2:
+            page_number = st.number_input("Страница", min_value=1, max_value=n_pages, value=1)
+        st.caption(f"Строк после фильтров: {total_rows:,} из {dataset.num_rows:,}, страниц: {n_pages}")
+        st.dataframe(record_payload("Страница таблицы", view.page((page_number - 1) * page_size, page_size, sort_config)),
+                     use_container_width=True)
 
-    if menu == "📊 Таблица":
+    elif menu == "📊 Таблица":
         st.header("Редактируемая таблица")
         st.write("Редактируйте таблицу или удалите столбец с помощью кнопки ниже.")
 
@@ -192,7 +577,11 @@ elif st.session_state['df'] is not None:
                         max_val = st.number_input(f"Максимальное значение для {col}", value=None, key=f"max_{col}")
                         st.session_state.filters[col] = {'min': min_val if min_val else None, 'max': max_val if max_val else None}
                     else:
-                        selected = st.multiselect(f"Выберите значения для {col}", options=original_df_for_filters[col].unique(), default=st.session_state.filters[col]['selected'], key=f"multiselect_{col}")
+                        categorical_index = get_categorical_index(original_df_for_filters)
+                        current = st.session_state.filters[col]['selected']
+                        if categorical_index[col].truncated:
+                            st.caption(f"Уникальных значений {categorical_index[col].cardinality:,}: показаны самые частые.")
+                        selected = st.multiselect(f"Выберите значения для {col}", options=categorical_index.options(col, current), default=current, key=f"multiselect_{col}")
                         st.session_state.filters[col] = {'selected': selected}
             
             # Сортировка (применяем к original_df)
@@ -214,9 +603,16 @@ elif st.session_state['df'] is not None:
                 if st.button("Применить фильтры и сортировку"):
                     filtered_sorted_df = apply_filters_and_sort(st.session_state['original_df'], st.session_state.filters, st.session_state.sort_config)
                     if not filtered_sorted_df.empty:
-                        st.session_state['df'] = filtered_sorted_df.copy()
+                        base_df = st.session_state['original_df']
+                        if base_df.index.is_unique:
+                            kept = base_df.index.get_indexer(filtered_sorted_df.index)
+                            dropped = np.setdiff1d(np.arange(len(base_df)), kept)
+                            record_delta(base_df, filtered_sorted_df, {"deleted": dropped, "reordered": True})
                         st.session_state.filters_applied = True
-                        save_state(st.session_state['df'])
+                        # Применённые фильтры (виджеты могут измениться без применения) — для новых пакетов
+                        st.session_state['applied_filters'] = ({col: dict(config) for col, config in st.session_state.filters.items()},
+                                                               dict(st.session_state.sort_config))
+                        save_state(filtered_sorted_df, "Фильтры и сортировка")
                         st.success("Фильтры и сортировка применены. Новая таблица стала основной.")
                         st.rerun()
                     else:
@@ -226,16 +622,41 @@ elif st.session_state['df'] is not None:
                 if st.button("Сбросить все фильтры"):
                     reset_filters()
 
-        # Редактируемая таблица (показываем основную или отфильтрованную)
-        edited_df = st.data_editor(
-            preview_df,
+        # Редактируемая таблица (показываем основную или отфильтрованную) окном:
+        # в браузер уходит только текущая страница, сортировка просмотра — на сервере
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            page_size = st.selectbox("Строк на странице", PAGE_SIZES, index=1, key="page_size")
+        with col2:
+            view_sort = st.selectbox("Сортировать просмотр по", ["Нет"] + preview_df.select_dtypes(include=['number']).columns.tolist(), key="view_sort")
+        with col3:
+            view_order = st.radio("Порядок просмотра", ["по возрастанию", "по убыванию"], horizontal=True, key="view_order")
+        order = None
+        if view_sort != "Нет":
+            view_index = st.session_state.get('view_index')
+            if view_index is None or not view_index.matches(preview_df):
+                view_index = st.session_state['view_index'] = FilterIndex(preview_df)
+            order = view_index.sorted_positions(view_sort, ascending=view_order == "по возрастанию")
+        n_pages = page_count(len(preview_df), page_size)
+        page_number = st.number_input("Страница", min_value=1, max_value=n_pages, value=1, key="page_number")
+        positions = page_positions(len(preview_df), page_number, page_size, order)
+        st.caption(f"Страница {page_number} из {n_pages}, всего {len(preview_df):,} строк")
+        # Правки читаются из состояния виджета как патчи ячеек; после применения ключ
+        # меняется, чтобы редактор открылся заново уже на обновлённых данных
+        editor_key = f"editable_table_{st.session_state.get('editor_version', 0)}"
+        st.data_editor(
+            record_payload("Страница таблицы", preview_df.iloc[positions]),
             num_rows="dynamic",
             use_container_width=True,
-            key="editable_table"
+            key=editor_key
         )
-        if not edited_df.equals(preview_df):
-            save_state(edited_df)
-            st.success("Изменения в таблице сохранены.")
+        patched_df, changed_cols, patch_summary = apply_patches(preview_df, positions, st.session_state.get(editor_key) or {})
+        if patch_summary:
+            # Статистика переносится по дельте правок, а не пересчитывается целиком
+            record_delta(preview_df, patched_df, patch_delta(positions, st.session_state.get(editor_key) or {}))
+            save_state(patched_df, "Правка таблицы", changed_cols)
+            st.session_state['editor_version'] = st.session_state.get('editor_version', 0) + 1
+            st.success(f"Изменения в таблице сохранены ({patch_summary}).")
 
         # Удаление столбца (работает на основной таблице)
         st.write("Удалить столбец")
@@ -243,18 +664,41 @@ elif st.session_state['df'] is not None:
         if st.button("Удалить выбранный столбец"):
             if column_to_delete in df.columns:
                 edited_df = df.drop(columns=[column_to_delete])
-                save_state(edited_df)
-                st.session_state['original_df'] = edited_df.copy()  # Обновляем original_df после удаления
+                record_delta(df, edited_df, {"columns": set()})
+                save_state(edited_df, f"Удалён столбец '{column_to_delete}'")
+                st.session_state['original_df'] = edited_df  # Обновляем original_df после удаления
                 st.success(f"Столбец '{column_to_delete}' удалён.")
                 st.rerun()  # Перерисовываем интерфейс для немедленного обновления
             else:
                 st.error("Выбранный столбец не найден.")
 
-        # Кнопка отмены действия
-        if st.button("Отменить последнее действие"):
-            undo_action()
+        # Кнопки отмены и повтора действия
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Отменить последнее действие"):
+                undo_action()
+        with col2:
+            if st.button("Повторить отменённое действие"):
+                redo_action()
+
+        # Память истории изменений
+        history = st.session_state.history
+        with st.expander("История изменений"):
+            budget_mb = st.number_input("Бюджет памяти истории, МБ", min_value=16, value=history.max_bytes // 1024 ** 2, step=64)
+            if budget_mb * 1024 ** 2 != history.max_bytes:
+                history.set_max_bytes(budget_mb * 1024 ** 2)
+            st.write(f"Всего: {history.total_bytes() / 1024 ** 2:.1f} МБ, вытеснено шагов: {history.evicted}")
+            st.dataframe(pd.DataFrame([
+                {"Шаг": info["step"], "Действие": info["label"], "Память шага, МБ": info["own_bytes"] / 1024 ** 2,
+                 "Текущий": "✓" if info["current"] else ""}
+                for info in history.steps_info()
+            ]), hide_index=True)
 
     elif menu == "📈 Статистика":
+        import plotly.express as px
+        from utils.correlation import clustered_heatmap_matrix, HEATMAP_MAX_COLS
+        from utils.stats import estimated_stats, estimated_outliers, estimated_correlations, estimated_top_pairs, categorical_stats
+        from visualizations.plots import plot_boxplot, mark_estimate
         st.header("Описательная статистика")
         
         # Выбор столбцов для анализа
@@ -268,40 +712,93 @@ elif st.session_state['df'] is not None:
         with col2:
             filter_value = st.number_input("Значение фильтра", value=None, key="filter_value") if filter_col != "Нет" and pd.api.types.is_numeric_dtype(df[filter_col]) else None
         
-        # Применение фильтра
-        filtered_df = df.copy()
-        if filter_col != "Нет" and filter_value is not None:
-            filtered_df = filtered_df[filtered_df[filter_col] >= filter_value]
+        # Применение фильтра (результаты статистики кэшируются по данным, столбцам и фильтру)
+        stats_filter_col = filter_col if filter_col != "Нет" else None
+        filtered_df = min_filtered(data, stats_filter_col, filter_value)
         
         # Расширенная статистика
         if selected_cols:
-            stats_df = get_extended_stats(filtered_df, selected_cols)
+            if sample is not None:
+                # Оценка числа строк после фильтра — по доле прошедших фильтр строк выборки
+                filtered_total = int(round(sample_total * len(filtered_df) / max(len(sample), 1)))
+                stats_df = estimated_stats(filtered_df, filtered_total, selected_cols)
+                st.caption(f"Оценки по выборке {len(filtered_df):,} из ≈{filtered_total:,} строк: в столбцах «±» — "
+                           f"полуширина 95% доверительного интервала; минимум и максимум — по выборке.")
+            else:
+                stats_df = cached_extended_stats(data, selected_cols, stats_filter_col, filter_value)
+            if dataset is not None:
+                st.caption("Данные на диске: медиана и квартили приближённые (скетч квантилей), остальные показатели точные.")
             # Применяем форматирование только к числовым столбцам, исключая 'Столбец'
             numeric_cols_in_stats = [col for col in stats_df.columns if col != 'Столбец']
             styled_df = stats_df.style.format({col: "{:.2f}" for col in numeric_cols_in_stats}).background_gradient(cmap='Blues')
+            record_payload("Статистика", stats_df)
             st.dataframe(styled_df)
         
             # Визуализация (Boxplot)
             fig = plot_boxplot(filtered_df, selected_cols)
-            st.plotly_chart(fig, use_container_width=True)
+            if sample is not None:
+                mark_estimate(fig, len(filtered_df), filtered_total)
+            st.plotly_chart(record_payload("Ящик с усами", fig), use_container_width=True)
         
             # Обнаружение аномалий (только количество)
-            outliers = detect_outliers(filtered_df, selected_cols)
-            if any(outliers.values()):
+            if sample is not None:
+                outliers = estimated_outliers(filtered_df, filtered_total, selected_cols)
+            else:
+                outliers = cached_outliers(data, selected_cols, stats_filter_col, filter_value)
+            if any(entry["count"] for entry in outliers.values()):
                 st.subheader("Количество выбросов")
-                for col, indices in outliers.items():
-                    if indices:
-                        count = len(indices)
-                        st.write(f"Столбец {col}: {count} выбросов")
+                for col, entry in outliers.items():
+                    if entry["count"] and "margin" in entry:
+                        st.write(f"Столбец {col}: ≈{entry['count']} ± {entry['margin']:.0f} выбросов")
+                    elif entry["count"]:
+                        st.write(f"Столбец {col}: {entry['count']} выбросов")
         
-            # Heatmap корреляций
-            corr = get_correlations(filtered_df)
-            if corr is not None and len(corr.columns) > 1:
-                st.subheader("Тепловая карта корреляций")
-                fig = px.imshow(corr, text_auto=True, aspect="auto", color_continuous_scale='RdBu_r')
-                fig.update_layout(title="Корреляционная матрица")
-                st.plotly_chart(fig, use_container_width=True)
+            # Корреляции: кластеризованная усечённая тепловая карта или сильнейшие пары
+            st.subheader("Корреляции")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                corr_method = st.selectbox("Метод корреляции", ["pearson"] if dataset is not None or sample is not None else ["pearson", "spearman"])
+            with col2:
+                corr_view = st.radio("Вид", ["Тепловая карта", "Сильнейшие пары"], horizontal=True)
+            with col3:
+                corr_limit = st.number_input("Столбцов на карте / пар", min_value=2, max_value=500, value=HEATMAP_MAX_COLS)
+            if corr_view == "Сильнейшие пары":
+                if sample is not None:
+                    pairs = estimated_top_pairs(filtered_df, int(corr_limit))
+                    st.caption("Оценки по выборке: границы 95% доверительного интервала корреляции.")
+                else:
+                    pairs = cached_top_pairs(data, int(corr_limit), corr_method, stats_filter_col, filter_value)
+                st.dataframe(pairs.style.format({col: "{:.3f}" for col in pairs.columns if col not in ('Столбец 1', 'Столбец 2')}),
+                             hide_index=True)
+            else:
+                if sample is not None:
+                    estimate = estimated_correlations(filtered_df)
+                    corr = estimate[0] if estimate is not None else None
+                    if estimate is not None:
+                        margin = float(np.nanmax((estimate[2] - estimate[1]).to_numpy())) / 2
+                        st.caption(f"Оценка по выборке: погрешность корреляций не больше ±{margin:.3f} (95%).")
+                else:
+                    corr = cached_correlations(data, corr_method, stats_filter_col, filter_value)
+                if corr is not None and len(corr.columns) > 1:
+                    heatmap = clustered_heatmap_matrix(corr, int(corr_limit))
+                    if len(heatmap.columns) < len(corr.columns):
+                        st.caption(f"Показаны {len(heatmap.columns)} из {len(corr.columns)} столбцов с самыми сильными связями.")
+                    # Подписи значений только для небольших матриц
+                    fig = px.imshow(heatmap, text_auto=".2f" if len(heatmap.columns) <= 25 else False,
+                                    aspect="auto", color_continuous_scale='RdBu_r', zmin=-1, zmax=1)
+                    fig.update_layout(title="Корреляционная матрица")
+                    st.plotly_chart(record_payload("Корреляционная матрица", fig), use_container_width=True)
         
+        # Категориальные столбцы: кардинальность и самые частые значения по словарному индексу
+        if isinstance(filtered_df, pd.DataFrame) and sample is None:
+            categorical_cols = [col for col in filtered_df.columns if not pd.api.types.is_numeric_dtype(filtered_df[col])]
+            if categorical_cols:
+                st.subheader("Категориальные столбцы")
+                index = get_categorical_index(filtered_df) if filtered_df is df else None
+                cat_stats = categorical_stats(filtered_df, index)
+                record_payload("Категориальные столбцы", cat_stats)
+                st.dataframe(cat_stats.style.format({'Доля (%)': "{:.2f}"}), hide_index=True)
+
         # Сравнение с предыдущим состоянием
         if st.session_state['prev_stats'] is not None and selected_cols:
             st.subheader("Сравнение с предыдущим состоянием")
@@ -311,12 +808,18 @@ elif st.session_state['df'] is not None:
             styled_diff = diff_df.style.format({col: "{:.2f}" for col in diff_df.columns if col != 'Столбец'}).background_gradient(cmap='RdYlGn', subset=['Разница (Среднее)'])
             st.dataframe(styled_diff)
         
-        # Сохранение текущей статистики
-        if st.button("Сохранить текущее состояние статистики"):
-            st.session_state['prev_stats'] = get_extended_stats(df, selected_cols)
+        # Сохранение текущей статистики (оценки по выборке не сохраняются)
+        if sample is None and st.button("Сохранить текущее состояние статистики"):
+            st.session_state['prev_stats'] = cached_extended_stats(data, selected_cols)
             st.success("Статистика сохранена.")
 
+        cache_info = get_cache_info()
+        st.caption(f"Кэш статистики: попаданий {cache_info['hits']}, промахов {cache_info['misses']}, "
+                   f"записей {cache_info['entries']}, {cache_info['bytes'] / 1024 ** 2:.1f} МБ")
+
     elif menu == "📊 Визуализация":
+        from visualizations.plots import plot_histogram, plot_boxplot, plot_scatter, plot_line, plot_bar, mark_estimate
+        from visualizations.trendline import TRENDLINE_MODES, SAMPLE_SIZE, ols_summary
         st.header("Визуализация данных")
         
         # Выбор типа визуализации
@@ -340,32 +843,51 @@ elif st.session_state['df'] is not None:
             filter_value = st.number_input("Значение фильтра", value=None, key="viz_filter_value") if filter_col != "Нет" and pd.api.types.is_numeric_dtype(df[filter_col]) else None
         
         # Применение фильтра
-        viz_df = df.copy()
-        if filter_col != "Нет" and filter_value is not None:
-            viz_df = viz_df[viz_df[filter_col] >= filter_value]
+        viz_df = min_filtered(data, filter_col if filter_col != "Нет" else None, filter_value)
         
         # Настройки
         bins = st.slider("Количество бинов (для гистограммы)", 10, 50, 30) if chart_type == "Гистограмма" else None
         color_col = st.selectbox("Цвет по столбцу (опционально)", ["Нет"] + all_cols) if chart_type in ["Гистограмма", "Точечная диаграмма", "Столбчатая диаграмма"] else None
+        if chart_type == "Точечная диаграмма":
+            trendline = TRENDLINE_MODES[st.selectbox("Линия тренда", list(TRENDLINE_MODES), index=1)]
+            trend_sample = trendline == "linear" and st.checkbox("Оценивать тренд по стратифицированной выборке")
+            show_band = trendline == "linear" and st.checkbox("Показать 95% доверительную полосу")
+            show_diagnostics = st.checkbox("Диагностика OLS (statsmodels)")
         
         # Генерация графика
-        if selected_cols and any(viz_df[col].notna().any() for col in selected_cols):
+        if selected_cols and (dataset is not None or any(viz_df[col].notna().any() for col in selected_cols)):
             if chart_type == "Гистограмма":
                 fig = plot_histogram(viz_df, selected_cols[0], nbins=bins, color_col=color_col if color_col != "Нет" else None)
             elif chart_type == "Ящик с усами":
                 fig = plot_boxplot(viz_df, selected_cols)
             elif chart_type == "Точечная диаграмма":
-                fig = plot_scatter(viz_df, x_col, y_col, color_col=color_col if color_col != "Нет" else None)
+                fig = plot_scatter(viz_df, x_col, y_col, color_col=color_col if color_col != "Нет" else None,
+                                   trendline=trendline, trend_sample=trend_sample, show_band=show_band)
             elif chart_type == "Линейный график":
-                fig = plot_line(viz_df, x_col, y_col)
+                # Строки выборки идут в случайном порядке — линия строится по возрастанию X
+                fig = plot_line(viz_df.sort_values(x_col) if sample is not None else viz_df, x_col, y_col)
             elif chart_type == "Столбчатая диаграмма":
                 fig = plot_bar(viz_df, selected_cols[0], color_col=color_col if color_col != "Нет" else None)
-            
-            st.plotly_chart(fig, use_container_width=True)
+            if sample is not None:
+                mark_estimate(fig, len(viz_df), sample_total)
+            st.plotly_chart(record_payload(chart_type, fig), use_container_width=True)
+            if chart_type == "Точечная диаграмма" and show_diagnostics:
+                if pd.api.types.is_numeric_dtype(df[x_col]) and pd.api.types.is_numeric_dtype(df[y_col]):
+                    ols_df = viz_df.sample_rows(SAMPLE_SIZE, columns=[x_col, y_col]) if dataset is not None else viz_df
+                    st.text(ols_summary(ols_df, x_col, y_col))
+                else:
+                    st.warning("Диагностика OLS доступна только для числовых столбцов.")
         else:
             st.warning("Выберите хотя бы один столбец с данными.")
 
+    elif menu in ("🧮 Пользовательские выражения", "📉 Сводная таблица") and sample is not None:
+        st.header(menu[2:])
+        st.info("Файл ещё загружается: выражения и сводные таблицы считаются по всем строкам "
+                "и станут доступны после загрузки.")
+
     elif menu == "🧮 Пользовательские выражения":
+        from components.custom_metrics import compute_custom_metric, submit_custom_metric, export_result
+        from components.executor import STATUS_MESSAGES, CANCELLED
         st.header("Пользовательские выражения")
         st.write("Введите любой код Python. Доступен объект `df` (если загружен). Установите результат в переменную `result` для отображения. Сохраненный результат можно экспортировать.")
         
@@ -383,22 +905,53 @@ elif st.session_state['df'] is not None:
 """, language="python")
         user_code = st.text_area("Ваш код", height=200)
         
+        # Набор на диске рабочий процесс читает сам из файла, поэтому выполнение всегда изолированное
+        isolated = dataset is not None or st.checkbox("Выполнять в отдельном процессе (лимиты времени и памяти)", value=True)
+        if isolated:
+            # Рабочий процесс запускается в фоне, пока пользователь пишет код
+            from components.executor import get_executor
+            get_executor().warm()
+
         # Кнопка для выполнения
+        result = None
         if st.button("Выполнить"):
             if user_code:
-                result = compute_custom_metric(st.session_state['df'], user_code)
-                if isinstance(result, str) and "Ошибка" in result:
-                    st.error(result)
+                if isolated:
+                    st.session_state['custom_job'] = submit_custom_metric(data, user_code)
                 else:
-                    st.session_state['user_result'] = result
-                    if isinstance(result, (pd.DataFrame, pd.Series)):
-                        st.write("Результат:")
-                        st.dataframe(result)
-                    else:
-                        st.write("Результат:", result)
+                    result = compute_custom_metric(st.session_state['df'], user_code)
             else:
                 st.warning("Введите код для выполнения.")
 
+        # Ожидание задачи в рабочем процессе (кнопка отмены прерывает ожидание и убивает процесс)
+        job = st.session_state.get('custom_job')
+        if job is not None:
+            if not job.done():
+                if st.button("Отменить выполнение"):
+                    job.cancel()
+                progress = st.empty()
+                with span("Ожидание рабочего процесса", "custom"):
+                    while not job.wait(0.2):
+                        memory = f", память {job.peak_rss_mb:.0f} МБ" if job.peak_rss_mb else ""
+                        progress.info(f"Выполняется… {time.monotonic() - job.started:.1f} с{memory}")
+                progress.empty()
+            result = job.result
+            st.session_state['custom_job'] = None
+            memory = f", пик памяти процесса {job.peak_rss_mb:.0f} МБ" if job.peak_rss_mb else ""
+            if job.seconds is not None:
+                st.caption(f"Время выполнения {job.seconds:.3f} с{memory}")
+
+        if result is not None:
+            if isinstance(result, str) and ("Ошибка" in result or result == STATUS_MESSAGES[CANCELLED]):
+                st.error(result)
+            else:
+                st.session_state['user_result'] = result
+                if isinstance(result, (pd.DataFrame, pd.Series)):
+                    st.write("Результат:")
+                    st.dataframe(result)
+                else:
+                    st.write("Результат:", result)
+
         # Отображение и экспорт сохраненного результата
         if st.session_state['user_result'] is not None:
             st.write("Сохраненный результат:")
@@ -407,15 +960,15 @@ elif st.session_state['df'] is not None:
             else:
                 st.write(st.session_state['user_result'])
             
-            data, filename, mime = export_result(st.session_state['user_result'])
-            st.download_button(
-                label="Скачать результат",
-                data=data,
-                file_name=filename,
-                mime=mime
+            user_result = st.session_state['user_result']
+            lazy_download(
+                "Скачать результат", "user_result", id(user_result),
+                lambda fmt: export_result(user_result, fmt or "csv"),
+                choose_format=isinstance(user_result, (pd.DataFrame, pd.Series))
             )
 
     elif menu == "📉 Сводная таблица":
+        from components.pivot_table import PIVOT_PAGE_ROWS, build_pivot_table
         st.header("Сводная таблица")
         st.write("Создайте сводную таблицу, как в Excel, выбрав индексы, столбцы, значения и функцию агрегации.")
 
@@ -425,34 +978,101 @@ elif st.session_state['df'] is not None:
         columns_cols = st.multiselect("Столбцы для заголовков", [col for col in all_cols if col not in index_cols], default=None)
         values_cols = st.multiselect("Столбцы для значений", [col for col in all_cols if col not in index_cols + columns_cols], default=None)
         agg_functions = ["mean", "sum", "count", "min", "max"]
-        aggfunc = st.selectbox("Функция агрегации", agg_functions, index=0, key="aggfunc")
+        if dataset is None:
+            agg_functions += ["median", "q25", "q75"]  # квантили требуют данных в памяти
+        aggfuncs = st.multiselect("Функции агрегации", agg_functions, default=["mean"], key="aggfuncs")
 
         # Проверка входных данных
-        if index_cols and values_cols:
-            pivot_result = build_pivot_table(df, index_cols, columns_cols, values_cols, aggfunc)
+        if index_cols and values_cols and aggfuncs:
+            aggfunc = aggfuncs[0] if len(aggfuncs) == 1 else aggfuncs
+            build = dataset.pivot_table if dataset is not None else partial(build_pivot_table, df)
+            pivot_page = st.session_state.get('pivot_page', 1)
+            row_offset = (pivot_page - 1) * PIVOT_PAGE_ROWS
+            pivot_result = build(index_cols, columns_cols, values_cols, aggfunc,
+                                 row_offset=row_offset, max_rows=PIVOT_PAGE_ROWS)
+            if not isinstance(pivot_result, str) and row_offset >= pivot_result.attrs.get("total_rows", 0) > 0:
+                # После смены параметров страниц стало меньше — возвращаемся к первой
+                st.session_state['pivot_page'] = pivot_page = 1
+                row_offset = 0
+                pivot_result = build(index_cols, columns_cols, values_cols, aggfunc, row_offset=0, max_rows=PIVOT_PAGE_ROWS)
             
             if isinstance(pivot_result, str):
                 st.error(pivot_result)
             else:
-                st.dataframe(pivot_result)
-                # Добавляем возможность экспорта
-                data = pivot_result.to_csv(index=True).encode('utf-8')
-                st.download_button(
-                    label="Скачать сводную таблицу",
-                    data=data,
-                    file_name="pivot_table.csv",
-                    mime="text/csv"
+                total_rows = pivot_result.attrs.get("total_rows", len(pivot_result))
+                pages = page_count(total_rows, PIVOT_PAGE_ROWS)
+                if pages > 1:
+                    st.number_input(f"Страница (из {pages})", min_value=1, max_value=pages, step=1, key="pivot_page")
+                    st.caption(f"Строки {row_offset + 1}–{row_offset + len(pivot_result)} из {total_rows}")
+                total_columns = pivot_result.attrs.get("total_columns", pivot_result.shape[1])
+                if total_columns > pivot_result.shape[1]:
+                    st.caption(f"Показано столбцов: {pivot_result.shape[1]} из {total_columns}. "
+                               f"Уменьшите число заголовков, чтобы увидеть все.")
+                st.dataframe(record_payload("Сводная таблица", pivot_result))
+                # Добавляем возможность экспорта (файл готовится только по запросу)
+                lazy_download(
+                    "Скачать сводную таблицу", "pivot",
+                    (data_token(data), tuple(index_cols), tuple(columns_cols), tuple(values_cols), tuple(aggfuncs), pivot_page),
+                    lambda fmt: serialize_frame(pivot_result, fmt, index=True, name="pivot_table")
                 )
         else:
-            st.warning("Выберите хотя бы один столбец для индексов и значений.")
-
-    # --- Кнопка скачать данные ---
-    st.download_button(
-        label="Скачать данные",
-        data=df.to_csv(index=False).encode('utf-8'),
-        file_name="data.csv",
-        mime="text/csv"
-    )
+            st.warning("Выберите хотя бы один столбец для индексов и значений и функцию агрегации.")
+
+    # --- Кнопка скачать данные (сериализация только по запросу, а не на каждом перезапуске) ---
+    if sample is None:
+        lazy_download(
+            "Скачать данные", "data", data_token(data),
+            lambda fmt: data.export(fmt) if dataset is not None else serialize_frame(data, fmt, index=False, name="data")
+        )
 
 else:
-    st.info("Перейдите во вкладку '📂 Загрузка данных' и загрузите CSV-файл.")
\ No newline at end of file
+    st.info("Перейдите во вкладку '📂 Загрузка данных' и загрузите CSV, Parquet или Feather файл.")
+
+# --- Диагностика производительности (замеры текущего перезапуска и экспорт трасс) ---
+with st.sidebar.expander("⏱ Диагностика"):
+    st.checkbox("Профилировать перезапуски", key="profiling_enabled")
+    st.checkbox("Учитывать память (tracemalloc, медленнее)", key="profiling_memory",
+                disabled=not st.session_state.get('profiling_enabled'))
+    trace_log = st.session_state['trace_log']
+    trace = trace_log.last()
+    if st.session_state.get('profiling_enabled') and trace is not None:
+        st.caption(f"Перезапуск {trace.label}: {trace.duration * 1000:.0f} мс, "
+                   f"отправлено в браузер ≈ {trace.bytes_sent() / 1024 ** 2:.2f} МБ")
+        breakdown = trace.breakdown()
+        if breakdown:
+            st.dataframe(pd.DataFrame([
+                {"Участок": row["name"], "Категория": row["category"], "Вызовов": row["calls"],
+                 "Всего, мс": row["total"] * 1000, "Собственное, мс": row["self"] * 1000,
+                 **({"Память, МБ": row["memory"] / 1024 ** 2, "Пик, МБ": row["peak"] / 1024 ** 2}
+                    if trace.track_memory else {})}
+                for row in breakdown
+            ]), hide_index=True)
+        if trace.payloads:
+            st.dataframe(pd.DataFrame([
+                {"Отправлено": payload["name"], "КБ": payload["bytes"] / 1024} for payload in trace.payloads
+            ]), hide_index=True)
+        st.download_button(
+            f"Скачать трассы ({len(trace_log.traces)} перезапусков, Chrome trace JSON)",
+            chrome_trace(trace_log.traces), file_name="eda_trace.json", mime="application/json"
+        )
+
+# --- Общее хранилище наборов процесса (для администратора: ?admin=1 в адресе страницы) ---
+if st.query_params.get("admin") == "1":
+    from utils.store import MEMORY, get_store
+    with st.sidebar.expander("🗄 Хранилище наборов"):
+        store = get_store()
+        store.evict_idle()
+        info = store.info()
+        st.caption(f"Наборов {info['entries']} (используются {info['in_use']}), в памяти "
+                   f"{info['memory_bytes'] / 1024 ** 2:.1f} МБ, на диске {info['disk_bytes'] / 1024 ** 2:.1f} МБ; "
+                   f"попаданий {info['hits']}, промахов {info['misses']}, вытеснено {info['evicted']}")
+        rows = store.stats()
+        if rows:
+            st.dataframe(pd.DataFrame([
+                {"Файл": row["label"], "Где": "в памяти" if row["kind"] == MEMORY else "на диске",
+                 "МБ": row["nbytes"] / 1024 ** 2, "Ссылок сессий": row["refs"],
+                 "Возраст, мин": row["age_s"] / 60, "Простой, мин": row["idle_s"] / 60}
+                for row in rows
+            ]), hide_index=True)
+        if st.button("Освободить неиспользуемые наборы"):
+            st.success(f"Удалено наборов: {store.clear()}")
@@ -0,0 +1,82 @@
+"""
+Сравнение векторизованного get_extended_stats с прежней реализацией (цикл по столбцам).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_stats [--rows 100000] [--cols 10 100 1000] [--repeat 3]
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from utils.stats import get_extended_stats
+
+
+def legacy_get_extended_stats(df, selected_cols=None):
+    """Прежняя реализация get_extended_stats — эталон для сравнения."""
+    if selected_cols is None:
+        selected_cols = df.select_dtypes(include=['number']).columns
+    stats_df = pd.DataFrame()
+    for col in selected_cols:
+        if pd.api.types.is_numeric_dtype(df[col]):
+            stats_dict = {
+                'Столбец': col,
+                'Среднее': df[col].mean(),
+                'Медиана': df[col].median(),
+                'Минимум': df[col].min(),
+                'Максимум': df[col].max(),
+                'Стд. отклонение': df[col].std(),
+                'Коэф. вариации (%)': (df[col].std() / df[col].mean() * 100) if df[col].mean() != 0 else np.nan,
+                'Q1 (25%)': df[col].quantile(0.25),
+                'Q3 (75%)': df[col].quantile(0.75),
+                'Асимметрия': stats.skew(df[col]),
+                'Эксцесс': stats.kurtosis(df[col])
+            }
+            stats_df = pd.concat([stats_df, pd.DataFrame([stats_dict])], ignore_index=True)
+    return stats_df
+
+
+def make_frame(rows, cols, seed=0):
+    """Синтетический числовой датасет: половина столбцов float, половина int."""
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(cols):
+        if i % 2:
+            data[f"i{i}"] = rng.integers(0, 1000, size=rows)
+        else:
+            data[f"f{i}"] = rng.normal(i, 1 + i % 7, size=rows)
+    return pd.DataFrame(data)
+
+
+def best_time(func, df, repeat):
+    """Лучшее время из repeat запусков, в секундах."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(df)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--cols", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'столбцов':>9} {'прежняя, с':>12} {'новая, с':>10} {'ускорение':>10} {'совпадение':>11}")
+    for cols in args.cols:
+        df = make_frame(args.rows, cols)
+        legacy_time, expected = best_time(legacy_get_extended_stats, df, args.repeat)
+        new_time, actual = best_time(get_extended_stats, df, args.repeat)
+        same = (list(actual.columns) == list(expected.columns)
+                and np.allclose(actual.drop(columns='Столбец').to_numpy(dtype=float),
+                                expected.drop(columns='Столбец').to_numpy(dtype=float),
+                                equal_nan=True))
+        print(f"{cols:>9} {legacy_time:>12.3f} {new_time:>10.3f} {legacy_time / new_time:>9.1f}x {str(same):>11}")
+
+
+if __name__ == "__main__":
+    main()
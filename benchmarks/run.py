@@ -0,0 +1,347 @@
+"""
+Набор бенчмарков публичных функций utils, components и visualizations на синтетических данных.
+
+Запуск из корня репозитория:
+    python -m benchmarks.run [--rows 10000 100000 1000000] [--only stats pivot] [--repeat 3]
+                             [--floats 4 --ints 2 --categories 2 --datetimes 1 --cardinality 20 --nan-rate 0.05]
+                             [--output results.json] [--baseline baseline.json --threshold 1.25]
+    python -m benchmarks.run --scale full     # 10k … 50M строк
+    python -m benchmarks.run --list           # список случаев
+
+Каждый случай измеряется «холодным»: перед каждым запуском сбрасываются кэши
+результатов (ResultCache) и отпечатки фреймов. Время — лучшее и медиана из --repeat
+запусков, память — пик tracemalloc за отдельный запуск. С --baseline результаты
+сравниваются с сохранённым файлом; замедление больше --threshold раз считается
+регрессией, и процесс завершается с кодом 1.
+"""
+import io
+import gc
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import DEFAULT_SPEC, make_dataset
+
+SCALES = {
+    "small": [10_000, 100_000],
+    "default": [10_000, 100_000, 1_000_000],
+    "full": [10_000, 100_000, 1_000_000, 10_000_000, 50_000_000]
+}
+DEFAULT_THRESHOLD = 1.25  # во сколько раз медленнее базового считается регрессией
+MIN_REGRESSION_SECONDS = 0.005  # более короткие замеры слишком шумные для сравнения
+
+
+def _numeric(df):
+    return df.select_dtypes(include=['number']).columns.tolist()
+
+
+def _first(df, kind):
+    cols = [col for col in df.columns if col.startswith(kind)]
+    return cols[0] if cols else None
+
+
+def _csv_loader(df):
+    from utils.data_loader import load_data
+    data = df.to_csv(index=False).encode('utf-8')
+    return lambda: load_data(io.BytesIO(data), fmt="csv")
+
+
+def _parquet_loader(df):
+    from utils.data_loader import load_data
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    data = buffer.getvalue()
+    return lambda: load_data(io.BytesIO(data), fmt="parquet")
+
+
+def _filter_index(df):
+    from utils.filters import FilterIndex
+    num, cat = _first(df, "f"), _first(df, "c")
+    filters = {}
+    if num:
+        filters[num] = {'min': float(df[num].quantile(0.25)), 'max': None}
+    if cat:
+        filters[cat] = {'selected': list(df[cat].dropna().unique()[:3])}
+    sort_config = {'column': num, 'order': 'desc'} if num else {}
+    return lambda: FilterIndex(df).apply(filters, sort_config)
+
+
+def _filter_data(df):
+    from utils.filters import filter_data
+    num = _first(df, "f")
+    return lambda: filter_data(df, num, value_range=(0.0, 1.0))
+
+
+def _apply_patches(df):
+    from utils.table_view import apply_patches, page_positions
+    positions = page_positions(len(df), 1, 100)
+    col = _first(df, "f")
+    state = {"edited_rows": {i: {col: float(i)} for i in range(0, 100, 7)}, "deleted_rows": [1, 2]}
+    return lambda: apply_patches(df, positions, state)
+
+
+def _history(df):
+    from utils.history import History
+    col = _first(df, "f")
+    edited = df.assign(**{col: df[col] * 2})
+    def run():
+        history = History(df)
+        history.push(edited, "Правка", changed={col})
+        return history
+    return run
+
+
+def _stats_delta(df):
+    from utils.stats import StatsState
+    from utils.table_view import apply_patches, patch_delta, page_positions
+    positions = page_positions(len(df), 1, 100)
+    state = {"edited_rows": {i: {_first(df, "f"): float(i)} for i in range(0, 100, 7)}}
+    edited, _, _ = apply_patches(df, positions, state)
+    delta = patch_delta(positions, state)
+    base = StatsState(df)
+    base.extended_stats(df)
+    base.correlations(df)
+    def run():
+        # Перенос состояния статистики на изменённый фрейм вместо полного пересчёта
+        updated = base.apply(df, edited, delta)
+        return updated.extended_stats(edited), updated.correlations(edited)
+    return run
+
+
+def _custom_metric(df):
+    from components.custom_metrics import compute_custom_metric
+    col = _first(df, "f")
+    return lambda: compute_custom_metric(df, f"result = df['{col}'].describe()")
+
+
+def _sketch(df):
+    from utils.sketches import QuantileSketch
+    values = df[_first(df, "f")].to_numpy()
+    return lambda: QuantileSketch().update(values).quantiles([0.25, 0.5, 0.75])
+
+
+def _pivot(aggfunc):
+    def setup(df):
+        from components.pivot_table import build_pivot_table
+        index, columns = _first(df, "c"), [col for col in df.columns if col.startswith("c")][1:2]
+        values = [col for col in df.columns if col.startswith("f")][:2]
+        if not index or not values:
+            return None
+        return lambda: build_pivot_table(df, [index], columns, values, aggfunc)
+    return setup
+
+
+def _plot(name):
+    def setup(df):
+        from visualizations import plots
+        num, num2, cat, date = _first(df, "f"), _first(df, "i"), _first(df, "c"), _first(df, "d")
+        if name == "plot_histogram" and num:
+            return lambda: plots.plot_histogram(df, num, color_col=cat)
+        if name == "plot_boxplot" and num:
+            return lambda: plots.plot_boxplot(df, _numeric(df)[:4])
+        if name == "plot_scatter" and num and num2:
+            return lambda: plots.plot_scatter(df, num, num2, trendline="linear")
+        if name == "plot_line" and num:
+            return lambda: plots.plot_line(df, date or num2, num)
+        if name == "plot_bar" and cat:
+            return lambda: plots.plot_bar(df, cat)
+        return None
+    return setup
+
+
+def _export(fmt):
+    def setup(df):
+        from utils.export import serialize_frame
+        return lambda: serialize_frame(df, fmt)
+    return setup
+
+
+def _simple(module, func, *args, **kwargs):
+    """Случай «функция(df, *args, **kwargs)» с отложенным импортом модуля."""
+    def setup(df):
+        import importlib
+        target = getattr(importlib.import_module(module), func)
+        return lambda: target(df, *args, **kwargs)
+    return setup
+
+
+# Случаи: имя -> (подготовка(df) -> вызываемое без аргументов или None, предел строк)
+CASES = {
+    "loader.load_data_csv": (_csv_loader, 10_000_000),
+    "loader.load_data_parquet": (_parquet_loader, None),
+    "filters.filter_data": (_filter_data, None),
+    "filters.FilterIndex.apply": (_filter_index, None),
+    "categorical.CategoricalIndex": (_simple("utils.categorical", "CategoricalIndex"), None),
+    "stats.get_extended_stats": (_simple("utils.stats", "get_extended_stats"), None),
+    "stats.detect_outliers": (_simple("utils.stats", "detect_outliers"), None),
+    "stats.detect_outliers_approx": (_simple("utils.stats", "detect_outliers", approximate=True), None),
+    "stats.get_correlations": (_simple("utils.stats", "get_correlations"), None),
+    "stats.categorical_stats": (_simple("utils.stats", "categorical_stats"), None),
+    "stats.correlation_spearman": (_simple("utils.correlation", "correlation_matrix", "spearman"), None),
+    "stats.top_correlated_pairs": (_simple("utils.correlation", "top_correlated_pairs"), None),
+    "stats.StatsState.apply_edit": (_stats_delta, None),
+    "sketches.QuantileSketch": (_sketch, None),
+    "cache.dataframe_fingerprint": (_simple("utils.cache", "dataframe_fingerprint"), None),
+    "table.apply_patches": (_apply_patches, None),
+    "history.push": (_history, None),
+    "pivot.build_pivot_table_mean": (_pivot("mean"), None),
+    "pivot.build_pivot_table_multi": (_pivot(["sum", "count", "median"]), None),
+    "plots.plot_histogram": (_plot("plot_histogram"), None),
+    "plots.plot_boxplot": (_plot("plot_boxplot"), None),
+    "plots.plot_scatter": (_plot("plot_scatter"), None),
+    "plots.plot_line": (_plot("plot_line"), None),
+    "plots.plot_bar": (_plot("plot_bar"), None),
+    "custom.compute_custom_metric": (_custom_metric, None),
+    "export.serialize_csv": (_export("csv"), 10_000_000),
+    "export.serialize_parquet": (_export("parquet"), None),
+}
+
+
+def clear_caches():
+    """Сбрасывает все кэши результатов, неиспользуемые наборы общего хранилища и отпечатки фреймов."""
+    from utils.cache import ResultCache, clear_fingerprints
+    from utils.store import get_store
+    for name, module in list(sys.modules.items()):
+        if module is None or not name.split(".")[0] in ("utils", "components", "visualizations"):
+            continue
+        for value in vars(module).values():
+            if isinstance(value, ResultCache):
+                value.clear()
+    get_store().clear()
+    clear_fingerprints()
+    gc.collect()
+
+
+def measure(run, repeat, memory=True):
+    """Время (лучшее и медиана из repeat холодных запусков) и пик памяти tracemalloc в байтах."""
+    timings = []
+    for _ in range(repeat):
+        clear_caches()
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    peak = None
+    if memory:
+        clear_caches()
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return min(timings), float(np.median(timings)), peak
+
+
+def run_suite(rows_list, spec, only=None, repeat=3, memory=True, max_seconds=60.0, log=print):
+    """Прогоняет выбранные случаи на каждом масштабе; возвращает список результатов (словари)."""
+    selected = [name for name in CASES if not only or any(part in name for part in only)]
+    slow = set()  # случаи, превысившие max_seconds, на больших масштабах пропускаются
+    results = []
+    for rows in rows_list:
+        start = time.perf_counter()
+        df = make_dataset(rows, **spec)
+        log(f"# {rows:,} строк × {df.shape[1]} столбцов, {df.memory_usage(deep=True).sum() / 1024 ** 2:.0f} МБ, "
+            f"генерация {time.perf_counter() - start:.1f} с")
+        for name in selected:
+            setup, max_rows = CASES[name]
+            if name in slow or (max_rows is not None and rows > max_rows):
+                continue
+            run = setup(df)
+            if run is None:
+                continue
+            best, median, peak = measure(run, repeat, memory)
+            results.append({"case": name, "rows": rows, "cols": df.shape[1], "best_s": best,
+                            "median_s": median, "peak_mb": None if peak is None else peak / 1024 ** 2,
+                            "repeat": repeat})
+            peak_text = f"{peak / 1024 ** 2:10.1f}" if peak is not None else f"{'—':>10}"
+            log(f"{name:<34} {rows:>11,} {best:>10.4f} {median:>10.4f} {peak_text}")
+            if median > max_seconds:
+                slow.add(name)
+        del df
+        gc.collect()
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Сравнение с базовыми результатами: список строк (case, rows, было, стало, отношение, регрессия)."""
+    reference = {(item["case"], item["rows"]): item for item in baseline["results"]}
+    rows = []
+    for item in results:
+        base = reference.get((item["case"], item["rows"]))
+        if base is None:
+            continue
+        ratio = item["best_s"] / base["best_s"] if base["best_s"] > 0 else float("inf")
+        regression = ratio > threshold and item["best_s"] - base["best_s"] > MIN_REGRESSION_SECONDS
+        rows.append({"case": item["case"], "rows": item["rows"], "baseline_s": base["best_s"],
+                     "current_s": item["best_s"], "ratio": ratio, "regression": regression})
+    return rows
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", help="масштабы (число строк)")
+    parser.add_argument("--scale", choices=list(SCALES), default="default", help="набор масштабов, если --rows не задан")
+    parser.add_argument("--only", nargs="+", help="подстроки имён случаев")
+    parser.add_argument("--list", action="store_true", help="показать случаи и выйти")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="не измерять память (tracemalloc замедляет)")
+    parser.add_argument("--max-seconds", type=float, default=60.0, help="дольше — случай пропускается на больших масштабах")
+    for key, value in DEFAULT_SPEC.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+    parser.add_argument("--output", help="файл JSON для результатов")
+    parser.add_argument("--baseline", help="файл JSON с базовыми результатами для сравнения")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, (_, max_rows) in CASES.items():
+            print(name if max_rows is None else f"{name} (до {max_rows:,} строк)")
+        return 0
+
+    pd.set_option("mode.copy_on_write", True)  # как в приложении
+    spec = {key: getattr(args, key) for key in DEFAULT_SPEC}
+    rows_list = args.rows or SCALES[args.scale]
+    print(f"{'случай':<34} {'строк':>11} {'лучшее, с':>10} {'медиана, с':>10} {'пик, МБ':>10}")
+    results = run_suite(rows_list, spec, args.only, args.repeat, not args.no_memory, args.max_seconds)
+    report = {"environment": environment(), "spec": spec, "results": results}
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(f"Результаты записаны в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline.get("spec") != spec:
+            print("Внимание: состав датасета отличается от базового запуска.")
+        comparison = compare(results, baseline, args.threshold)
+        print(f"\n{'случай':<34} {'строк':>11} {'было, с':>10} {'стало, с':>10} {'отношение':>10}")
+        for row in comparison:
+            flag = "  РЕГРЕССИЯ" if row["regression"] else ""
+            print(f"{row['case']:<34} {row['rows']:>11,} {row['baseline_s']:>10.4f} {row['current_s']:>10.4f} "
+                  f"{row['ratio']:>9.2f}x{flag}")
+        regressions = [row for row in comparison if row["regression"]]
+        print(f"Регрессий: {len(regressions)} из {len(comparison)} (порог {args.threshold:.2f}x)")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
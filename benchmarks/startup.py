@@ -0,0 +1,180 @@
+"""
+Бенчмарк запуска приложения: время импорта модулей и время до первой отрисовки страниц.
+
+Запуск из корня репозитория:
+    python -m benchmarks.startup [--repeat 5] [--importtime] [--output startup.json]
+                                 [--baseline startup_baseline.json --threshold 1.25]
+
+Каждый замер выполняется в новом процессе Python, поэтому импорты «холодные»
+(кэш байткода при этом используется, как у сервера после перезапуска).
+Случаи:
+    startup.import.<модуль>  — импорт модуля сверх уже загруженных streamlit, pandas и numpy;
+    startup.first_paint.<вкладка> — первый прогон app.py (streamlit.testing) в новом процессе
+                                  с открытой вкладкой: столько ждёт первый пользователь;
+    startup.rerun.<вкладка> — повторный прогон той же вкладки в том же процессе.
+Формат результатов и сравнение с базовым файлом — как у benchmarks.run.
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+import numpy as np
+
+from benchmarks.run import DEFAULT_THRESHOLD, compare, environment
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+
+# Модули, чей импорт измеряется отдельно (база — streamlit, pandas, numpy)
+MODULES = [
+    "plotly.express",
+    "scipy.stats",
+    "statsmodels.api",
+    "utils.data_loader",
+    "utils.stats",
+    "utils.dataset",
+    "visualizations.plots",
+    "components.executor",
+    "components.pivot_table",
+]
+
+# Вкладки для первой отрисовки: без данных и с небольшим фреймом в сессии
+PAGES = ["📂 Загрузка данных", "📊 Таблица", "📈 Статистика", "📊 Визуализация",
+         "🧮 Пользовательские выражения", "📉 Сводная таблица"]
+
+_IMPORT_SCRIPT = """
+import time, importlib
+import streamlit, pandas, numpy
+start = time.perf_counter()
+importlib.import_module({module!r})
+print(time.perf_counter() - start)
+"""
+
+_PAINT_SCRIPT = """
+import time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+from benchmarks.synthetic import make_dataset
+from utils.history import History
+at = AppTest.from_file({app!r}, default_timeout=120)
+if {page!r} != "📂 Загрузка данных":
+    df = make_dataset(10_000)
+    at.session_state['df'] = at.session_state['original_df'] = df
+    at.session_state['history'] = History(df)
+at.run()
+if {page!r} != "📂 Загрузка данных":
+    at.sidebar.radio[0].set_value({page!r})
+    at.run()
+first = time.perf_counter() - start
+start = time.perf_counter()
+at.run()
+print(first, time.perf_counter() - start, len(at.exception))
+"""
+
+
+def _python(code):
+    """Выполняет код в новом процессе из корня репозитория и возвращает его вывод."""
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    completed = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                               capture_output=True, text=True, check=True)
+    return completed.stdout.split()
+
+
+def _result(case, timings):
+    return {"case": case, "rows": 0, "cols": 0, "best_s": min(timings), "median_s": float(np.median(timings)),
+            "peak_mb": None, "repeat": len(timings)}
+
+
+def measure_imports(modules=MODULES, repeat=5, log=print):
+    results = []
+    for module in modules:
+        try:
+            timings = [float(_python(_IMPORT_SCRIPT.format(module=module))[-1]) for _ in range(repeat)]
+        except subprocess.CalledProcessError:
+            log(f"{'startup.import.' + module:<48} не установлен")
+            continue
+        results.append(_result(f"startup.import.{module}", timings))
+        log(f"{'startup.import.' + module:<48} {min(timings):>10.4f} {np.median(timings):>10.4f}")
+    return results
+
+
+def measure_pages(pages=PAGES, repeat=5, log=print):
+    """
+    Первая отрисовка вкладки в новом процессе. Вкладки, кроме загрузки, открываются
+    со сгенерированным фреймом в сессии (10 000 строк), чтобы страница строилась полностью;
+    время включает первый прогон (страница загрузки) и переход на вкладку.
+    """
+    results = []
+    for page in pages:
+        first, rerun = [], []
+        for _ in range(repeat):
+            output = _python(_PAINT_SCRIPT.format(app=APP, page=page))
+            if int(output[-1]):
+                log(f"Внимание: вкладка {page} завершилась с исключением")
+            first.append(float(output[-3]))
+            rerun.append(float(output[-2]))
+        name = page.split(" ", 1)[1]
+        for kind, timings in (("first_paint", first), ("rerun", rerun)):
+            results.append(_result(f"startup.{kind}.{name}", timings))
+            log(f"{f'startup.{kind}.{name}':<48} {min(timings):>10.4f} {np.median(timings):>10.4f}")
+    return results
+
+
+def import_profile(limit=15):
+    """Самые долгие импорты (собственное время, -X importtime) для набора модулей приложения."""
+    code = "import streamlit, pandas, numpy\n" + "\n".join(f"import {module}" for module in MODULES)
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env,
+                               capture_output=True, text=True)
+    rows = []
+    for line in completed.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[0].startswith("import time:") and parts[1].strip().isdigit():
+            rows.append((int(parts[0].split(":")[1]), int(parts[1]), parts[2].rstrip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="+", choices=["imports", "pages"], default=["imports", "pages"])
+    parser.add_argument("--importtime", action="store_true", help="показать самые долгие импорты (python -X importtime)")
+    parser.add_argument("--output", help="файл JSON для результатов")
+    parser.add_argument("--baseline", help="файл JSON с базовыми результатами для сравнения")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    print(f"{'случай':<48} {'лучшее, с':>10} {'медиана, с':>10}")
+    results = []
+    if "imports" in args.only:
+        results += measure_imports(repeat=args.repeat)
+    if "pages" in args.only:
+        results += measure_pages(repeat=args.repeat)
+    if args.importtime:
+        print(f"\n{'собственное, мкс':>16} {'всего, мкс':>12}  модуль")
+        for own, total, module in import_profile():
+            print(f"{own:>16} {total:>12}  {module}")
+    report = {"environment": environment(), "spec": {"startup": True}, "results": results}
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(f"Результаты записаны в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        comparison = compare(results, baseline, args.threshold)
+        print(f"\n{'случай':<48} {'было, с':>10} {'стало, с':>10} {'отношение':>10}")
+        for row in comparison:
+            flag = "  РЕГРЕССИЯ" if row["regression"] else ""
+            print(f"{row['case']:<48} {row['baseline_s']:>10.4f} {row['current_s']:>10.4f} {row['ratio']:>9.2f}x{flag}")
+        regressions = [row for row in comparison if row["regression"]]
+        print(f"Регрессий: {len(regressions)} из {len(comparison)} (порог {args.threshold:.2f}x)")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
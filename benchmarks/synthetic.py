@@ -0,0 +1,52 @@
+"""
+Генератор синтетических датасетов для бенчмарков.
+
+    from benchmarks.synthetic import make_dataset
+    df = make_dataset(1_000_000, floats=8, cardinality=50, nan_rate=0.05)
+"""
+import numpy as np
+import pandas as pd
+
+# Состав датасета по умолчанию
+DEFAULT_SPEC = {
+    "floats": 4,        # столбцы float64 (нормальное распределение с редкими выбросами)
+    "ints": 2,          # столбцы int64
+    "categories": 2,    # строковые столбцы object
+    "datetimes": 1,     # столбцы datetime64 (монотонные, для линейных графиков)
+    "cardinality": 20,  # уникальных значений в строковых столбцах
+    "nan_rate": 0.0,    # доля пропусков в float и строковых столбцах
+    "seed": 0
+}
+
+
+def _with_nans(values, rate, rng):
+    if rate <= 0:
+        return values
+    values = values.copy()
+    values[rng.random(len(values)) < rate] = np.nan if values.dtype.kind == 'f' else None
+    return values
+
+
+def make_dataset(rows, floats=4, ints=2, categories=2, datetimes=1, cardinality=20, nan_rate=0.0, seed=0):
+    """
+    DataFrame из rows строк. Имена столбцов: f0.., i0.., c0.., d0...
+    Генерация векторная и детерминированная по seed; строковые столбцы
+    собираются из словаря через take, поэтому большие датасеты строятся быстро.
+    """
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(floats):
+        values = rng.normal(i, 1 + i % 5, size=rows)
+        # Небольшая доля выбросов, чтобы поиску аномалий было что находить
+        values[rng.random(rows) < 0.001] *= 25
+        data[f"f{i}"] = _with_nans(values, nan_rate, rng)
+    for i in range(ints):
+        data[f"i{i}"] = rng.integers(0, 1000 * (i + 1), size=rows)
+    vocabulary = np.array([f"v{j}" for j in range(max(cardinality, 1))], dtype=object)
+    for i in range(categories):
+        # Распределение Ципфа: несколько частых значений и длинный хвост
+        codes = (rng.zipf(1.3, size=rows) - 1) % len(vocabulary)
+        data[f"c{i}"] = _with_nans(vocabulary.take(codes), nan_rate, rng)
+    for i in range(datetimes):
+        data[f"d{i}"] = pd.date_range("2020-01-01", periods=rows, freq="s") + pd.Timedelta(days=i)
+    return pd.DataFrame(data)
@@ -1,6 +1,11 @@
 import pandas as pd
 import io
+from utils.export import serialize_frame
+from utils.profiling import profiled
 
+OUT_OF_MEMORY = "Ошибка: недостаточно памяти"
+
+@profiled("custom")
 def compute_custom_metric(df, code_str):
     """Выполняет пользовательский код с доступом к df и стандартным библиотекам."""
     local_vars = {'df': df} if df is not None else {}
@@ -24,16 +29,23 @@ def compute_custom_metric(df, code_str):
         elif isinstance(result, (pd.DataFrame, pd.Series)):
             return result
         return str(result)
+    except MemoryError as e:
+        return f"{OUT_OF_MEMORY} ({e})"
     except AttributeError as e:
         return f"Ошибка: {str(e)} - Проверьте, не используете ли вы метод .dict() для словаря напрямую."
     except Exception as e:
         return f"Ошибка: {str(e)}"
 
-def export_result(result):
-    """Экспортирует результат в CSV или текст в зависимости от типа."""
+@profiled("custom")
+def submit_custom_metric(df, code_str):
+    """Запускает пользовательский код в изолированном рабочем процессе с лимитами; возвращает Job."""
+    from components.executor import get_executor
+    return get_executor().submit(df, code_str)
+
+def export_result(result, fmt="csv"):
+    """Экспортирует результат в CSV/Parquet/Feather (таблицы) или текст в зависимости от типа."""
     if isinstance(result, (pd.DataFrame, pd.Series)):
-        output = result.to_csv(index=False)
-        return output.encode('utf-8'), "result.csv", "text/csv"
+        return serialize_frame(result, fmt, index=False, name="result")
     elif isinstance(result, str):
         return result.encode('utf-8'), "result.txt", "text/plain"
     return str(result).encode('utf-8'), "result.txt", "text/plain"
\ No newline at end of file
@@ -0,0 +1,419 @@
+import os
+import sys
+import time
+import uuid
+import atexit
+import pickle
+import tempfile
+import threading
+import multiprocessing as mp
+from utils.dataset import DiskDataset
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_WORKERS = 2
+DEFAULT_TIMEOUT = 60          # секунд реального времени на задачу
+DEFAULT_CPU_SECONDS = 30      # секунд процессорного времени на задачу
+DEFAULT_MAX_MEMORY_MB = 2048  # памяти, которую задача может выделить сверх загруженных данных
+POLL_INTERVAL = 0.05
+MAX_SHARED_FILES = 3          # общих файлов данных, хранимых для повторных задач
+
+# Статусы задачи
+RUNNING, DONE, CANCELLED, TIMEOUT, CPU_LIMIT, MEMORY_LIMIT, CRASHED = (
+    "running", "done", "cancelled", "timeout", "cpu_limit", "memory_limit", "crashed"
+)
+
+STATUS_MESSAGES = {
+    CANCELLED: "Выполнение отменено.",
+    TIMEOUT: "Ошибка: превышено время выполнения.",
+    CPU_LIMIT: "Ошибка: превышен лимит процессорного времени.",
+    MEMORY_LIMIT: "Ошибка: превышен лимит памяти.",
+    CRASHED: "Ошибка: рабочий процесс аварийно завершился."
+}
+
+def _shared_dir():
+    """Каталог для обмена данными: /dev/shm (память) на Linux, иначе временный каталог."""
+    return "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else tempfile.gettempdir()
+
+def _rss_mb(pid):
+    """Текущий RSS процесса в МБ (только Linux, иначе None)."""
+    try:
+        with open(f"/proc/{pid}/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _cpu_seconds_used():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def _set_cpu_limit(seconds):
+    """Мягкий лимит CPU для следующей задачи (жёсткий не трогаем, чтобы его можно было поднять обратно)."""
+    if resource is None:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = resource.RLIM_INFINITY if seconds is None else int(_cpu_seconds_used() + seconds) + 1
+    if hard != resource.RLIM_INFINITY and soft != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+# RLIMIT_DATA (Linux 4.7+) учитывает и анонимные mmap — так numpy выделяет большие массивы, —
+# но не отображённый только для чтения файл общих данных
+_MEMORY_RLIMIT = getattr(resource, "RLIMIT_DATA", None)
+
+def _data_mb():
+    """Текущий сегмент данных процесса в МБ (только Linux, иначе None)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[5]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _set_memory_limit(megabytes):
+    """
+    Жёсткий для задачи предел памяти: мягкий лимит на megabytes выше текущего объёма
+    (загруженные данные и зарезервированное аллокаторами адресное пространство не в счёт).
+    Выделение сверх предела сразу получает MemoryError — процесс не доходит до OOM killer.
+    Жёсткий лимит системы не трогаем, чтобы мягкий можно было снять.
+    """
+    if _MEMORY_RLIMIT is None:
+        return
+    _, hard = resource.getrlimit(_MEMORY_RLIMIT)
+    used = _data_mb() if megabytes is not None else None
+    soft = resource.RLIM_INFINITY if used is None else int((used + megabytes) * 1024 ** 2)
+    if hard != resource.RLIM_INFINITY and soft != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(_MEMORY_RLIMIT, (soft, hard))
+
+def _load_shared_frame(path):
+    """Открывает общий датасет: Arrow IPC через memory map (числовые столбцы без копии) или pickle."""
+    if path.endswith(".pkl"):
+        with open(path, "rb") as source:
+            return pickle.load(source)
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    table = ipc.open_file(pa.memory_map(path, "r")).read_all()
+    return table.to_pandas(split_blocks=True)
+
+def _worker_main(conn):
+    """Цикл рабочего процесса: получает (путь к данным, код, лимит CPU, лимит памяти), возвращает результат."""
+    from components.custom_metrics import OUT_OF_MEMORY, compute_custom_metric
+    loaded_path, df = None, None
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        data_path, code_str, cpu_seconds, memory_mb = message
+        if data_path != loaded_path:
+            try:
+                df = _load_shared_frame(data_path) if data_path else None
+                loaded_path = data_path
+            except Exception as e:
+                df, loaded_path = None, None
+                conn.send({"result": f"Ошибка: не удалось открыть данные в рабочем процессе ({e})", "seconds": 0.0})
+                continue
+        _set_memory_limit(memory_mb)
+        _set_cpu_limit(cpu_seconds)
+        start = time.perf_counter()
+        result = compute_custom_metric(df, code_str)
+        elapsed = time.perf_counter() - start
+        _set_cpu_limit(None)
+        out_of_memory = isinstance(result, str) and result.startswith(OUT_OF_MEMORY)
+        try:
+            # Сериализация результата тоже идёт под лимитом памяти
+            conn.send({"result": result, "seconds": elapsed, "out_of_memory": out_of_memory})
+        except Exception as e:  # результат не сериализуется или не помещается в лимит
+            conn.send({"result": f"Ошибка: результат нельзя передать из рабочего процесса ({e})", "seconds": elapsed,
+                       "out_of_memory": isinstance(e, MemoryError)})
+        _set_memory_limit(None)
+
+class _Worker:
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def alive(self):
+        return self.process.is_alive()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+class Job:
+    """Задача пользовательского кода: статус, результат, время и пиковая память."""
+
+    def __init__(self, code_str):
+        self.code_str = code_str
+        self.status = RUNNING
+        self.result = None
+        self.seconds = None
+        self.peak_rss_mb = None
+        self.started = time.monotonic()
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Ждёт завершения; возвращает True, если задача закончилась."""
+        return self._done.wait(timeout)
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _finish(self, status, result=None, seconds=None):
+        self.status = status
+        self.result = result if status == DONE else STATUS_MESSAGES[status]
+        self.seconds = seconds
+        self._done.set()
+
+class CodeExecutor:
+    """
+    Пул рабочих процессов для пользовательского кода. Каждая задача ограничена
+    по реальному времени, процессорному времени (RLIMIT_CPU) и выделяемой памяти
+    (RLIMIT_DATA в рабочем процессе; RSS родитель только замеряет для отчёта),
+    её можно отменить. Процесс, нарушивший лимит,
+    убивается и заменяется новым — сервер Streamlit не страдает.
+    DataFrame передаётся рабочим процессам через файл Arrow IPC в общей памяти
+    (/dev/shm), который они отображают в память, а не через pickle.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT,
+                 cpu_seconds=DEFAULT_CPU_SECONDS, max_memory_mb=DEFAULT_MAX_MEMORY_MB):
+        self.workers = workers
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.max_memory_mb = max_memory_mb
+        self._context = mp.get_context("spawn")
+        self._idle = []
+        self._busy = 0
+        self._warming = False
+        self._condition = threading.Condition()
+        self._shared = {}  # отпечаток данных -> путь к файлу (от давно использованных к недавним)
+        self._users = {}   # путь -> число задач, которым файл ещё нужен
+        self._shared_lock = threading.Lock()
+
+    def share_frame(self, df):
+        """
+        Записывает DataFrame в общий файл один раз на отпечаток данных и возвращает путь.
+        Каждый вызов — ссылка задачи на файл: пока она не освобождена release_frame,
+        файл не удаляется.
+        """
+        from utils.cache import dataframe_fingerprint
+        fingerprint = dataframe_fingerprint(df)
+        path = self._register(fingerprint)
+        if path is not None:
+            return path
+        # Запись (для больших таблиц — секунды) идёт без блокировки: другие сессии
+        # тем временем отправляют задачи и освобождают свои файлы
+        written = self._write_shared(df, fingerprint)
+        path = self._register(fingerprint, written)
+        if path != written:
+            self._remove_file(written)  # другая сессия успела записать те же данные
+        return path
+
+    def _register(self, fingerprint, written=None):
+        """
+        Ссылка задачи на файл отпечатка (под блокировкой): уже записанный файл или
+        новый written. Возвращает путь или None, если файла нет и written не передан.
+        """
+        with self._shared_lock:
+            path = self._shared.pop(fingerprint, None)
+            if path is None or not os.path.exists(path):
+                if written is None:
+                    return None
+                path = written
+            self._shared[fingerprint] = path
+            self._users[path] = self._users.get(path, 0) + 1
+            self._trim_shared()
+            return path
+
+    def release_frame(self, path):
+        """Освобождает ссылку задачи на общий файл; лишние файлы без ссылок удаляются."""
+        with self._shared_lock:
+            users = self._users.get(path, 0) - 1
+            if users > 0:
+                self._users[path] = users
+            else:
+                self._users.pop(path, None)
+            self._trim_shared()
+
+    def _trim_shared(self):
+        """Удаляет (под блокировкой) давние файлы сверх MAX_SHARED_FILES, которые не нужны ни одной задаче."""
+        for fingerprint in list(self._shared)[:-MAX_SHARED_FILES]:
+            if not self._users.get(self._shared[fingerprint]):
+                self._remove_file(self._shared.pop(fingerprint))
+
+    @staticmethod
+    def _write_shared(df, fingerprint):
+        """Новый файл Arrow IPC (или pickle, если Arrow не справился с типами) с данными в общем каталоге."""
+        # Уникальное имя: одни и те же данные могут одновременно записывать несколько сессий
+        base = os.path.join(_shared_dir(), f"eda_{os.getpid()}_{fingerprint}_{uuid.uuid4().hex[:8]}")
+        try:
+            import pyarrow as pa
+            import pyarrow.ipc as ipc
+            table = pa.Table.from_pandas(df, preserve_index=True)
+            path = base + ".arrow"
+            with pa.OSFile(path, "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        except Exception:
+            # Типы, которые Arrow не умеет (смешанные object), передаём через pickle
+            CodeExecutor._remove_file(base + ".arrow")
+            path = base + ".pkl"
+            with open(path, "wb") as sink:
+                pickle.dump(df, sink, protocol=pickle.HIGHEST_PROTOCOL)
+        return path
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def warm(self):
+        """
+        Заранее запускает рабочий процесс в фоновом потоке, если свободных нет:
+        первая задача не ждёт запуска интерпретатора и импорта pandas.
+        """
+        with self._condition:
+            if self._idle or self._warming or self._busy >= self.workers:
+                return
+            self._warming = True
+        threading.Thread(target=self._start_idle_worker, daemon=True).start()
+
+    def _start_idle_worker(self):
+        try:
+            worker = _Worker(self._context)
+        except Exception as e:
+            worker = None
+            print(f"Не удалось заранее запустить рабочий процесс: {e}")
+        with self._condition:
+            self._warming = False
+            if worker is not None:
+                self._idle.append(worker)
+            self._condition.notify()
+
+    def _acquire(self):
+        with self._condition:
+            while not self._idle and self._busy >= self.workers:
+                self._condition.wait()
+            self._busy += 1
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.alive():
+                    return worker
+                worker.kill()
+        try:
+            return _Worker(self._context)
+        except Exception:
+            self._release(None)
+            raise
+
+    def _release(self, worker):
+        with self._condition:
+            self._busy -= 1
+            if worker is not None:
+                self._idle.append(worker)
+            self._condition.notify()
+
+    def submit(self, df, code_str):
+        """Запускает код в рабочем процессе и сразу возвращает Job. df — DataFrame или набор данных на диске."""
+        job = Job(code_str)
+        shared = False
+        if isinstance(df, DiskDataset) and not df.filters:
+            # Набор данных на диске уже лежит в файле Arrow IPC — рабочий процесс отображает его сам
+            data_path = df.path
+        elif df is not None:
+            data_path, shared = self.share_frame(df), True
+        else:
+            data_path = None
+        threading.Thread(target=self._run_job, args=(job, data_path, shared), daemon=True).start()
+        return job
+
+    def run(self, df, code_str):
+        """Синхронный вариант submit: ждёт завершения и возвращает Job."""
+        job = self.submit(df, code_str)
+        job.wait()
+        return job
+
+    def _run_job(self, job, data_path, shared=False):
+        try:
+            self._execute(job, data_path)
+        finally:
+            if shared:
+                self.release_frame(data_path)
+
+    def _execute(self, job, data_path):
+        try:
+            worker = self._acquire()
+        except Exception as e:
+            job._finish(CRASHED)
+            print(f"Не удалось запустить рабочий процесс: {e}")
+            return
+        start = time.monotonic()
+        status, message = None, None
+        try:
+            worker.conn.send((data_path, job.code_str, self.cpu_seconds, self.max_memory_mb))
+            peak = 0.0
+            while status is None:
+                if worker.conn.poll(POLL_INTERVAL):
+                    message = worker.conn.recv()
+                    status = MEMORY_LIMIT if message.get("out_of_memory") else DONE
+                    break
+                # Лимит памяти держит сам рабочий процесс; RSS замеряется только для отчёта о пике
+                rss = _rss_mb(worker.process.pid)
+                if rss is not None:
+                    peak = max(peak, rss)
+                    job.peak_rss_mb = peak
+                if job._cancel.is_set():
+                    status = CANCELLED
+                elif not worker.alive():
+                    status = CPU_LIMIT if worker.process.exitcode == -24 else CRASHED  # 24 = SIGXCPU
+                elif time.monotonic() - start > self.timeout:
+                    status = TIMEOUT
+        except (EOFError, OSError):
+            worker.process.join(timeout=1)
+            status = CPU_LIMIT if worker.process.exitcode == -24 else CRASHED
+        if status == DONE:
+            self._release(worker)
+            job._finish(DONE, message["result"], message["seconds"])
+        else:
+            worker.kill()
+            self._release(None)
+            job._finish(status, seconds=time.monotonic() - start)
+
+    def shutdown(self):
+        """Останавливает рабочие процессы и удаляет общие файлы."""
+        with self._condition:
+            for worker in self._idle:
+                worker.kill()
+            self._idle = []
+        with self._shared_lock:
+            for path in self._shared.values():
+                self._remove_file(path)
+            self._shared.clear()
+            self._users.clear()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Общий для всех сессий процесса пул исполнителей (создаётся при первом обращении)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = CodeExecutor()
+            atexit.register(_executor.shutdown)
+        return _executor
@@ -1,9 +1,248 @@
+import numpy as np
 import pandas as pd
+from utils.cache import ResultCache, dataframe_fingerprint
+from utils.profiling import profiled
 
-def build_pivot_table(df, index, columns, values, aggfunc):
-    """Строит сводную таблицу на основе указанных параметров."""
+# Функции агрегации: имя в интерфейсе -> квантиль (None — не квантиль)
+PIVOT_AGGREGATIONS = {"mean": None, "sum": None, "count": None, "min": None, "max": None,
+                      "median": 0.5, "q25": 0.25, "q75": 0.75}
+MAX_PIVOT_COLUMNS = 200    # столбцов широкой таблицы, остальные отбрасываются
+PIVOT_PAGE_ROWS = 1000     # строк широкой таблицы на странице
+
+_codes_cache = ResultCache(max_bytes=256 * 1024 ** 2)
+_pivot_cache = ResultCache(max_bytes=128 * 1024 ** 2)
+
+def _key_codes(df, col, fingerprint):
+    """Коды столбца-ключа (factorize с сортировкой, NaN -> -1) и словарь значений, кэшируются по данным."""
+    return _codes_cache.get_or_compute(
+        (fingerprint, col), lambda: pd.factorize(df[col], sort=True, use_na_sentinel=True)
+    )
+
+def _group_ids(df, keys, fingerprint):
+    """
+    Номер группы для каждой строки (-1, если в ключе пропуск) и индекс ключей групп.
+    Коды ключей объединяются в одно число (смешанная система счисления), поэтому
+    порядок групп совпадает с лексикографическим порядком ключей, как у pivot_table.
+    """
+    codes = [_key_codes(df, col, fingerprint) for col in keys]
+    combined = np.zeros(len(df), dtype=np.int64)
+    valid = np.ones(len(df), dtype=bool)
+    size = 1
+    for col_codes, uniques in codes:
+        if size * max(len(uniques), 1) >= 2 ** 62:
+            # Сжимаем уже набранные коды, чтобы произведение не переполнило int64
+            combined = pd.factorize(combined, sort=True)[0].astype(np.int64)
+            size = int(combined.max()) + 1 if len(combined) else 1
+        combined = combined * max(len(uniques), 1) + np.maximum(col_codes, 0)
+        valid &= col_codes >= 0
+        size *= max(len(uniques), 1)
+    rows = np.flatnonzero(valid)
+    group_codes, group_values = pd.factorize(combined[rows], sort=True)
+    ids = np.full(len(df), -1, dtype=np.int64)
+    ids[rows] = group_codes
+    # Ключи группы берём из любой её строки
+    representative = np.empty(len(group_values), dtype=np.int64)
+    representative[group_codes] = rows
+    levels = [uniques.take(col_codes[representative]) for col_codes, uniques in codes]
+    return ids, pd.MultiIndex.from_arrays(levels, names=list(keys))
+
+def _segment_quantiles(values, starts, counts, q):
+    """Квантили отсортированных сегментов (значения без NaN идут в начале сегмента), интерполяция как в pandas."""
+    result = np.full(len(starts), np.nan)
+    has = counts > 0
+    pos = starts[has] + q * (counts[has] - 1)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, starts[has] + counts[has] - 1)
+    result[has] = values[lo] + (values[hi] - values[lo]) * (pos - lo)
+    return result
+
+def _aggregate_column(values, ids, n_groups, aggfuncs):
+    """Все агрегаты одного столбца значений за один проход: bincount для сумм и счётчиков, одна сортировка для порядковых."""
+    valid = (ids >= 0) & ~np.isnan(values)
+    group, x = ids[valid], values[valid]
+    count = np.bincount(group, minlength=n_groups).astype('float64')
+    result = {}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if "count" in aggfuncs:
+            result["count"] = count
+        if "sum" in aggfuncs or "mean" in aggfuncs:
+            total = np.bincount(group, weights=x, minlength=n_groups)
+            if "sum" in aggfuncs:
+                result["sum"] = total
+            if "mean" in aggfuncs:
+                result["mean"] = np.where(count > 0, total / count, np.nan)
+    needs_order = any(func in ("min", "max") or PIVOT_AGGREGATIONS.get(func) is not None for func in aggfuncs)
+    if needs_order and len(x):
+        # Одна сортировка по (группа, значение) даёт минимум, максимум и квантили
+        order = np.lexsort((x, group))
+        x_sorted = x[order]
+        starts = np.concatenate([[0], np.cumsum(count[:-1])]).astype(np.int64)
+        has = count > 0
+        if "min" in aggfuncs:
+            result["min"] = np.where(has, x_sorted[np.minimum(starts, len(x) - 1)], np.nan)
+        if "max" in aggfuncs:
+            result["max"] = np.where(has, x_sorted[np.maximum(starts + count.astype(np.int64) - 1, 0)], np.nan)
+        for func in aggfuncs:
+            if PIVOT_AGGREGATIONS.get(func) is not None:
+                result[func] = _segment_quantiles(x_sorted, starts, count.astype(np.int64), PIVOT_AGGREGATIONS[func])
+    for func in aggfuncs:
+        result.setdefault(func, np.full(n_groups, np.nan))
+    return result
+
+def _restore_dtype(result, dtype, func):
+    """
+    Тип агрегата как у pd.pivot_table: count — int64, sum/min/max целого столбца —
+    его целый тип (или int64, если значения в него не помещаются), когда это без потерь.
+    """
+    if func == "count":
+        return result.astype(np.int64)
+    if func not in ("sum", "min", "max") or not isinstance(dtype, np.dtype) or dtype.kind not in "iu":
+        return result
+    # Суммы bincount точны только до 2**53; пропуск возможен лишь в пустой группе
+    if not len(result) or np.isnan(result).any() or np.abs(result).max() >= 2 ** 53:
+        return result if len(result) else result.astype(dtype)
+    for target in (dtype, np.dtype(np.int64)):
+        info = np.iinfo(target)
+        if result.min() >= info.min and result.max() <= info.max:
+            return result.astype(target)
+    return result
+
+def pivot_aggregate(df, index, columns, values, aggfuncs):
+    """
+    Длинная таблица агрегатов: строки — существующие сочетания ключей index + columns,
+    столбцы — (функция, значение). Ключи кодируются один раз и кэшируются, все функции
+    считаются за один проход по каждому столбцу значений; результат кэшируется по
+    (отпечаток данных, index, columns, values, функции).
+    """
+    fingerprint = dataframe_fingerprint(df)
+    keys = list(index) + list(columns)
+    cache_key = (fingerprint, tuple(index), tuple(columns), tuple(values), tuple(aggfuncs))
+
+    def compute():
+        ids, group_index = _group_ids(df, keys, fingerprint)
+        data = {}
+        for value in values:
+            column = df[value]
+            if not pd.api.types.is_numeric_dtype(column) or pd.api.types.is_bool_dtype(column):
+                raise TypeError(f"столбец значений '{value}' не числовой")
+            aggregated = _aggregate_column(column.to_numpy(dtype='float64', na_value=np.nan), ids, len(group_index), aggfuncs)
+            for func in aggfuncs:
+                data[(func, value)] = _restore_dtype(aggregated[func], column.dtype, func)
+        return pd.DataFrame(data, index=group_index)
+
+    return _pivot_cache.get_or_compute(cache_key, compute)
+
+def wide_pivot(long, index, columns, values, aggfunc, row_offset=0, max_rows=None, max_columns=MAX_PIVOT_COLUMNS):
+    """
+    Широкая таблица в формате pd.pivot_table (fill_value=0) для страницы строк.
+    Как и там (dropna=True), сочетания ключей без единого значения и — при
+    многоуровневых столбцах — столбцы без единого значения не показываются; целые
+    агрегаты остаются целыми. Сочетаний заголовков больше max_columns — остаются
+    первые max_columns. В attrs кладутся полные размеры: total_rows, total_columns.
+    """
+    aggfuncs = [aggfunc] if isinstance(aggfunc, str) else list(aggfunc)
+    present = long.notna()
+    long = long[present.any(axis=1)] if len(long.columns) else long
+    present = present[present.any(axis=1)] if len(long.columns) else present
+    if columns:
+        # Столбцы широкой таблицы (функция, значение, заголовок...), где есть хоть одно значение
+        any_value = present.groupby(level=list(columns), sort=False).any()
+        headers = [key if isinstance(key, tuple) else (key,) for key in any_value.index]
+        rows, cols = np.nonzero(any_value.to_numpy())
+        present_columns = {(*any_value.columns[j], *headers[i]) for i, j in zip(rows, cols)}
+    elif isinstance(aggfunc, str):
+        present_columns = set(long.columns)
+    else:
+        present_columns = {col for col in long.columns if present[col].any()}
+    row_keys = long.index.droplevel(list(columns)).unique() if columns else long.index
+    if max_rows is not None:
+        page_keys = row_keys[row_offset:row_offset + max_rows]
+        long = long[long.index.droplevel(list(columns)).isin(page_keys)] if columns else long.iloc[row_offset:row_offset + max_rows]
+    if columns:
+        column_keys = long.index.droplevel(list(index)).unique().sort_values()[:max_columns]
+        long = long[long.index.droplevel(list(index)).isin(column_keys)]
+        wide = long.unstack(list(columns))
+    else:
+        wide = long
+    if len(index) == 1 and isinstance(wide.index, pd.MultiIndex):
+        wide.index = wide.index.get_level_values(0)
+    wide = wide[[col for col in wide.columns if (col if isinstance(col, tuple) else (col,)) in present_columns]]
+    wide = wide.fillna(0)
+    # Пустые ячейки после unstack делают целые агрегаты float — возвращаем исходный тип
+    integer = {col: long.dtypes[col[:2]] for col in wide.columns if long.dtypes[col[:2]].kind in "iu"}
+    if integer:
+        wide = wide.astype(integer)
+    if isinstance(aggfunc, str):
+        wide = wide[aggfunc]
+    else:
+        wide = wide[sorted(wide.columns, key=lambda col: aggfuncs.index(col[0]))]
+    wide.attrs["total_rows"] = len(row_keys)
+    wide.attrs["total_columns"] = len(present_columns) if columns else len(values) * len(aggfuncs)
+    return wide
+
+@profiled("pivot")
+def build_pivot_table(df, index, columns, values, aggfunc, row_offset=0, max_rows=None, max_columns=MAX_PIVOT_COLUMNS):
+    """
+    Строит сводную таблицу на основе указанных параметров. aggfunc — имя функции
+    (mean, sum, count, min, max, median, q25, q75) или список имён: тогда все функции
+    считаются за один проход. row_offset/max_rows — страница строк, max_columns —
+    предел числа столбцов широкой таблицы.
+    """
+    try:
+        index, columns, values = list(index), list(columns or []), list(values)
+        aggfuncs = [aggfunc] if isinstance(aggfunc, str) else list(aggfunc)
+        unknown = [func for func in aggfuncs if func not in PIVOT_AGGREGATIONS]
+        if unknown:
+            raise ValueError(f"неизвестная функция агрегации: {', '.join(unknown)}")
+        long = pivot_aggregate(df, index, columns, values, aggfuncs)
+        return wide_pivot(long, index, columns, values, aggfunc, row_offset, max_rows, max_columns)
+    except Exception as e:
+        return f"Ошибка при построении сводной таблицы: {str(e)}"
+
+# Частичные агрегаты по кускам и способ их объединения
+_PARTIAL_AGGS = {"sum": ["sum"], "count": ["count"], "mean": ["sum", "count"], "min": ["min"], "max": ["max"]}
+_COMBINE = {"sum": "sum", "count": "sum", "min": "min", "max": "max"}
+
+def pivot_aggregate_from_chunks(chunks, index, columns, values, aggfuncs):
+    """
+    Длинная таблица агрегатов (как у pivot_aggregate) по последовательности кусков
+    DataFrame: каждый кусок сворачивается в частичные агрегаты, которые затем
+    объединяются. Поддерживаются mean, sum, count, min, max.
+    """
+    unsupported = [func for func in aggfuncs if func not in _PARTIAL_AGGS]
+    if unsupported:
+        raise ValueError(f"функции {', '.join(unsupported)} не поддерживаются для данных на диске")
+    keys = list(index) + list(columns)
+    partial_aggs = sorted({part for func in aggfuncs for part in _PARTIAL_AGGS[func]})
+    partials = [
+        chunk.groupby(keys, observed=True, sort=False)[list(values)].agg(partial_aggs)
+        for chunk in chunks
+    ]
+    combined = pd.concat(partials)
+    combined = combined.groupby(level=list(range(len(keys))), observed=True, sort=True).agg(
+        {col: _COMBINE[col[1]] for col in combined.columns}
+    )
+    data = {}
+    for func in aggfuncs:
+        for value in values:
+            if func == "mean":
+                count = combined[(value, "count")]
+                data[(func, value)] = combined[(value, "sum")] / count.where(count > 0)
+            else:
+                data[(func, value)] = combined[(value, func)]
+    long = pd.DataFrame(data, index=combined.index)
+    if not isinstance(long.index, pd.MultiIndex):
+        long.index = pd.MultiIndex.from_arrays([long.index], names=keys)
+    return long
+
+@profiled("pivot")
+def build_pivot_table_from_chunks(chunks, index, columns, values, aggfunc, row_offset=0, max_rows=None,
+                                  max_columns=MAX_PIVOT_COLUMNS):
+    """Сводная таблица по кускам DataFrame (данные на диске); результат как у build_pivot_table."""
     try:
-        pivot_df = pd.pivot_table(df, values=values, index=index, columns=columns, aggfunc=aggfunc, fill_value=0)
-        return pivot_df
+        index, columns, values = list(index), list(columns or []), list(values)
+        aggfuncs = [aggfunc] if isinstance(aggfunc, str) else list(aggfunc)
+        long = pivot_aggregate_from_chunks(chunks, index, columns, values, aggfuncs)
+        return wide_pivot(long, index, columns, values, aggfunc, row_offset, max_rows, max_columns)
     except Exception as e:
-        return f"Ошибка при построении сводной таблицы: {str(e)}"
\ No newline at end of file
+        return f"Ошибка при построении сводной таблицы: {str(e)}"
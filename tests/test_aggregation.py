@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+from visualizations.aggregation import (MAX_CATEGORIES, OTHER_LABEL, count_frame, count_frame_from_chunks,
+                                        histogram_frame, histogram_from_chunks, limit_categories)
+
+def _frame(rows=2000, n_values=MAX_CATEGORIES + 20):
+    rng = np.random.default_rng(0)
+    labels = np.array([f"v{i}" for i in range(n_values)])[rng.integers(0, n_values, rows)]
+    df = pd.DataFrame({"c": pd.Categorical(labels), "x": rng.normal(size=rows)})
+    df.loc[::50, "c"] = np.nan
+    return df
+
+def test_limit_categories_on_categorical():
+    df = _frame()
+    limited = limit_categories(df["c"])
+    assert isinstance(limited.dtype, pd.CategoricalDtype)
+    assert limited.nunique() == MAX_CATEGORIES + 1
+    assert (limited == OTHER_LABEL).sum() > 0
+    assert limited.isna().sum() == df["c"].isna().sum()
+    kept = limited.notna() & (limited != OTHER_LABEL)
+    assert (limited[kept].astype(object) == df["c"][kept].astype(object)).all()
+    assert not set(df["c"][limited == OTHER_LABEL]) & set(limited[kept])
+
+def test_count_frame_categorical():
+    df = _frame()
+    counts = count_frame(df, "c")
+    assert counts["count"].sum() == len(df)
+    assert OTHER_LABEL in counts["c"].tolist()
+    chunked = count_frame_from_chunks([df.iloc[:700], df.iloc[700:]], "c")
+    pd.testing.assert_frame_equal(
+        chunked.astype({"c": object}).sort_values("c", na_position="first", ignore_index=True),
+        counts.astype({"c": object}).sort_values("c", na_position="first", ignore_index=True),
+        check_dtype=False
+    )
+
+def test_histogram_colored_by_categorical():
+    df = _frame()
+    frame, width = histogram_frame(df, "x", color_col="c")
+    assert width is not None and frame["count"].sum() == len(df)
+    chunked, _ = histogram_from_chunks(lambda: [df.iloc[:900], df.iloc[900:]], df, "x", color_col="c")
+    assert chunked["count"].sum() == len(df)
+    assert OTHER_LABEL in set(chunked["c"])
+
+def test_empty_input():
+    df = _frame().iloc[:0]
+    assert count_frame(df, "c").empty
+    assert count_frame_from_chunks([], "c").empty
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+from utils.cache import ResultCache, dataframe_fingerprint
+from utils.table_view import apply_patches
+from components.pivot_table import pivot_aggregate
+
+@pytest.fixture(autouse=True)
+def copy_on_write():
+    with pd.option_context("mode.copy_on_write", True):
+        yield
+
+def _frame(rows=20_000):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "x": rng.normal(size=rows),
+        "n": rng.integers(0, 100, rows),
+        "s": np.array(["a", "b", "c"])[rng.integers(0, 3, rows)].astype(object),
+        "c": pd.Categorical(np.array(["p", "q"])[rng.integers(0, 2, rows)]),
+    })
+
+def _edit(df, row, col, value):
+    patched, _, _ = apply_patches(df, np.arange(len(df)), {"edited_rows": {str(row): {col: value}}})
+    return patched
+
+def test_equal_content_equal_fingerprint():
+    df = _frame()
+    assert dataframe_fingerprint(df) == dataframe_fingerprint(df.copy())
+    assert dataframe_fingerprint(df) == dataframe_fingerprint(df.copy(deep=False))
+
+@pytest.mark.parametrize("col, value", [("s", "zzz"), ("c", "q"), ("n", 1000), ("x", 0.5)])
+def test_cell_edit_changes_fingerprint(col, value):
+    df = _frame()
+    row = 12_345  # вне любой равномерной выборки строк
+    if df[col].iloc[row] == value:
+        row += 1
+    assert dataframe_fingerprint(_edit(df, row, col, value)) != dataframe_fingerprint(df)
+
+def test_swap_keeps_sum_but_changes_fingerprint():
+    df = _frame()
+    values = df["x"].to_numpy().copy()
+    values[[10, 20]] = values[[20, 10]]
+    assert dataframe_fingerprint(df.assign(x=values)) != dataframe_fingerprint(df)
+
+def test_index_and_categories_are_part_of_fingerprint():
+    df = _frame(100)
+    assert dataframe_fingerprint(df.set_axis(np.arange(100) * 2)) != dataframe_fingerprint(df)
+    renamed = df.assign(c=df["c"].cat.rename_categories(["P", "Q"]))
+    assert dataframe_fingerprint(renamed) != dataframe_fingerprint(df)
+
+def test_empty_and_unhashable():
+    assert dataframe_fingerprint(pd.DataFrame()) != dataframe_fingerprint(_frame().iloc[:0])
+    lists = pd.DataFrame({"l": [[1], [2]]})
+    assert dataframe_fingerprint(lists) != dataframe_fingerprint(pd.DataFrame({"l": [[1], [3]]}))
+
+def test_pivot_is_recomputed_after_string_edit():
+    df = _frame()
+    before = pivot_aggregate(df, ["s"], [], ["x"], ["sum"])
+    edited = _edit(df, 12_345, "s", "new")
+    after = pivot_aggregate(edited, ["s"], [], ["x"], ["sum"])
+    assert len(after) == len(before) + 1
+
+def test_result_cache_byte_budget():
+    cache = ResultCache(max_bytes=3000)
+    for key in range(5):
+        cache.put(key, np.zeros(100))  # 800 байт
+    assert cache.info()["entries"] == 3
+    assert cache.get(0) is None and cache.get(4) is not None
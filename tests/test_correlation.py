@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+from utils.correlation import correlation_matrix, top_correlated_pairs
+
+def _frame(rows=200, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"a": rng.normal(size=rows), "b": rng.normal(size=rows),
+                       "ties": rng.integers(0, 5, rows).astype('float64')})
+    df["c"] = df["a"] * 2 + rng.normal(size=rows) * 0.5
+    df["dense"] = rng.exponential(size=rows)
+    for col, gaps in [("a", 40), ("b", 40), ("ties", 30), ("c", 5)]:
+        df.loc[df.index[rng.integers(0, rows, gaps)], col] = np.nan
+    return df
+
+@pytest.mark.parametrize("method", ["spearman", "pearson"])
+@pytest.mark.parametrize("block_size", [256, 2, 3])
+def test_matches_pandas_with_nan(method, block_size):
+    df = _frame()
+    pd.testing.assert_frame_equal(correlation_matrix(df, method, block_size=block_size), df.corr(method),
+                                  check_exact=False, rtol=1e-9, atol=1e-12)
+
+def test_spearman_small_frame_with_nan():
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame(rng.normal(size=(200, 3)), columns=list("xyz"))
+    df.iloc[rng.integers(0, 200, 40), 0] = np.nan
+    df.iloc[rng.integers(0, 200, 40), 1] = np.nan
+    pd.testing.assert_frame_equal(correlation_matrix(df, "spearman"), df.corr("spearman"),
+                                  check_exact=False, rtol=1e-9, atol=1e-12)
+
+def test_spearman_sparse_and_constant_columns():
+    df = _frame(50)
+    df["two"] = np.nan
+    df.loc[df.index[:2], "two"] = [1.0, 2.0]
+    df["one"] = np.nan
+    df.loc[df.index[5], "one"] = 3.0
+    df["const"] = 1.0
+    pd.testing.assert_frame_equal(correlation_matrix(df, "spearman", block_size=3), df.corr("spearman"),
+                                  check_exact=False, rtol=1e-9, atol=1e-12)
+
+def test_top_pairs_match_matrix():
+    df = _frame()
+    expected = df.corr("spearman")
+    pairs = top_correlated_pairs(df, k=4, method="spearman", block_size=2)
+    for _, row in pairs.iterrows():
+        assert row["Корреляция"] == pytest.approx(expected.loc[row["Столбец 1"], row["Столбец 2"]])
+    upper = expected.where(np.triu(np.ones(expected.shape, dtype=bool), 1)).abs().stack()
+    assert np.allclose(np.sort(pairs["Корреляция"].abs())[::-1], upper.sort_values(ascending=False)[:4])
@@ -0,0 +1,61 @@
+import io
+import numpy as np
+import pandas as pd
+from utils.data_loader import load_data
+
+def _csv(df, name="data.csv"):
+    file = io.BytesIO(df.to_csv(index=False).encode())
+    file.name = name
+    return file
+
+def _frame(rows=5000):
+    return pd.DataFrame({
+        "s": np.array(["a", "b", "c"])[np.arange(rows) % 3],
+        "x": np.arange(rows)
+    })
+
+def test_category_column_empty_in_one_chunk():
+    # Столбец целиком пустой в одном из чанков: категории этого чанка другого типа
+    df = _frame()
+    df.loc[1000:1999, "s"] = None
+    out, info = load_data(_csv(df), chunksize=1000)
+    assert out is not None
+    assert isinstance(out["s"].dtype, pd.CategoricalDtype)
+    assert sorted(out["s"].cat.categories) == ["a", "b", "c"]
+    assert int(out["s"].isna().sum()) == 1000
+    assert info["missing_per_col"]["s"] == 1000
+    assert out["s"].astype(object).where(out["s"].notna(), None).tolist() == df["s"].tolist()
+
+def test_category_column_empty_in_first_chunk():
+    df = _frame()
+    df.loc[:999, "s"] = None
+    out, _ = load_data(_csv(df), chunksize=1000)
+    assert out is not None
+    assert out["s"].isna().sum() == 1000
+    assert out["s"].iloc[1000:].astype(object).tolist() == df["s"].iloc[1000:].tolist()
+
+def test_chunked_load_matches_single_pass():
+    df = _frame()
+    df.loc[::7, "x"] = np.nan
+    chunked, chunked_info = load_data(_csv(df), chunksize=700)
+    whole, whole_info = load_data(_csv(df), chunksize=len(df))
+    pd.testing.assert_frame_equal(chunked, whole)
+    assert chunked_info["missing_per_col"] == whole_info["missing_per_col"]
+    total, count = chunked_info["sums"]["x"]
+    assert count == df["x"].count() and np.isclose(total, df["x"].sum())
+
+def test_empty_file():
+    out, info = load_data(_csv(pd.DataFrame({"s": [], "x": []})))
+    assert out is not None and len(out) == 0
+    assert info["total_missing"] == 0
+
+def test_integers_keep_headroom():
+    df = pd.DataFrame({"small": np.arange(5000) % 100, "big": np.arange(5000) * 10 ** 10,
+                       "unsigned": np.arange(5000, dtype=np.uint64)})
+    out, _ = load_data(_csv(df), chunksize=1000)
+    assert out["small"].dtype == np.int32 and out["unsigned"].dtype == np.int32
+    assert out["big"].dtype == np.int64
+    # Арифметика и суммы дают те же значения, что и на int64
+    assert (out["small"] * 100_000).tolist() == (df["small"] * 100_000).tolist()
+    assert int(out["small"].sum()) == int(df["small"].sum())
+    pd.testing.assert_frame_equal(out.astype(np.int64), df.astype(np.int64))
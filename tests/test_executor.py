@@ -0,0 +1,82 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+from components.executor import CRASHED, DONE, MAX_SHARED_FILES, MEMORY_LIMIT, CodeExecutor, Job
+
+@pytest.fixture
+def executor():
+    executor = CodeExecutor(workers=1, timeout=60)
+    yield executor
+    executor.shutdown()
+
+def test_queued_jobs_keep_their_files(executor):
+    # Больше задач, чем хранимых файлов, в очереди к одному процессу: файлы не удаляются до конца задач
+    frames = [pd.DataFrame({"x": np.arange(10) + i}) for i in range(MAX_SHARED_FILES + 3)]
+    jobs = [executor.submit(frame, "result = df['x'].sum()") for frame in frames]
+    for job, frame in zip(jobs, frames):
+        assert job.wait(120)
+        assert job.status == DONE, job.result
+        assert job.result == str(frame["x"].sum())
+    assert len(executor._shared) == MAX_SHARED_FILES
+    assert not executor._users
+    assert all(os.path.exists(path) for path in executor._shared.values())
+
+def test_same_frame_shares_one_file(executor):
+    df = pd.DataFrame({"x": [1.0, np.nan, 3.0]})
+    first, second = executor.share_frame(df), executor.share_frame(df.copy())
+    assert first == second and executor._users[first] == 2
+    executor.release_frame(first)
+    executor.release_frame(first)
+    assert not executor._users and os.path.exists(first)
+
+def test_missing_file_is_an_error_message(executor):
+    job = executor.submit(pd.DataFrame({"x": [1]}), "result = 1")
+    assert job.wait(120) and job.status == DONE
+    path = executor.share_frame(pd.DataFrame({"y": [2]}))
+    os.remove(path)
+    job = executor.submit(None, "result = 2")  # без данных
+    assert job.wait(120) and job.result == "2"
+    job = Job("result = df['y'].sum()")
+    executor._run_job(job, path, shared=True)
+    assert job.status == DONE and job.status != CRASHED
+    assert job.result.startswith("Ошибка: не удалось открыть данные")
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="лимит памяти задачи держит RLIMIT_DATA (Linux)")
+def test_memory_limit_fails_allocation_in_worker():
+    executor = CodeExecutor(workers=1, timeout=60, max_memory_mb=200)
+    try:
+        df = pd.DataFrame({"x": [1.0, 2.0]})
+        # 1,6 ГБ неинициализированным массивом: в RSS он не виден, остановить его может только лимит
+        job = executor.run(df, "result = len(df['x'].to_numpy().__class__((2 * 10**8,)))")
+        assert job.status == MEMORY_LIMIT, job.result
+        # Небольшие задачи после этого выполняются в новом процессе как обычно
+        job = executor.run(df, "result = len(df['x'].to_numpy().repeat(10**5))")
+        assert job.status == DONE and job.result == str(2 * 10**5)
+    finally:
+        executor.shutdown()
+
+def test_share_frame_writes_outside_lock(executor, monkeypatch):
+    writing, proceed = threading.Event(), threading.Event()
+    write = CodeExecutor._write_shared
+
+    def slow_write(df, fingerprint):
+        writing.set()
+        assert proceed.wait(10)
+        return write(df, fingerprint)
+
+    first = executor.share_frame(pd.DataFrame({"x": [1]}))
+    monkeypatch.setattr(CodeExecutor, "_write_shared", staticmethod(slow_write))
+    big = pd.DataFrame({"x": np.arange(1000)})
+    paths = []
+    thread = threading.Thread(target=lambda: paths.append(executor.share_frame(big)))
+    thread.start()
+    assert writing.wait(10)
+    # Пока идёт запись, другие сессии получают и освобождают свои файлы
+    assert executor.share_frame(pd.DataFrame({"x": [1]})) == first
+    executor.release_frame(first)
+    executor.release_frame(first)
+    proceed.set()
+    thread.join(10)
+    assert os.path.exists(paths[0]) and executor._users == {paths[0]: 1}
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+from utils.categorical import CategoricalIndex
+from utils.filters import FilterIndex, filter_data
+
+def _frame(rows=1_000):
+    rng = np.random.default_rng(0)
+    labels = np.array(["a", "b", "c", None], dtype=object)[rng.integers(0, 4, rows)]
+    return pd.DataFrame({
+        "obj": labels,
+        "cat": pd.Categorical(labels),
+        "x": rng.normal(size=rows),
+        "n": rng.integers(0, 10, rows),
+    })
+
+@pytest.mark.parametrize("column", ["obj", "cat"])
+@pytest.mark.parametrize("with_index", [False, True])
+def test_filter_data_equality(column, with_index):
+    df = _frame()
+    index = CategoricalIndex(df) if with_index else None
+    result = filter_data(df, column, category="b", index=index)
+    expected = df[df[column].astype(object) == "b"]
+    pd.testing.assert_frame_equal(result, expected)
+    assert filter_data(df, column, category="missing", index=index).empty
+
+def test_filter_data_range():
+    df = _frame()
+    result = filter_data(df, "x", value_range=(-0.5, 0.5))
+    pd.testing.assert_frame_equal(result, df[df["x"].between(-0.5, 0.5)])
+
+def test_filter_index_matches_pandas():
+    df = _frame()
+    df.loc[::9, "x"] = np.nan
+    index = FilterIndex(df, CategoricalIndex(df))
+    filters = {"x": {"min": -1.0, "max": 1.0}, "cat": {"selected": ["a", "c"]}}
+    result = index.apply(filters, {"column": "n", "order": "desc"})
+    expected = df[df["x"].between(-1.0, 1.0) & df["cat"].isin(["a", "c"])]
+    assert set(result.index) == set(expected.index)
+    assert result["n"].is_monotonic_decreasing
+    mask = index.filter_mask(filters)
+    assert (mask == (df["x"].between(-1.0, 1.0) & df["cat"].isin(["a", "c"])).to_numpy()).all()
+    assert index.filter_mask({}) is None
+
+def test_filter_index_extend_matches_rebuild():
+    df = _frame(2_000)
+    base, batch = df.iloc[:1_500], df.iloc[1_500:]
+    filters = {"x": {"min": 0.0, "max": None}, "obj": {"selected": ["a"]}}
+    sort = {"column": "x", "order": "asc"}
+    index = FilterIndex(base)
+    index.apply(filters, sort)
+    extended = index.extend(df, batch)
+    pd.testing.assert_frame_equal(extended.apply(filters, sort), FilterIndex(df).apply(filters, sort))
+
+def test_empty_frame():
+    df = _frame().iloc[:0]
+    assert filter_data(df, "cat", category="a").empty
+    assert FilterIndex(df).apply({"x": {"min": 0.0, "max": None}}, {"column": "x"}).empty
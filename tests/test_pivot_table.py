@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+from components.pivot_table import build_pivot_table, pivot_aggregate_from_chunks, wide_pivot
+
+def _frame(rows=400, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "g": np.array(["a", "b", "c", "d", "e"], dtype=object)[rng.integers(0, 5, rows)],
+        "h": np.array(["x", "y", "z"], dtype=object)[rng.integers(0, 3, rows)],
+        "f": rng.normal(size=rows),
+        "i": rng.integers(-50, 50, rows).astype(np.int32),
+    })
+    df.loc[df.index[::11], "f"] = np.nan
+    df.loc[df.index[::17], "g"] = None
+    return df
+
+def _with_empty_groups(df):
+    # Группа e без значений f; в группе d нет значений f под заголовком z
+    df = df.copy()
+    df.loc[df["g"] == "e", "f"] = np.nan
+    df.loc[(df["g"] == "d") & (df["h"] == "z"), "f"] = np.nan
+    return df
+
+def _expected(df, index, columns, values, aggfunc):
+    return pd.pivot_table(df, index=index, columns=columns or None, values=values, aggfunc=aggfunc, fill_value=0)
+
+@pytest.mark.parametrize("aggfunc", ["sum", "mean", "count", "min", "max", "median"])
+@pytest.mark.parametrize("columns", [[], ["h"]])
+@pytest.mark.parametrize("prepare", [lambda df: df, _with_empty_groups])
+def test_matches_pivot_table(aggfunc, columns, prepare):
+    df = prepare(_frame())
+    for values in (["f"], ["f", "i"], ["i"]):
+        result = build_pivot_table(df, ["g"], columns, values, aggfunc)
+        assert not isinstance(result, str), result
+        pd.testing.assert_frame_equal(result, _expected(df, ["g"], columns, values, aggfunc),
+                                      check_exact=False, check_names=False)
+
+def test_integer_sums_stay_integer():
+    df = _frame()
+    for aggfunc in ("sum", "min", "max"):
+        result = build_pivot_table(df, ["g"], ["h"], ["i"], aggfunc)
+        assert (result.dtypes == np.int32).all()
+    assert (build_pivot_table(df, ["g"], [], ["i"], "mean").dtypes == np.float64).all()
+    big = df.assign(i=np.full(len(df), 2 ** 30, dtype=np.int32))
+    result = build_pivot_table(big, ["g"], [], ["i"], "sum")
+    assert (result.dtypes == np.int64).all()
+    pd.testing.assert_frame_equal(result, _expected(big, ["g"], [], ["i"], "sum"), check_dtype=False, check_names=False)
+
+def test_all_nan_groups_are_dropped():
+    df = _with_empty_groups(_frame())
+    mean = build_pivot_table(df, ["g"], ["h"], ["f"], "mean")
+    assert "e" not in mean.index and len(mean.columns) == 3
+    assert "e" in build_pivot_table(df, ["g"], ["h"], ["f"], "sum").index
+    multi = build_pivot_table(df, ["g"], ["h"], ["f"], ["mean", "max"])
+    assert "e" not in multi.index
+    assert multi.attrs["total_columns"] == len(multi.columns) == 6
+
+def test_multiple_aggregations():
+    df = _frame()
+    result = build_pivot_table(df, ["g", "h"], [], ["f", "i"], ["sum", "count", "median"])
+    for func in ("sum", "count", "median"):
+        pd.testing.assert_frame_equal(result[func], _expected(df, ["g", "h"], [], ["f", "i"], func),
+                                      check_exact=False, check_names=False)
+
+def test_chunks_match_in_memory():
+    df = _with_empty_groups(_frame())
+    chunks = [df.iloc[start:start + 90] for start in range(0, len(df), 90)]
+    for aggfunc in ("sum", "mean", "count", "min", "max"):
+        long = pivot_aggregate_from_chunks(chunks, ["g"], ["h"], ["f", "i"], [aggfunc])
+        result = wide_pivot(long, ["g"], ["h"], ["f", "i"], aggfunc)
+        expected = build_pivot_table(df, ["g"], ["h"], ["f", "i"], aggfunc)
+        # Частичные суммы кусков pandas считает в int64
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_exact=False)
+        assert [dtype.kind for dtype in result.dtypes] == [dtype.kind for dtype in expected.dtypes]
+
+def test_paging_keeps_columns():
+    df = _with_empty_groups(_frame())
+    full = build_pivot_table(df, ["g"], ["h"], ["f"], "mean")
+    pages = [build_pivot_table(df, ["g"], ["h"], ["f"], "mean", row_offset=offset, max_rows=2) for offset in (0, 2)]
+    pd.testing.assert_frame_equal(pd.concat(pages), full)
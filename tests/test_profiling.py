@@ -0,0 +1,91 @@
+import gc
+import threading
+import tracemalloc
+import pytest
+from utils.profiling import MemoryTracing, finish_trace, span, start_trace, stop_profiling
+
+@pytest.fixture(autouse=True)
+def no_tracing():
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    yield
+    finish_trace()
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+def test_tracing_stops_with_last_session():
+    first, second = MemoryTracing(), MemoryTracing()
+    assert tracemalloc.is_tracing()
+    first.release()
+    first.release()  # повторное освобождение ничего не меняет
+    assert tracemalloc.is_tracing() and not first.active
+    second.release()
+    assert not tracemalloc.is_tracing()
+
+def test_session_without_memory_does_not_stop_others():
+    holder = MemoryTracing()
+    trace = start_trace("a", track_memory=True)
+    with span("alloc"):
+        data = bytearray(4 * 1024 ** 2)
+        stop_profiling()  # перезапуск другой сессии без профилирования
+        assert tracemalloc.is_tracing()
+    assert trace.spans[0]["memory"] >= len(data)
+    holder.release()
+
+def test_released_on_garbage_collection():
+    holder = MemoryTracing()
+    assert tracemalloc.is_tracing()
+    del holder
+    gc.collect()
+    assert not tracemalloc.is_tracing()
+
+def test_external_tracemalloc_is_left_running():
+    tracemalloc.start()
+    holder = MemoryTracing()
+    holder.release()
+    assert tracemalloc.is_tracing()
+
+def test_memory_not_tracked_without_tracing():
+    trace = start_trace("b", track_memory=True)
+    assert not trace.track_memory
+    with span("noop"):
+        pass
+    assert trace.spans[0]["memory"] is None
+
+def _peaks(trace):
+    return {item["name"]: item["peak"] for item in trace.spans}
+
+def test_nested_span_keeps_parent_peak():
+    holder = MemoryTracing()
+    trace = start_trace("c", track_memory=True)
+    with span("outer"):
+        data = bytearray(8 * 1024 ** 2)
+        del data  # пик родителя — до начала вложенного интервала
+        with span("inner"):
+            small = bytearray(1024 ** 2)
+        del small
+    peaks = _peaks(trace)
+    assert peaks["outer"] >= 7 * 1024 ** 2
+    assert 1024 ** 2 <= peaks["inner"] < 4 * 1024 ** 2
+    holder.release()
+
+def test_span_in_other_thread_keeps_peak():
+    holder = MemoryTracing()
+    trace = start_trace("d", track_memory=True)
+    other = []
+
+    def session():
+        other.append(start_trace("e", track_memory=True))
+        with span("other"):
+            pass
+        finish_trace()
+
+    with span("outer"):
+        data = bytearray(8 * 1024 ** 2)
+        del data
+        thread = threading.Thread(target=session)
+        thread.start()
+        thread.join()
+    assert _peaks(trace)["outer"] >= 7 * 1024 ** 2
+    assert _peaks(other[0])["other"] < 8 * 1024 ** 2
+    holder.release()
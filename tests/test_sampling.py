@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from utils.sampling import OTHER_STRATUM, Reservoir
+
+def _stream(frame, batch_rows):
+    for start in range(0, len(frame), batch_rows):
+        yield frame.iloc[start:start + batch_rows]
+
+def _frame(rows=200_000, strata=50, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"s": rng.integers(0, strata, rows), "v": np.arange(rows, dtype=np.int64)})
+
+def _held(reservoir):
+    return sum(len(part) for part in reservoir._parts)
+
+def test_uniform_sample_size_and_rows():
+    df = _frame()
+    reservoir = Reservoir(2_000, seed=1)
+    for batch in _stream(df, 7_000):
+        reservoir.update(batch)
+    sample = reservoir.sample()
+    assert len(sample) == 2_000 and sample["v"].is_unique
+    assert reservoir.seen == len(df)
+    # Строки из исходного потока без искажений
+    pd.testing.assert_frame_equal(sample.sort_values("v", ignore_index=True),
+                                  df.iloc[np.sort(sample["v"].to_numpy())].reset_index(drop=True))
+
+def test_uniform_inclusion_probability():
+    # Частота попадания каждой позиции потока близка к size / n (алгоритм R по пакетам)
+    df = _frame(2_000, strata=1)
+    hits = np.zeros(len(df))
+    for seed in range(300):
+        reservoir = Reservoir(100, seed=seed)
+        for batch in _stream(df, 170):
+            reservoir.update(batch)
+        hits[reservoir.sample()["v"].to_numpy()] += 1
+    rate = hits / 300
+    assert abs(rate.mean() - 0.05) < 1e-9
+    halves = rate.reshape(4, -1).mean(axis=1)
+    assert np.allclose(halves, 0.05, atol=0.005)
+
+def test_stratified_proportions_and_memory():
+    df = _frame(400_000, strata=50)
+    size = 4_000
+    reservoir = Reservoir(size, strata="s", seed=1)
+    peak = 0
+    for batch in _stream(df, 20_000):
+        reservoir.update(batch)
+        peak = max(peak, _held(reservoir))
+    sample = reservoir.sample()
+    assert abs(len(sample) - size) <= 50
+    shares = sample["s"].value_counts(normalize=True).sort_index()
+    expected = df["s"].value_counts(normalize=True).sort_index()
+    assert (shares - expected).abs().max() < 0.002
+    # В памяти — порядка size строк, а не size на каждую страту
+    assert peak <= 2 * size + 20_000
+
+def test_stratum_share_grows_late():
+    rng = np.random.default_rng(3)
+    rows = 200_000
+    strata = np.where(np.arange(rows) < rows // 2, rng.integers(1, 10, rows), 0)
+    df = pd.DataFrame({"s": strata, "v": np.arange(rows)})
+    reservoir = Reservoir(2_000, strata="s", seed=0)
+    for batch in _stream(df, 10_000):
+        reservoir.update(batch)
+    sample = reservoir.sample()
+    assert abs((sample["s"] == 0).mean() - (strata == 0).mean()) < 0.01
+
+def test_nan_strata_and_overflow():
+    df = _frame(20_000, strata=5).astype({"s": "float64"})
+    df.loc[::10, "s"] = np.nan
+    df.loc[::7, "s"] = 100 + np.arange(len(df.loc[::7]))  # много редких значений
+    reservoir = Reservoir(500, strata="s", seed=0, max_strata=8)
+    for batch in _stream(df, 3_000):
+        reservoir.update(batch)
+    assert len(reservoir._slots) <= 9
+    assert OTHER_STRATUM in reservoir._slots and "NaN" in reservoir._slots
+    sample = reservoir.sample()
+    assert sample["s"].isna().any()
+    assert abs(len(sample) - 500) <= 10
+
+def test_arrow_batches():
+    df = _frame(10_000, strata=3)
+    reservoir = Reservoir(300, strata="s", seed=0)
+    for batch in pa.Table.from_pandas(df, preserve_index=False).to_batches(max_chunksize=1_000):
+        reservoir.update(batch)
+    sample = reservoir.sample()
+    assert abs(len(sample) - 300) <= 3 and list(sample.columns) == ["s", "v"]
+
+def test_empty_and_single_row():
+    df = _frame(10)
+    reservoir = Reservoir(5, strata="s")
+    reservoir.update(df.iloc[:0])
+    assert reservoir.sample().empty and reservoir.seen == 0
+    reservoir.update(df.iloc[:1])
+    pd.testing.assert_frame_equal(reservoir.sample(), df.iloc[:1])
+    uniform = Reservoir(5)
+    uniform.update(df.iloc[:3])
+    assert len(uniform.sample()) == 3
+    version = uniform.version
+    uniform.update(df.iloc[3:])
+    assert uniform.version == version + 1 and len(uniform.sample()) == 5
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+from utils.sketches import QuantileSketch, column_sketches
+
+QS = np.array([0.0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1.0])
+
+def _rank_error(values, estimates, qs):
+    """Отклонение ранга найденных значений от запрошенных долей (по отсортированным данным)."""
+    values = np.sort(values)
+    lo = np.searchsorted(values, estimates, side='left') / len(values)
+    hi = np.searchsorted(values, estimates, side='right') / len(values)
+    # Значение с повторами занимает отрезок рангов [lo, hi]
+    return np.maximum(np.maximum(lo - qs, qs - hi), 0.0).max()
+
+@pytest.mark.parametrize("dist", ["normal", "exponential", "integers"])
+def test_quantiles_within_rank_error(dist):
+    rng = np.random.default_rng(0)
+    values = {"normal": lambda: rng.normal(size=200_000),
+              "exponential": lambda: rng.exponential(size=200_000),
+              "integers": lambda: rng.integers(0, 20, 200_000).astype('float64')}[dist]()
+    sketch = QuantileSketch(k=500)
+    for start in range(0, len(values), 7_000):
+        sketch.update(values[start:start + 7_000])
+    estimates = sketch.quantiles(QS)
+    assert sketch.n == len(values)
+    assert _rank_error(values, estimates, QS) < 0.01
+    assert estimates[0] == values.min() and estimates[-1] == values.max()
+    # Память не растёт с числом строк
+    assert sketch.nbytes() < 10 * 500 * 8
+
+def test_small_input_is_exact():
+    values = np.array([5.0, 1.0, 3.0, 2.0, 4.0])
+    sketch = QuantileSketch().update(values)
+    assert _rank_error(values, sketch.quantiles(QS), QS) <= 1 / len(values)
+    assert sketch.quantile(0.5) == np.quantile(values, 0.5, method='inverted_cdf')
+
+def test_merge_matches_single_pass():
+    rng = np.random.default_rng(1)
+    values = rng.normal(size=120_000)
+    parts = np.array_split(values, 6)
+    merged = QuantileSketch(k=500, seed=1)
+    for seed, part in enumerate(parts):
+        merged.merge(QuantileSketch(k=500, seed=seed + 2).update(part))
+    assert merged.n == len(values)
+    assert _rank_error(values, merged.quantiles(QS), QS) < 0.01
+    assert merged.min == values.min() and merged.max == values.max()
+    # Слияние с пустым скетчем ничего не меняет
+    before = merged.quantiles(QS)
+    assert np.array_equal(merged.merge(QuantileSketch()).quantiles(QS), before)
+    assert np.array_equal(QuantileSketch().merge(merged).quantiles(QS), before)
+
+def test_nan_empty_and_single_row():
+    empty = QuantileSketch()
+    assert empty.n == 0 and np.isnan(empty.quantiles(QS)).all()
+    assert np.isnan(QuantileSketch().update(np.array([np.nan, np.nan])).quantile(0.5))
+    assert np.isnan(QuantileSketch().update(np.empty(0)).quantile(0.5))
+    single = QuantileSketch().update(np.array([np.nan, 7.5]))
+    assert single.n == 1
+    assert (single.quantiles(QS) == 7.5).all()
+    rng = np.random.default_rng(2)
+    values = rng.normal(size=50_000)
+    with_gaps = values.copy()
+    with_gaps[::3] = np.nan
+    sketch = QuantileSketch(k=500).update(with_gaps)
+    kept = with_gaps[~np.isnan(with_gaps)]
+    assert sketch.n == len(kept)
+    assert _rank_error(kept, sketch.quantiles(QS), QS) < 0.01
+
+def test_column_sketches_over_chunks():
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame({"x": rng.normal(size=30_000), "n": rng.integers(0, 100, 30_000),
+                       "empty": np.full(30_000, np.nan)})
+    chunks = (df.iloc[start:start + 4_000] for start in range(0, len(df), 4_000))
+    sketches = column_sketches(chunks, ["x", "n", "empty"], k=500)
+    for col in ["x", "n"]:
+        assert _rank_error(df[col].to_numpy(dtype='float64'), sketches[col].quantiles(QS), QS) < 0.01
+    assert np.isnan(sketches["empty"].quantile(0.5))
@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+import pytest
+from utils.stats import (STATS_COLUMNS, StatsState, cached_correlations, cached_extended_stats, clear_cache,
+                         detect_outliers, get_extended_stats, record_delta)
+
+@pytest.fixture(autouse=True)
+def copy_on_write():
+    with pd.option_context("mode.copy_on_write", True):
+        clear_cache()
+        yield
+        clear_cache()
+
+def _frame(rows=5_000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "x": rng.normal(size=rows),
+        "y": rng.exponential(size=rows),
+        "n": rng.integers(0, 50, rows),
+        "gaps": rng.normal(size=rows),
+        "empty": np.full(rows, np.nan),
+        "s": np.array(["a", "b"])[rng.integers(0, 2, rows)].astype(object),
+    })
+    df.loc[df.index[::7], "gaps"] = np.nan
+    return df
+
+def _moment_stats(values):
+    """Асимметрия и эксцесс по правилам scipy.stats (смещённые, NaN при пропусках и нулевой дисперсии)."""
+    if np.isnan(values).any() or not len(values):
+        return np.nan, np.nan
+    centered = values - values.mean()
+    m2 = (centered ** 2).mean()
+    if m2 <= (np.finfo(np.float64).resolution * values.mean()) ** 2:
+        return np.nan, np.nan
+    return (centered ** 3).mean() / m2 ** 1.5, (centered ** 4).mean() / m2 ** 2 - 3.0
+
+def _reference(df):
+    """Эталон get_extended_stats, посчитанный средствами pandas по каждому столбцу."""
+    rows = []
+    for col in df.select_dtypes(include=['number']).columns:
+        series = df[col].astype('float64')
+        mean, std = series.mean(), series.std()
+        skew, kurtosis = _moment_stats(series.to_numpy())
+        rows.append([col, mean, series.median(), series.min(), series.max(), std,
+                     std / mean * 100 if mean != 0 else np.nan,
+                     series.quantile(0.25), series.quantile(0.75), skew, kurtosis])
+    return pd.DataFrame(rows, columns=STATS_COLUMNS)
+
+def _assert_stats(result, df):
+    pd.testing.assert_frame_equal(result.reset_index(drop=True), _reference(df),
+                                  check_dtype=False, check_exact=False, rtol=1e-7, atol=1e-9)
+
+def _assert_state(state, df):
+    _assert_stats(state.extended_stats(df), df)
+    corr = state.correlations(df)
+    expected = df.select_dtypes(include=['number']).corr()
+    if corr is None:
+        assert len(expected.columns) < 2
+    else:
+        pd.testing.assert_frame_equal(corr, expected, check_exact=False, rtol=1e-7, atol=1e-9)
+    reference = detect_outliers(df)
+    for col, entry in state.outliers(df).items():
+        assert entry["count"] == reference[col]["count"]
+        assert np.array_equal(entry["mask"], reference[col]["mask"])
+
+def _built_state(df):
+    state = StatsState(df)
+    state.extended_stats(df)
+    state.correlations(df)
+    state.outliers(df)
+    return state
+
+@pytest.mark.parametrize("rows", [0, 1, 2, 5_000])
+def test_get_extended_stats_matches_pandas(rows):
+    df = _frame().iloc[:rows]
+    _assert_stats(get_extended_stats(df), df)
+    _assert_state(_built_state(df), df)
+
+def test_constant_column():
+    df = pd.DataFrame({"c": np.full(100, 3.0), "x": np.arange(100.0)})
+    result = get_extended_stats(df)
+    assert np.isnan(result.loc[0, "Асимметрия"]) and result.loc[0, "Стд. отклонение"] == 0
+    _assert_stats(result, df)
+
+def _edited(df, positions, col, values):
+    edited = df.copy()
+    edited.iloc[positions, edited.columns.get_loc(col)] = values
+    return edited
+
+def test_apply_edit():
+    df = _frame()
+    state = _built_state(df)
+    positions = np.array([3, 10, 10, 4_999])
+    new = _edited(df, positions, "x", [100.0, -5.0, -5.0, np.nan])
+    _assert_state(state.apply(df, new, {"edited": positions, "columns": {"x"}}), new)
+    # Правка, затрагивающая минимум, максимум и столбец с пропусками
+    positions = np.array([int(df["y"].to_numpy().argmax()), 7])
+    new = _edited(df, positions, "gaps", [0.0, 1e6])
+    new = _edited(new, positions[:1], "y", [0.0])
+    _assert_state(state.apply(df, new, {"edited": positions, "columns": None}), new)
+
+def test_apply_delete_add_reorder():
+    df = _frame()
+    state = _built_state(df)
+    dropped = np.arange(0, len(df), 3)
+    deleted = df.drop(df.index[dropped])
+    deleted_state = state.apply(df, deleted, {"deleted": dropped})
+    _assert_state(deleted_state, deleted)
+
+    extra = _frame(300, seed=1)
+    added = pd.concat([deleted, extra], ignore_index=True)
+    added_state = deleted_state.apply(deleted, added, {"added": len(extra)})
+    _assert_state(added_state, added)
+
+    shuffled = added.sample(frac=1.0, random_state=0)
+    _assert_state(added_state.apply(added, shuffled, {"reordered": True}), shuffled)
+
+def test_apply_down_to_single_row_and_empty():
+    df = _frame(50)
+    state = _built_state(df)
+    single = df.iloc[[17]]
+    keep_one = np.setdiff1d(np.arange(len(df)), [17])
+    _assert_state(state.apply(df, single, {"deleted": keep_one}), single)
+    empty = df.iloc[:0]
+    _assert_state(state.apply(df, empty, {"deleted": np.arange(len(df))}), empty)
+
+def test_apply_drop_column_and_rejects_mismatch():
+    df = _frame()
+    state = _built_state(df)
+    narrowed = df.drop(columns=["y"])
+    _assert_state(state.apply(df, narrowed, {"columns": set()}), narrowed)
+    widened = df.assign(z=1.0)
+    assert state.apply(df, widened, {"columns": {"z"}}) is None
+    assert state.apply(df, df.iloc[:-1], {"edited": [0]}) is None
+
+def test_record_delta_carries_state():
+    df = _frame()
+    new = _edited(df, np.array([5]), "n", [10_000])
+    assert not record_delta(df, new, {"edited": [5], "columns": {"n"}})
+    cached_extended_stats(df)
+    cached_correlations(df)
+    assert record_delta(df, new, {"edited": [5], "columns": {"n"}})
+    _assert_stats(cached_extended_stats(new), new)
+    pd.testing.assert_frame_equal(cached_correlations(new), new.select_dtypes(include=['number']).corr(),
+                                  check_exact=False, rtol=1e-7, atol=1e-9)
+
+def test_cached_stats_with_filter():
+    df = _frame()
+    filtered = df[df["n"] >= 10]
+    _assert_stats(cached_extended_stats(df, filter_col="n", filter_value=10), filtered)
+    _assert_stats(cached_extended_stats(df, filter_col="n", filter_value=45), df[df["n"] >= 45])
@@ -0,0 +1,105 @@
+import threading
+import time
+import pytest
+from utils.store import DatasetStore
+
+class _Value:
+    def __init__(self, key):
+        self.key = key
+        self.removed = False
+
+    def remove(self):
+        self.removed = True
+
+def test_concurrent_acquire_builds_once():
+    store = DatasetStore()
+    keys = [f"k{i}" for i in range(100)]
+    builds = {key: 0 for key in keys}
+    leases = []
+    leases_lock = threading.Lock()
+
+    def build(key):
+        builds[key] += 1
+        time.sleep(0.001)
+        return _Value(key)
+
+    def session(offset):
+        for key in keys:
+            if offset:
+                # Часть сессий приходит ровно к концу построения
+                time.sleep(0.0009 * offset)
+            lease = store.acquire(key, lambda key=key: build(key))
+            with leases_lock:
+                leases.append(lease)
+
+    threads = [threading.Thread(target=session, args=(i % 3,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(count == 1 for count in builds.values()), {k: c for k, c in builds.items() if c != 1}
+    assert sum(lease.built for lease in leases) == len(keys)
+    assert {row["key"]: row["refs"] for row in store.stats()} == {key: len(threads) for key in keys}
+    assert not store._building
+    assert store.misses == len(keys) and store.hits == len(keys) * (len(threads) - 1)
+
+class _SteppingLock:
+    """Блокировка хранилища, которая после каждого освобождения вызывает on_release."""
+
+    def __init__(self, on_release):
+        self._lock = threading.Lock()
+        self.on_release = on_release
+
+    def __enter__(self):
+        self._lock.acquire()
+
+    def __exit__(self, *exc):
+        self._lock.release()
+        self.on_release()
+
+def test_session_arriving_after_build_reuses_entry():
+    # Вторая сессия приходит сразу после того, как build() вернул значение, и до
+    # того, как первая вернула ссылку: она должна получить тот же набор
+    store = DatasetStore()
+    builds, late = [], []
+    first = threading.current_thread()
+
+    def build():
+        builds.append(_Value("k"))
+        return builds[-1]
+
+    def on_release():
+        if threading.current_thread() is first and builds and not late:
+            thread = threading.Thread(target=lambda: late.append(store.acquire("k", build)))
+            late.append(thread)
+            thread.start()
+            thread.join(timeout=1.0)
+
+    store._lock = _SteppingLock(on_release)
+    lease = store.acquire("k", build)
+    late[0].join()
+    assert len(builds) == 1
+    assert late[1].value is lease.value and not late[1].built
+    assert store.stats()[0]["refs"] == 2
+
+def test_failed_build_releases_building_lock():
+    store = DatasetStore()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        store.acquire("k", fail)
+    assert not store._building and "k" not in store
+    assert store.acquire("k", lambda: None) is None and not store._building
+    lease = store.acquire("k", lambda: _Value("k"))
+    assert lease.built and lease.value.key == "k"
+
+def test_release_and_eviction_remove_value():
+    store = DatasetStore(idle_seconds=0)
+    lease = store.acquire("k", lambda: _Value("k"))
+    value = lease.value
+    assert store.evict_idle() == 0
+    lease.release()
+    assert store.evict_idle() == 1 and value.removed and "k" not in store
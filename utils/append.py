@@ -0,0 +1,131 @@
+import time
+import numpy as np
+import pandas as pd
+from utils.data_loader import detect_format, read_column_names
+from utils.profiling import profiled
+
+def _read_batch(file, fmt, reference, engine="c"):
+    """Читает только столбцы reference; строковые и категориальные — как строки, без вывода типов."""
+    columns = reference.columns.tolist()
+    present = read_column_names(file, fmt)
+    missing = [col for col in columns if col not in present]
+    if missing:
+        raise ValueError(f"В пакете нет столбцов: {', '.join(map(str, missing))}")
+    if fmt == "parquet":
+        return pd.read_parquet(file, columns=columns)
+    if fmt == "feather":
+        return pd.read_feather(file, columns=columns)
+    text = {col: object for col in columns
+            if pd.api.types.is_object_dtype(reference[col]) or isinstance(reference[col].dtype, pd.CategoricalDtype)}
+    return pd.read_csv(file, usecols=columns, dtype=text, engine=engine)[columns]
+
+def _fits(values, dtype):
+    """True, если числовые значения пакета без потерь помещаются в тип столбца таблицы."""
+    if np.issubdtype(dtype, np.integer):
+        if not pd.api.types.is_integer_dtype(values):
+            return False
+        info = np.iinfo(dtype)
+        return not len(values) or (values.min() >= info.min and values.max() <= info.max)
+    if dtype == np.float32 and values.dtype != np.float32:
+        as_float = values.to_numpy(dtype='float64', na_value=np.nan)
+        return np.array_equal(as_float.astype(np.float32).astype(np.float64), as_float, equal_nan=True)
+    return np.issubdtype(dtype, np.floating)
+
+def conform_batch(reference, batch):
+    """
+    Приводит пакет к схеме таблицы. Возвращает (пакет, расширения): расширения —
+    {столбец: новый тип} для столбцов таблицы, которые нужно расширить (целые -> вещественные,
+    новые категории), чтобы склейка не превращала столбцы в object. Ошибка — ValueError.
+    """
+    batch = batch.copy(deep=False)
+    widen = {}
+    for col in reference.columns:
+        dtype = reference[col].dtype
+        values = batch[col]
+        if isinstance(dtype, pd.CategoricalDtype):
+            new = pd.Index(pd.unique(values.dropna())).difference(dtype.categories, sort=False)
+            if len(new):
+                dtype = pd.CategoricalDtype(dtype.categories.append(new), ordered=dtype.ordered)
+                widen[col] = dtype
+            batch[col] = values.astype(dtype)
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            try:
+                batch[col] = pd.to_datetime(values).astype(dtype)
+            except (ValueError, TypeError) as e:
+                raise ValueError(f"Столбец {col}: значения не разбираются как даты ({e})")
+        elif pd.api.types.is_bool_dtype(dtype):
+            if values.dtype != dtype:
+                widen[col] = object
+        elif pd.api.types.is_numeric_dtype(dtype):
+            if not pd.api.types.is_numeric_dtype(values):
+                try:
+                    values = pd.to_numeric(values)
+                except (ValueError, TypeError):
+                    raise ValueError(f"Столбец {col}: в пакете нечисловые значения")
+            if _fits(values, dtype):
+                batch[col] = values.astype(dtype)
+            else:
+                widen[col] = np.result_type(dtype, values.dtype)
+                batch[col] = values.astype(widen[col])
+        else:
+            batch[col] = values.astype(dtype)
+    return batch, widen
+
+def append_rows(df, batch, widen=None, renumber=True):
+    """
+    Таблица с пакетом в конце. Расширяются только столбцы из widen, остальные
+    склеиваются как есть; индекс пакета продолжает целочисленный индекс таблицы
+    (renumber=False — индекс пакета сохраняется).
+    """
+    if widen:
+        df = df.copy(deep=False)
+        for col, dtype in widen.items():
+            df[col] = df[col].astype(dtype)
+        batch = batch.copy(deep=False)
+        for col, dtype in widen.items():
+            batch[col] = batch[col].astype(dtype)
+    batch = batch.copy(deep=False)
+    if renumber and (isinstance(df.index, pd.RangeIndex) or pd.api.types.is_integer_dtype(df.index)):
+        start = int(df.index.max()) + 1 if len(df) else 0
+        batch.index = pd.RangeIndex(start, start + len(batch))
+    return pd.concat([df, batch])
+
+def batch_profile(batch):
+    """Профиль пропусков пакета в формате missing_info загрузчика (счётчики и суммы числовых столбцов)."""
+    numeric = batch.select_dtypes(include=['number'])
+    missing_per_col = {col: int(count) for col, count in batch.isna().sum().items()}
+    return {
+        "total_missing": int(sum(missing_per_col.values())),
+        "numeric_cols": numeric.columns.tolist(),
+        "categorical_cols": batch.select_dtypes(include=['object', 'category']).columns.tolist(),
+        "missing_per_col": missing_per_col,
+        "sums": {col: (float(total), int(count)) for col, total, count in zip(numeric.columns, numeric.sum(), numeric.count())}
+    }
+
+def merge_profile(profile, added):
+    """Профиль пропусков таблицы после добавления пакета: счётчики и суммы складываются."""
+    merged = dict(profile)
+    merged["missing_per_col"] = {col: profile["missing_per_col"].get(col, 0) + added["missing_per_col"].get(col, 0)
+                                 for col in profile["missing_per_col"]}
+    merged["total_missing"] = int(sum(merged["missing_per_col"].values()))
+    sums = dict(profile.get("sums", {}))
+    for col, (total, count) in added["sums"].items():
+        if col in sums:
+            sums[col] = (sums[col][0] + total, sums[col][1] + count)
+    merged["sums"] = sums
+    return merged
+
+@profiled("loader")
+def read_batch(file, reference, engine="c", fmt=None):
+    """
+    Разбирает только новый файл по схеме таблицы reference. Возвращает пакет, расширения
+    типов (conform_batch) и отчёт: строки, время разбора, строк в секунду.
+    """
+    start = time.perf_counter()
+    fmt = detect_format(file, fmt)
+    batch, widen = conform_batch(reference, _read_batch(file, fmt, reference, engine))
+    elapsed = time.perf_counter() - start
+    report = {"rows": len(batch), "seconds": elapsed,
+              "rows_per_sec": len(batch) / elapsed if elapsed > 0 else float("inf"),
+              "memory_mb": batch.memory_usage(index=True, deep=True).sum() / 1024 ** 2}
+    return batch, widen, report
@@ -0,0 +1,204 @@
+import sys
+import hashlib
+import weakref
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# Отпечатки уже посчитанных фреймов: id(df) -> (weakref, отпечаток)
+_fingerprints = {}
+_fingerprints_lock = threading.Lock()
+# Хэши столбцов по массиву данных: id(базового массива) -> (weakref, {(адрес, форма, шаги, тип): хэш}).
+# Фреймы с copy-on-write (правки, история, поверхностные копии) разделяют массивы
+# неизменённых столбцов, поэтому новый фрейм хэширует только изменённые столбцы
+_column_hashes = {}
+
+def _forget(key):
+    with _fingerprints_lock:
+        _fingerprints.pop(key, None)
+
+def _forget_buffer(key):
+    with _fingerprints_lock:
+        _column_hashes.pop(key, None)
+
+def _buffer_key(values):
+    """Базовый массив и положение в нём: одинаковый ключ — те же байты (массивы не меняются на месте)."""
+    base = values
+    while isinstance(base.base, np.ndarray):
+        base = base.base
+    interface = values.__array_interface__
+    return base, (interface["data"][0], values.shape, values.strides, values.dtype.str)
+
+def _hash_values(series):
+    """Хэш всех значений столбца (без индекса)."""
+    try:
+        hashed = pd.util.hash_pandas_object(series, index=False).to_numpy()
+    except TypeError:
+        # Нехэшируемые значения (списки, словари) — хэшируем текстовое представление
+        hashed = pd.util.hash_pandas_object(series.astype(str), index=False).to_numpy()
+    return hashlib.blake2b(hashed.tobytes(), digest_size=16).digest()
+
+def _hash_buffer(values, compute):
+    """Хэш столбца с памятью по его массиву данных."""
+    base, key = _buffer_key(values)
+    with _fingerprints_lock:
+        known = _column_hashes.get(id(base))
+        digest = known[1].get(key) if known is not None and known[0]() is base else None
+    if digest is not None:
+        return digest
+    digest = compute()
+    with _fingerprints_lock:
+        known = _column_hashes.get(id(base))
+        if known is None or known[0]() is not base:
+            known = _column_hashes[id(base)] = (weakref.ref(base), {})
+            weakref.finalize(base, _forget_buffer, id(base))
+        known[1][key] = digest
+    return digest
+
+def _column_hash(series):
+    """
+    Хэш всех значений столбца. Числа, даты и bool хэшируются по байтам массива,
+    категориальные — по кодам и словарю, остальные — через hash_pandas_object.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        categories = pd.util.hash_pandas_object(series.cat.categories).to_numpy()
+        codes_hash = _hash_buffer(codes, lambda: hashlib.blake2b(np.ascontiguousarray(codes).data, digest_size=16).digest())
+        ordered = b"ordered" if series.cat.ordered else b""
+        return codes_hash + hashlib.blake2b(categories.tobytes() + ordered, digest_size=16).digest()
+    if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biufmM':
+        values = series.to_numpy()
+        return _hash_buffer(values, lambda: hashlib.blake2b(
+            np.ascontiguousarray(values).view(np.uint8).data, digest_size=16).digest())
+    if isinstance(series.dtype, np.dtype):  # object
+        values = series.to_numpy()
+        return _hash_buffer(values, lambda: _hash_values(series))
+    return _hash_values(series)  # типы-расширения: без памяти по массиву
+
+def _compute_fingerprint(df):
+    digest = hashlib.blake2b(digest_size=16)
+    header = (df.shape, [str(col) for col in df.columns], [str(dtype) for dtype in df.dtypes])
+    digest.update(repr(header).encode('utf-8'))
+    if isinstance(df.index, pd.RangeIndex):
+        digest.update(repr((df.index.start, df.index.stop, df.index.step)).encode('utf-8'))
+    else:
+        digest.update(_hash_values(df.index.to_series()))
+    for i in range(df.shape[1]):
+        digest.update(_column_hash(df.iloc[:, i]))
+    return digest.hexdigest()
+
+def dataframe_fingerprint(df):
+    """
+    Отпечаток содержимого DataFrame: форма, имена и типы столбцов, индекс и хэши
+    всех значений каждого столбца. Хэш столбца запоминается по его массиву данных,
+    поэтому фреймы, разделяющие неизменённые столбцы (copy-on-write), хэшируют
+    только изменённые. Отпечаток запоминается для объекта: фрейм и его массивы
+    после первого вызова считаются неизменяемыми (после изменения на месте
+    вызовите forget_fingerprint).
+    """
+    key = id(df)
+    with _fingerprints_lock:
+        cached = _fingerprints.get(key)
+    if cached is not None and cached[0]() is df:
+        return cached[1]
+    fingerprint = _compute_fingerprint(df)
+    with _fingerprints_lock:
+        _fingerprints[key] = (weakref.ref(df), fingerprint)
+    weakref.finalize(df, _forget, key)
+    return fingerprint
+
+def forget_fingerprint(df):
+    """Сбрасывает запомненный отпечаток фрейма и хэши его столбцов (после изменения на месте)."""
+    _forget(id(df))
+    for i in range(df.shape[1]):
+        series = df.iloc[:, i]
+        values = series.cat.codes.to_numpy() if isinstance(series.dtype, pd.CategoricalDtype) else series.to_numpy()
+        if isinstance(values, np.ndarray):
+            base, _ = _buffer_key(values)
+            _forget_buffer(id(base))
+
+def clear_fingerprints():
+    """Сбрасывает все запомненные отпечатки и хэши столбцов."""
+    with _fingerprints_lock:
+        _fingerprints.clear()
+        _column_hashes.clear()
+
+def estimate_nbytes(value):
+    """Приблизительный размер результата в байтах."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_nbytes(k) + estimate_nbytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(estimate_nbytes(v) for v in value)
+    if callable(getattr(value, "nbytes", None)):
+        return int(value.nbytes())  # Объекты состояния сообщают свой размер сами
+    return sys.getsizeof(value)
+
+class ResultCache:
+    """
+    Потокобезопасный LRU-кэш результатов, ограниченный суммарным размером в байтах.
+    Значения отдаются без копирования — вызывающий код не должен их изменять.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # ключ -> (значение, размер)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = estimate_nbytes(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if size > self.max_bytes:
+                return value  # Не кэшируем то, что больше всего бюджета
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+        return value
+
+    def get_or_compute(self, key, compute):
+        """Возвращает значение из кэша или вычисляет и сохраняет его."""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = self.put(key, compute())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def info(self):
+        """Счётчики попаданий/промахов и занятый объём."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes
+            }
@@ -0,0 +1,136 @@
+import weakref
+import numpy as np
+import pandas as pd
+from utils.profiling import profiled
+
+MAX_EXACT_UNIQUES = 50_000  # выше — столбец хранит только самые частые значения (top-k)
+TOP_K = 1_000               # значений в режиме top-k
+
+class ColumnDictionary:
+    """
+    Словарное кодирование одного столбца: коды строк (-1 — пропуск), словарь значений
+    и частоты. Для обычной кардинальности хранит все значения в отсортированном порядке;
+    при кардинальности выше max_exact — только top_k самых частых (heavy hitters):
+    отбор через argpartition по частотам, без сортировки всего словаря.
+    """
+
+    def __init__(self, series, max_exact=MAX_EXACT_UNIQUES, top_k=TOP_K):
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Коды категорий уже есть — используются без копии
+            codes = series.cat.codes.to_numpy()
+            uniques = series.cat.categories
+        else:
+            codes, uniques = pd.factorize(series, use_na_sentinel=True)
+            if len(uniques) < np.iinfo(np.int32).max:
+                codes = codes.astype(np.int32, copy=False)
+        self.max_exact, self.top_k = max_exact, top_k
+        self._set(codes, pd.Index(uniques), np.bincount(codes[codes >= 0], minlength=len(uniques)))
+
+    def _set(self, codes, uniques, counts):
+        self.codes = codes
+        self.uniques = uniques
+        self.counts = counts
+        self.missing = int(len(codes) - counts.sum())
+        self.cardinality = int(np.count_nonzero(counts))
+        self.truncated = self.cardinality > self.max_exact
+        present = np.flatnonzero(counts)
+        if self.truncated:
+            top_k = min(self.top_k, len(present))
+            top = present[np.argpartition(-counts[present], top_k - 1)[:top_k]]
+            # Порядок по убыванию частоты (при равенстве — по первому появлению)
+            self._options = top[np.lexsort((top, -counts[top]))]
+        else:
+            try:
+                self._options = present[np.argsort(uniques[present], kind='stable')]
+            except TypeError:  # несравнимые значения в object — порядок первого появления
+                self._options = present
+
+    def extend(self, series):
+        """
+        Словарь для столбца, дополненного строками series в конце: новые значения
+        получают следующие коды, частоты дополняются подсчётом только по series.
+        """
+        codes = self.uniques.get_indexer(series)
+        unknown = (codes < 0) & series.notna().to_numpy()
+        uniques = self.uniques
+        if unknown.any():
+            new_codes, new_values = pd.factorize(series[unknown])
+            codes[unknown] = new_codes + len(uniques)
+            uniques = uniques.append(pd.Index(new_values))
+        codes = codes.astype(self.codes.dtype if len(uniques) < np.iinfo(self.codes.dtype).max else np.int64)
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        counts[:len(self.counts)] += self.counts
+        extended = ColumnDictionary.__new__(ColumnDictionary)
+        extended.max_exact, extended.top_k = self.max_exact, self.top_k
+        extended._set(np.concatenate([self.codes, codes]), uniques, counts)
+        return extended
+
+    def options(self):
+        """Значения для выбора: все отсортированные или top-k самых частых."""
+        return self.uniques[self._options].tolist()
+
+    def top(self, n=5):
+        """Список (значение, частота) n самых частых значений."""
+        present = np.flatnonzero(self.counts)
+        n = min(n, len(present))
+        if not n:
+            return []
+        best = present[np.argpartition(-self.counts[present], n - 1)[:n]]
+        best = best[np.lexsort((best, -self.counts[best]))]
+        return [(self.uniques[code], int(self.counts[code])) for code in best]
+
+    def isin_mask(self, selected):
+        """Маска строк, значение которых входит в selected (как Series.isin)."""
+        selected = list(selected)
+        lookup = np.zeros(len(self.uniques) + 1, dtype=bool)  # последний элемент — для пропуска (код -1)
+        positions = self.uniques.get_indexer(pd.Index(selected))
+        lookup[positions[positions >= 0]] = True
+        if any(pd.isna(value) for value in selected):
+            lookup[-1] = True
+        return lookup[self.codes]
+
+    def nbytes(self):
+        return self.codes.nbytes + self.counts.nbytes + self.uniques.memory_usage(deep=True)
+
+class CategoricalIndex:
+    """
+    Словарный индекс нечисловых столбцов одного DataFrame: строится один раз
+    (при загрузке) и переиспользуется для вариантов фильтров, фильтров на равенство
+    и статистики по категориальным столбцам вместо повторных unique()/value_counts.
+    Как FilterIndex, держит слабую ссылку на фрейм и проверяется через matches.
+    """
+
+    @profiled("loader")
+    def __init__(self, df, columns=None, max_exact=MAX_EXACT_UNIQUES, top_k=TOP_K):
+        self._df_ref = weakref.ref(df)
+        self.n_rows = len(df)
+        if columns is None:
+            columns = [col for col in df.columns if not pd.api.types.is_numeric_dtype(df[col])]
+        self.columns = {col: ColumnDictionary(df[col], max_exact, top_k) for col in columns}
+
+    def matches(self, df):
+        """True, если индекс построен для этого объекта DataFrame."""
+        return self._df_ref() is df
+
+    def __contains__(self, col):
+        return col in self.columns
+
+    def __getitem__(self, col):
+        return self.columns[col]
+
+    def options(self, col, selected=()):
+        """Варианты выбора для столбца; уже выбранные значения сохраняются, даже если вне top-k."""
+        options = self.columns[col].options()
+        known = set(options)
+        return options + [value for value in selected if value not in known]
+
+    def extend(self, df, batch):
+        """Индекс для df — этого фрейма с добавленными в конец строками batch (словари дополняются по batch)."""
+        extended = CategoricalIndex.__new__(CategoricalIndex)
+        extended._df_ref = weakref.ref(df)
+        extended.n_rows = len(df)
+        extended.columns = {col: entry.extend(batch[col]) for col, entry in self.columns.items()}
+        return extended
+
+    def nbytes(self):
+        return sum(entry.nbytes() for entry in self.columns.values())
@@ -0,0 +1,284 @@
+import os
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from utils.cache import ResultCache, dataframe_fingerprint
+
+BLOCK_COLS = 256          # столбцов в блоке матричного произведения
+HEATMAP_MAX_COLS = 50     # столбцов на тепловой карте по умолчанию
+
+_rank_cache = ResultCache(max_bytes=256 * 1024 ** 2)
+
+def _ranks(df, col, fingerprint):
+    """Ранги столбца для Спирмена (средние для повторов, NaN сохраняются), кэшируются по данным."""
+    return _rank_cache.get_or_compute(
+        (fingerprint, col),
+        lambda: df[col].rank(method='average').to_numpy(dtype='float64', na_value=np.nan)
+    )
+
+def _order(df, col, fingerprint):
+    """Позиции значений столбца по возрастанию (NaN в конце), кэшируются по данным."""
+    return _rank_cache.get_or_compute(
+        (fingerprint, col, "order"),
+        lambda: np.argsort(df[col].to_numpy(dtype='float64', na_value=np.nan), kind='stable')
+    )
+
+def _subset_ranks(values, order, rows):
+    """
+    Средние ранги values среди строк rows (маска без NaN). Порядок подмножества
+    берётся из готового порядка всего столбца, так что сортировки нет — O(n).
+    """
+    positions = order[rows[order]]
+    ordered = values[positions]
+    new = np.empty(len(ordered), dtype=bool)
+    new[:1] = True
+    np.not_equal(ordered[1:], ordered[:-1], out=new[1:])
+    starts = np.flatnonzero(new)
+    counts = np.diff(np.append(starts, len(ordered)))
+    ranks = np.empty(len(values))
+    ranks[positions] = np.repeat(starts + (counts + 1) / 2, counts)
+    return ranks[rows]
+
+def _pearson(x, y):
+    """Корреляция Пирсона двух массивов без пропусков (NaN при n < 2 и нулевой дисперсии)."""
+    if len(x) < 2:
+        return np.nan
+    x, y = x - x.mean(), y - y.mean()
+    var = (x @ x) * (y @ y)
+    return float(np.clip((x @ y) / np.sqrt(var), -1.0, 1.0)) if var > 0 else np.nan
+
+def _pairwise_spearman(df, cols, has_nan, fingerprint):
+    """
+    Поправка блоков Спирмена для пар со столбцами с пропусками: как в pandas, такая пара
+    переранжируется по строкам, где есть оба значения (ранги целого столбца верны только
+    для полных столбцов). Возвращает функцию (срез a, срез b, блок) -> исправленный блок.
+    """
+    def column(j):
+        values = df[cols[j]].to_numpy(dtype='float64', na_value=np.nan)
+        return j, values, ~np.isnan(values), _order(df, cols[j], fingerprint)
+
+    def ranks(entry, rows, own):
+        j, values, _, order = entry
+        # По всем своим непустым строкам ранги столбца уже посчитаны и лежат в кэше
+        return _ranks(df, cols[j], fingerprint)[rows] if own else _subset_ranks(values, order, rows)
+
+    def spearman(first, second):
+        x_valid, y_valid = first[2], second[2]
+        rows = x_valid & y_valid
+        x_own = not has_nan[second[0]] or np.array_equal(rows, x_valid)
+        y_own = not has_nan[first[0]] or np.array_equal(rows, y_valid)
+        return _pearson(ranks(first, rows, x_own), ranks(second, rows, y_own))
+
+    def exact(a, b, block):
+        rows = np.arange(a.start, a.stop)
+        columns = np.arange(b.start, b.stop)
+        others = {j: column(j) for j in columns}
+        for i in rows[has_nan[a]]:
+            first = others[i] if i in others else column(i)
+            block[i - a.start] = [spearman(first, others[j]) for j in columns]
+        for j in columns[has_nan[b]]:
+            # Пары, где пропуски у обоих, уже посчитаны по строкам
+            for i in rows[~has_nan[a]]:
+                block[i - a.start, j - b.start] = spearman(column(i), others[j])
+        return block
+    return exact
+
+def _prepared_block(df, cols, method):
+    """
+    Матрица n×k для корреляции: исходные значения (Пирсон) или ранги (Спирмен).
+    Столбцы центрируются один раз; для данных без пропусков ещё и нормируются.
+    Возвращает (значения с NaN -> 0, маска непустых или None, поправка блоков или None).
+    Для Спирмена с пропусками поправка пересчитывает пары со столбцами с пропусками
+    попарно (_pairwise_spearman); ранги целого столбца верны только для полных столбцов.
+    """
+    exact = None
+    if method == "spearman":
+        fingerprint = dataframe_fingerprint(df)
+        block = np.column_stack([_ranks(df, col, fingerprint) for col in cols])
+    else:
+        block = df[cols].to_numpy(dtype='float64', na_value=np.nan)
+    block = np.array(block, dtype='float64', order='F')
+    nan_mask = np.isnan(block)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nanmean(block, axis=0) if nan_mask.any() else block.mean(axis=0)
+        block -= mean
+        if not nan_mask.any():
+            norm = np.sqrt((block * block).sum(axis=0))
+            block /= np.where(norm > 0, norm, np.nan)
+            return block, None, None
+    if method == "spearman":
+        exact = _pairwise_spearman(df, cols, nan_mask.any(axis=0), fingerprint)
+    block[nan_mask] = 0.0
+    return block, (~nan_mask).astype('float64'), exact
+
+def _block_corr(values, valid, a, b):
+    """Корреляции столбцов блока a со столбцами блока b (попарно полные строки, если есть пропуски)."""
+    xa, xb = values[:, a], values[:, b]
+    if valid is None:
+        return np.clip(xa.T @ xb, -1.0, 1.0)
+    ma, mb = valid[:, a], valid[:, b]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        n = ma.T @ mb
+        sx, sy = xa.T @ mb, ma.T @ xb
+        cov = xa.T @ xb - sx * sy / n
+        var_x = (xa * xa).T @ mb - sx * sx / n
+        var_y = ma.T @ (xb * xb) - sy * sy / n
+        corr = cov / np.sqrt(var_x * var_y)
+    corr[(n < 2) | (var_x <= 0) | (var_y <= 0)] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+def _iter_blocks(values, valid, block_size, n_jobs, exact=None):
+    """
+    Считает верхний треугольник блоков параллельно; отдаёт (срез a, срез b, матрица).
+    exact(a, b, блок) — поправка блока (см. _prepared_block).
+    """
+    def compute(a, b):
+        block = _block_corr(values, valid, a, b)
+        return block if exact is None else exact(a, b, block)
+
+    k = values.shape[1]
+    starts = range(0, k, block_size)
+    pairs = [(slice(i, min(i + block_size, k)), slice(j, min(j + block_size, k)))
+             for i in starts for j in starts if j >= i]
+    workers = n_jobs or os.cpu_count() or 1
+    if workers == 1 or len(pairs) == 1:
+        for a, b in pairs:
+            yield a, b, compute(a, b)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # NumPy отпускает GIL в матричных произведениях, поэтому потоков достаточно
+        for (a, b), result in zip(pairs, pool.map(lambda pair: compute(*pair), pairs)):
+            yield a, b, result
+
+def correlation_matrix(df, method="pearson", block_size=BLOCK_COLS, n_jobs=None):
+    """
+    Корреляционная матрица числовых столбцов как блочное матричное произведение.
+    Пропуски обрабатываются попарно (как в pandas). Для Спирмена ранги кэшируются
+    по столбцам; пары со столбцами с пропусками переранжируются по общим строкам,
+    как в pandas. Другие методы (kendall) считаются pandas.
+    """
+    numeric_df = df.select_dtypes(include=['number'])
+    cols = numeric_df.columns.tolist()
+    if method not in ("pearson", "spearman"):
+        return numeric_df.corr(method=method)
+    values, valid, exact = _prepared_block(numeric_df, cols, method)
+    result = np.empty((len(cols), len(cols)))
+    for a, b, block in _iter_blocks(values, valid, block_size, n_jobs, exact):
+        result[a, b] = block
+        result[b, a] = block.T
+    if valid is None:
+        # Для нормированных данных диагональ равна 1, кроме постоянных столбцов
+        diagonal = np.diag(result).copy()
+        np.fill_diagonal(result, np.where(np.isnan(diagonal), np.nan, 1.0))
+    return pd.DataFrame(result, index=cols, columns=cols)
+
+def top_correlated_pairs(df, k=20, method="pearson", block_size=BLOCK_COLS, n_jobs=None):
+    """
+    k пар столбцов с наибольшей по модулю корреляцией. Полная матрица не хранится:
+    из каждого блока отбираются лучшие k кандидатов.
+    """
+    numeric_df = df.select_dtypes(include=['number'])
+    cols = numeric_df.columns.tolist()
+    empty = pd.DataFrame(columns=['Столбец 1', 'Столбец 2', 'Корреляция'])
+    if len(cols) < 2:
+        return empty
+    values, valid, exact = _prepared_block(numeric_df, cols, method)
+    rows, columns, scores = [], [], []
+    for a, b, block in _iter_blocks(values, valid, block_size, n_jobs, exact):
+        i, j = np.indices(block.shape)
+        i, j = i + a.start, j + b.start
+        keep = (j > i) & ~np.isnan(block)
+        i, j, r = i[keep], j[keep], block[keep]
+        if len(r) > k:
+            best = np.argpartition(-np.abs(r), k)[:k]
+            i, j, r = i[best], j[best], r[best]
+        rows.append(i); columns.append(j); scores.append(r)
+    i, j, r = np.concatenate(rows), np.concatenate(columns), np.concatenate(scores)
+    if not len(r):
+        return empty
+    order = np.argsort(-np.abs(r), kind='stable')[:k]
+    return pd.DataFrame({
+        'Столбец 1': [cols[x] for x in i[order]],
+        'Столбец 2': [cols[x] for x in j[order]],
+        'Корреляция': r[order]
+    })
+
+def comoment_sums(x, shift):
+    """
+    Сливаемые суммы для корреляции Пирсона по попарно полным строкам (как в _block_corr):
+    (число пар, Σx, Σx², Σxy) для блока x, сдвинутого на shift. Суммы частей складываются.
+    """
+    x = np.array(x, dtype='float64') - shift
+    valid = ~np.isnan(x)
+    x[~valid] = 0.0
+    m = valid.astype('float64')
+    return m.T @ m, x.T @ m, (x * x).T @ m, x.T @ x
+
+def correlation_from_sums(sums, cols):
+    """Матрица корреляций Пирсона из сумм comoment_sums."""
+    n, sx, sxx, sxy = sums
+    sy = sx.T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = sxx.T - sy * sy / n
+        corr = cov / np.sqrt(var_x * var_y)
+    corr[(n < 2) | (var_x <= 0) | (var_y <= 0)] = np.nan
+    return pd.DataFrame(np.clip(corr, -1.0, 1.0), index=cols, columns=cols)
+
+def comoment_shift(x):
+    """Сдвиг для comoment_sums: средние столбцов (0 для пустых) — для численной устойчивости."""
+    with np.errstate(invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nan_to_num(np.nanmean(x, axis=0)) if len(x) else np.zeros(x.shape[1])
+
+def correlation_from_chunks(chunks, cols):
+    """
+    Корреляция Пирсона по последовательности кусков DataFrame (данные на диске):
+    за один проход накапливаются суммы comoment_sums по всем кускам.
+    Значения сдвигаются на средние первого куска для численной устойчивости.
+    """
+    shift, sums = None, None
+    for chunk in chunks:
+        x = chunk[cols].to_numpy(dtype='float64', na_value=np.nan)
+        if shift is None:
+            shift = comoment_shift(x)
+        part = comoment_sums(x, shift)
+        sums = part if sums is None else tuple(total + value for total, value in zip(sums, part))
+    if sums is None:
+        return pd.DataFrame(np.nan, index=cols, columns=cols)
+    return correlation_from_sums(sums, cols)
+
+def pairs_from_matrix(corr, k=20):
+    """k пар с наибольшей по модулю корреляцией из готовой матрицы (формат top_correlated_pairs)."""
+    values = corr.to_numpy()
+    i, j = np.triu_indices(len(values), k=1)
+    r = values[i, j]
+    keep = ~np.isnan(r)
+    i, j, r = i[keep], j[keep], r[keep]
+    order = np.argsort(-np.abs(r), kind='stable')[:k]
+    cols = corr.columns
+    return pd.DataFrame({
+        'Столбец 1': [cols[x] for x in i[order]],
+        'Столбец 2': [cols[x] for x in j[order]],
+        'Корреляция': r[order]
+    })
+
+def clustered_heatmap_matrix(corr, max_cols=HEATMAP_MAX_COLS):
+    """
+    Усечённая и упорядоченная матрица для тепловой карты: оставляет max_cols столбцов
+    с наибольшими связями и упорядочивает их иерархической кластеризацией
+    (scipy подгружается только здесь), чтобы связанные признаки шли рядом.
+    """
+    strength = corr.abs().where(~np.eye(len(corr), dtype=bool)).max().fillna(0)
+    cols = strength.sort_values(ascending=False, kind='stable').index[:max_cols]
+    subset = corr.loc[cols, cols]
+    if len(cols) > 2:
+        from scipy.cluster.hierarchy import linkage, leaves_list
+        from scipy.spatial.distance import squareform
+        distance = 1 - subset.abs().fillna(0).to_numpy()
+        np.fill_diagonal(distance, 0)
+        order = leaves_list(linkage(squareform(np.clip(distance, 0, None), checks=False), method='average'))
+        subset = subset.iloc[order, order]
+    return subset
@@ -1,19 +1,389 @@
+import os
+import sys
+import time
+import hashlib
+import warnings
+import threading
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
+from utils.store import get_store
+from utils.profiling import profiled
 
-def load_data(file):
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_CHUNKSIZE = 200_000           # строк на чанк для движка "c"
+ARROW_BLOCK_SIZE = 64 * 1024 ** 2     # байт на блок для движка "pyarrow"
+CATEGORY_MAX_RATIO = 0.5              # доля уникальных значений, ниже которой строки -> category
+CATEGORY_MAX_UNIQUE = 10_000
+# Целые не ужимаются ниже int32: с int8/int16 выражения пользователя и метрики
+# (df.a * 1000, суммы) переполнялись бы молча, чего с исходным int64 не было
+MIN_INTEGER_DTYPE = np.int32
+HASH_BLOCK_SIZE = 16 * 1024 ** 2     # байт за шаг при хэшировании файловых объектов без буфера
+MAX_REMEMBERED_UPLOADS = 64
+# Расширение файла -> колоночный формат (всё остальное читается как CSV)
+BINARY_FORMATS = {".parquet": "parquet", ".pq": "parquet", ".feather": "feather", ".arrow": "feather", ".ipc": "feather"}
+
+def _peak_rss_mb():
+    """Пиковый RSS процесса в МБ (None, если платформа не поддерживает)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+def _looks_like_dates(sample, probe_size=200):
+    """True, если первые probe_size непустых строк выборки разбираются как даты."""
+    values = sample.dropna().head(probe_size)
+    if values.empty or not all(isinstance(value, str) for value in values):
+        return False
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        parsed = pd.to_datetime(values, errors="coerce")
+    return bool(parsed.notna().all())
+
+def _plan_dtypes(sample):
+    """
+    По первому чанку решает, как ужимать столбцы: 'integer', 'float',
+    'datetime' или 'category'. Столбцы без плана остаются как есть.
+    """
+    plan = {}
+    for col in sample.columns:
+        series = sample[col]
+        if pd.api.types.is_bool_dtype(series):
+            continue
+        if pd.api.types.is_integer_dtype(series):
+            plan[col] = "integer"
+        elif pd.api.types.is_float_dtype(series):
+            plan[col] = "float"
+        elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            if _looks_like_dates(series):
+                plan[col] = "datetime"
+            else:
+                n_unique = series.nunique(dropna=True)
+                if n_unique <= CATEGORY_MAX_UNIQUE and n_unique <= CATEGORY_MAX_RATIO * max(len(series), 1):
+                    plan[col] = "category"
+    return plan
+
+def _downcast_integer(series):
+    """int64 -> MIN_INTEGER_DTYPE, если значения в него помещаются; более узкие типы не используются."""
+    target = np.dtype(MIN_INTEGER_DTYPE)
+    if series.dtype.kind not in "iu" or series.dtype.itemsize <= target.itemsize:
+        return series
+    info = np.iinfo(target)
+    if len(series) and (series.min() < info.min or series.max() > info.max):
+        return series
+    return series.astype(target)
+
+def _downcast_float(series):
+    """float64 -> float32 только если значения сохраняются без потерь."""
+    if series.dtype != np.float64:
+        return series
+    values = series.to_numpy()
+    narrow = values.astype(np.float32)
+    if np.array_equal(narrow.astype(np.float64), values, equal_nan=True):
+        return pd.Series(narrow, index=series.index, name=series.name)
+    return series
+
+def _apply_plan(chunk, plan):
+    """Приводит столбцы чанка к компактным типам согласно плану."""
+    for col, kind in plan.items():
+        if col not in chunk.columns:
+            continue
+        series = chunk[col]
+        if kind == "integer" and pd.api.types.is_integer_dtype(series):
+            chunk[col] = _downcast_integer(series)
+        elif kind in ("integer", "float") and pd.api.types.is_float_dtype(series):
+            chunk[col] = _downcast_float(series)
+        elif kind == "datetime" and not pd.api.types.is_datetime64_any_dtype(series):
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                parsed = pd.to_datetime(series, errors="coerce")
+            # Не теряем значения: если что-то не разобралось, чанк остаётся строковым
+            if parsed.isna().sum() == series.isna().sum():
+                chunk[col] = parsed
+        elif kind == "category" and not isinstance(series.dtype, pd.CategoricalDtype):
+            chunk[col] = series.astype("category")
+    return chunk
+
+def _unify_chunks(chunks, plan):
+    """Согласует типы столбцов между чанками перед склейкой."""
+    for col, kind in plan.items():
+        dtypes = [chunk[col].dtype for chunk in chunks if col in chunk.columns]
+        if kind == "category" and all(isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes):
+            # Общий словарь категорий, иначе concat превратит столбец в object. Чанк, где столбец
+            # целиком пустой, прочитан как float и не имеет категорий — в объединение не входит;
+            # категории остальных приводятся к object (числа в части чанков читаются как числа)
+            parts = [chunk[col].cat.rename_categories(chunk[col].cat.categories.astype(object))
+                     for chunk in chunks if len(chunk[col].cat.categories)]
+            if parts:
+                categories = pd.api.types.union_categoricals(parts, ignore_order=True).categories
+            else:
+                categories = pd.Index([], dtype=object)
+            for chunk in chunks:
+                if chunk[col].cat.categories.dtype != object:
+                    chunk[col] = chunk[col].cat.rename_categories(chunk[col].cat.categories.astype(object))
+                chunk[col] = chunk[col].cat.set_categories(categories)
+        elif kind == "datetime" and not all(pd.api.types.is_datetime64_any_dtype(dtype) for dtype in dtypes):
+            # Часть чанков не разобралась как даты — оставляем столбец строковым целиком
+            for chunk in chunks:
+                if pd.api.types.is_datetime64_any_dtype(chunk[col].dtype):
+                    chunk[col] = chunk[col].astype(object).where(chunk[col].notna(), None)
+    return chunks
+
+def detect_format(file, fmt=None):
+    """Определяет формат файла по явному указанию или расширению имени: csv, parquet, feather."""
+    if fmt:
+        return fmt
+    name = file if isinstance(file, (str, os.PathLike)) else getattr(file, "name", "")
+    return BINARY_FORMATS.get(os.path.splitext(str(name))[1].lower(), "csv")
+
+@profiled("loader")
+def read_column_names(file, fmt=None):
+    """Список столбцов файла без чтения данных (для проекции столбцов при загрузке)."""
+    fmt = detect_format(file, fmt)
+    try:
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+            names = pq.read_schema(file).names
+        elif fmt == "feather":
+            import pyarrow.ipc as ipc
+            with ipc.open_file(file) as reader:
+                names = reader.schema.names
+        else:
+            names = pd.read_csv(file, nrows=0).columns.tolist()
+        # Служебный столбец индекса pandas не показываем
+        return [name for name in names if not name.startswith("__index_level_")]
+    finally:
+        if hasattr(file, "seek"):
+            file.seek(0)
+
+def _load_columnar(file, fmt, columns):
+    """Читает Parquet/Feather через Arrow: пропуски считаются по метаданным столбцов без копии данных."""
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        table = pq.read_table(file, columns=columns)
+    else:
+        import pyarrow.feather as feather
+        table = feather.read_table(file, columns=columns, memory_map=isinstance(file, (str, os.PathLike)))
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    missing_per_col = {}
+    for name in table.column_names:
+        column = table.column(name)
+        missing = column.null_count
+        if pa.types.is_floating(column.type):
+            # NaN, записанные не как null (не из pandas), тоже пропуски
+            missing += pc.sum(pc.is_nan(column)).as_py() or 0
+        missing_per_col[name] = missing
+    df = table.to_pandas(split_blocks=True, self_destruct=True)
+    del table
+    return df, missing_per_col
+
+def _iter_pandas_chunks(file, chunksize, columns=None):
+    with pd.read_csv(file, chunksize=chunksize, usecols=columns) as reader:
+        for chunk in reader:
+            yield chunk
+
+def _iter_arrow_chunks(file, columns=None):
+    from pyarrow import csv as pa_csv
+    reader = pa_csv.open_csv(
+        file,
+        read_options=pa_csv.ReadOptions(block_size=ARROW_BLOCK_SIZE),
+        convert_options=pa_csv.ConvertOptions(strings_can_be_null=True, include_columns=columns)
+    )
+    try:
+        empty = True
+        for batch in reader:
+            empty = False
+            yield batch.to_pandas()
+        if empty:
+            yield reader.schema.empty_table().to_pandas()
+    finally:
+        reader.close()
+
+def _read_chunks(file, engine, chunksize, optimize_dtypes, missing_per_col, columns=None, sums=None):
+    """
+    Читает файл по чанкам, ужимая типы и накапливая число пропусков по столбцам,
+    а в sums — сумму и число значений числовых столбцов (для заполнения средним).
+    """
+    if engine == "pyarrow":
+        iterator = _iter_arrow_chunks(file, columns)
+    else:
+        iterator = _iter_pandas_chunks(file, chunksize, columns)
+    chunks = []
+    plan = None
+    for chunk in iterator:
+        counts = chunk.isna().sum()
+        for col, count in counts.items():
+            missing_per_col[col] = missing_per_col.get(col, 0) + int(count)
+        if sums is not None:
+            numeric = chunk.select_dtypes(include=['number'])
+            for col, total, count in zip(numeric.columns, numeric.sum(), numeric.count()):
+                prev_total, prev_count = sums.get(col, (0.0, 0))
+                sums[col] = (prev_total + float(total), prev_count + int(count))
+        if optimize_dtypes:
+            if plan is None:
+                plan = _plan_dtypes(chunk)
+            chunk = _apply_plan(chunk, plan)
+        chunks.append(chunk)
+    return chunks, plan or {}
+
+def _load_csv(file, engine, chunksize, optimize_dtypes, columns):
+    """Читает CSV по чанкам; возвращает фрейм, пропуски и суммы по столбцам и фактический движок."""
+    missing_per_col, sums = {}, {}
+    try:
+        chunks, plan = _read_chunks(file, engine, chunksize, optimize_dtypes, missing_per_col, columns, sums)
+    except Exception as e:
+        if engine != "pyarrow" or not hasattr(file, "seek"):
+            raise
+        # Arrow выводит типы по первому блоку; при конфликте перечитываем движком pandas
+        print(f"pyarrow не смог разобрать файл ({e}), повтор движком pandas")
+        file.seek(0)
+        engine = "c"
+        missing_per_col, sums = {}, {}
+        chunks, plan = _read_chunks(file, engine, chunksize, optimize_dtypes, missing_per_col, columns, sums)
+
+    if len(chunks) == 1:
+        df = chunks[0]
+    else:
+        df = pd.concat(_unify_chunks(chunks, plan), ignore_index=True, copy=False)
+    return df, missing_per_col, sums, engine
+
+@profiled("loader")
+def load_data(file, engine="c", chunksize=DEFAULT_CHUNKSIZE, optimize_dtypes=True, columns=None, fmt=None):
     """
-    Загружает данные из CSV файла и проверяет наличие пропусков.
-    Возвращает DataFrame и словарь с информацией о пропусках.
+    Загружает данные из CSV, Parquet или Feather (Arrow IPC) и проверяет наличие пропусков.
+    Формат определяется по fmt или расширению имени файла; columns — проекция столбцов.
+    CSV читается по чанкам: engine "c" (pandas, по chunksize строк) или "pyarrow"
+    (потоковое чтение Arrow). optimize_dtypes: ужимать целые (не ниже int32)/вещественные, строки
+    с малым числом уникальных значений переводить в category, разбирать даты
+    (план строится по первому чанку).
+    Возвращает DataFrame и словарь с информацией о пропусках и отчётом о загрузке.
     """
     try:
-        df = pd.read_csv(file)
+        start = time.perf_counter()
+        fmt = detect_format(file, fmt)
+        columns = list(columns) if columns else None
+        if fmt == "csv":
+            df, missing_per_col, sums, used_engine = _load_csv(file, engine, chunksize, optimize_dtypes, columns)
+        else:
+            df, missing_per_col = _load_columnar(file, fmt, columns)
+            sums = {}
+            used_engine = f"pyarrow ({fmt})"
+
+        elapsed = time.perf_counter() - start
         missing_info = {
-            "total_missing": df.isnull().sum().sum(),
+            "total_missing": int(sum(missing_per_col.values())),
             "numeric_cols": df.select_dtypes(include=['number']).columns.tolist(),
             "categorical_cols": df.select_dtypes(include=['object', 'category']).columns.tolist(),
-            "missing_per_col": df.isnull().sum().to_dict()
+            "missing_per_col": {col: missing_per_col.get(col, 0) for col in df.columns},
+            # Суммы и число значений числовых столбцов из того же прохода (CSV): среднее для заполнения
+            "sums": {col: sums[col] for col in df.columns if col in sums and df[col].dtype.kind in 'iuf'},
+            "load_report": {
+                "engine": used_engine,
+                "rows": len(df),
+                "seconds": elapsed,
+                "rows_per_sec": len(df) / elapsed if elapsed > 0 else float("inf"),
+                "memory_mb": df.memory_usage(index=True, deep=True).sum() / 1024 ** 2,
+                "peak_rss_mb": _peak_rss_mb()
+            }
         }
         return df, missing_info
     except Exception as e:
         print(f"Ошибка при загрузке данных: {e}")
-        return None, None
\ No newline at end of file
+        return None, None
+
+# --- Кэш разбора: файл разбирается один раз на содержимое, формат, движок и столбцы ---
+# Разобранные файлы лежат в общем хранилище наборов (utils.store): фреймы разделяются
+# с сессиями (copy-on-write), а файлы, которые никто не держит, вытесняются по простою
+_upload_hashes = OrderedDict()  # file_id загрузки Streamlit -> хэш содержимого
+_upload_hashes_lock = threading.Lock()
+
+class ParsedFile:
+    """Разобранный файл в кэше: фрейм и информация о пропусках (размер известен из отчёта загрузки)."""
+
+    def __init__(self, df, missing_info):
+        self.df = df
+        self.missing_info = missing_info
+
+    def nbytes(self):
+        return int(self.missing_info["load_report"]["memory_mb"] * 1024 ** 2)
+
+    def view(self, key, from_cache):
+        """Вид для сессии: поверхностная копия фрейма и информация с ключом разбора."""
+        return self.df.copy(deep=False), dict(self.missing_info, ingest_key=key, from_cache=from_cache)
+
+def _hash_file_object(file):
+    digest = hashlib.blake2b(digest_size=16)
+    if hasattr(file, "getbuffer"):
+        digest.update(file.getbuffer())  # BytesIO и загрузки Streamlit — без копии
+    else:
+        position = file.tell()
+        file.seek(0)
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+        file.seek(position)
+    return digest.hexdigest()
+
+def content_hash(file):
+    """
+    Ключ содержимого файла для кэша разбора. Путь — по абсолютному пути, размеру и времени
+    изменения; файловый объект — blake2b его байтов (для загрузки Streamlit считается
+    один раз на file_id, а не на каждом перезапуске).
+    """
+    if isinstance(file, (str, os.PathLike)):
+        stat = os.stat(file)
+        return ("path", os.path.abspath(file), stat.st_size, stat.st_mtime_ns)
+    upload_id = getattr(file, "file_id", None)
+    if upload_id is not None:
+        with _upload_hashes_lock:
+            known = _upload_hashes.get(upload_id)
+        if known is not None:
+            return known
+    key = ("content", _hash_file_object(file))
+    if upload_id is not None:
+        with _upload_hashes_lock:
+            _upload_hashes[upload_id] = key
+            while len(_upload_hashes) > MAX_REMEMBERED_UPLOADS:
+                _upload_hashes.popitem(last=False)
+    return key
+
+def ingest_key(file, engine="c", columns=None, fmt=None):
+    """Ключ разбора: содержимое файла, формат, движок и столбцы."""
+    return (content_hash(file), detect_format(file, fmt), engine, tuple(columns) if columns else None)
+
+@profiled("loader")
+def acquire_parsed(file, engine="c", columns=None, fmt=None):
+    """
+    Ссылка (utils.store.Lease) на разобранный файл в общем хранилище наборов:
+    файл с тем же содержимым разбирается один раз на процесс, сколько бы сессий
+    его ни открыли. Значение ссылки — ParsedFile; None, если файл не разобрался.
+    """
+    fmt = detect_format(file, fmt)
+    key = ingest_key(file, engine, columns, fmt)
+
+    def build():
+        df, missing_info = load_data(file, engine=engine, columns=columns, fmt=fmt)
+        return ParsedFile(df, missing_info) if df is not None else None
+    return get_store().acquire(key, build, label=getattr(file, "name", str(file)))
+
+def load_data_cached(file, engine="c", columns=None, fmt=None):
+    """
+    load_data с кэшем разбора по содержимому файла, формату, движку и столбцам:
+    перезапуски страницы и повторная загрузка того же файла не разбирают его заново.
+    Возвращает поверхностную копию фрейма (copy-on-write защищает кэш от правок)
+    и информацию о пропусках с ключом разбора ingest_key и признаком from_cache.
+    Ссылка на разобранный файл не удерживается — чтобы набор не вытеснялся, пока
+    сессия с ним работает, используйте acquire_parsed.
+    """
+    lease = acquire_parsed(file, engine, columns, fmt)
+    if lease is None:
+        return None, None
+    try:
+        return lease.value.view(lease.key, not lease.built)
+    finally:
+        lease.release()
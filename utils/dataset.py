@@ -0,0 +1,435 @@
+import os
+import tempfile
+import uuid
+import numpy as np
+import pandas as pd
+from utils.cache import ResultCache
+from utils.data_loader import ARROW_BLOCK_SIZE, DEFAULT_CHUNKSIZE, content_hash, detect_format
+from utils.store import DISK, get_store
+
+SCAN_BATCH_ROWS = 256_000   # строк в пакете файла на диске (единица чтения при сканировании)
+DATASET_DIR = os.path.join(tempfile.gettempdir(), "eda_datasets")
+
+# Агрегаты по файлам на диске: ключ содержит путь, время изменения и фильтры набора
+_scan_cache = ResultCache(max_bytes=64 * 1024 ** 2)
+
+def _new_path():
+    os.makedirs(DATASET_DIR, exist_ok=True)
+    return os.path.join(DATASET_DIR, f"{uuid.uuid4().hex}.arrow")
+
+def _source_batches(file, fmt, columns=None):
+    """Пакеты Arrow из исходного файла без чтения его целиком в память."""
+    import pyarrow as pa
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(file)
+        yield from parquet.iter_batches(batch_size=SCAN_BATCH_ROWS, columns=columns)
+        if not parquet.metadata.num_rows:
+            schema = parquet.schema_arrow
+            yield pa.RecordBatch.from_pylist([], schema=pa.schema([schema.field(name) for name in columns or schema.names]))
+    elif fmt == "feather":
+        import pyarrow.ipc as ipc
+        reader = ipc.open_file(file)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            yield batch.select(columns) if columns else batch
+    else:
+        from pyarrow import csv as pa_csv
+        reader = pa_csv.open_csv(
+            file,
+            read_options=pa_csv.ReadOptions(block_size=ARROW_BLOCK_SIZE),
+            convert_options=pa_csv.ConvertOptions(strings_can_be_null=True, include_columns=columns)
+        )
+        try:
+            empty = True
+            for batch in reader:
+                empty = False
+                yield batch
+            if empty:
+                yield pa.RecordBatch.from_pylist([], schema=reader.schema)
+        finally:
+            reader.close()
+
+def _pandas_csv_batches(file, columns=None):
+    """Запасной путь для CSV: чанки pandas, типы столбцов фиксируются по первому чанку."""
+    import pyarrow as pa
+    schema = None
+    with pd.read_csv(file, chunksize=DEFAULT_CHUNKSIZE, usecols=columns) as chunks:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            schema = table.schema
+            yield from table.to_batches()
+
+def _observed(batches, on_batch):
+    """Пропускает пакеты дальше, передавая каждый в on_batch."""
+    for batch in batches:
+        on_batch(batch)
+        yield batch
+
+def _write_batches(batches, path):
+    """Пишет пакеты в файл Arrow IPC (по SCAN_BATCH_ROWS строк); возвращает False, если пакетов не было."""
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    writer, schema = None, None
+    try:
+        for batch in batches:
+            if writer is None:
+                schema = batch.schema
+                writer = ipc.new_file(pa.OSFile(path, "wb"), schema)
+            writer.write_table(pa.Table.from_batches([batch]).cast(schema), max_chunksize=SCAN_BATCH_ROWS)
+    finally:
+        if writer is not None:
+            writer.close()
+    return writer is not None
+
+def _filter_mask(frame, filters):
+    """Маска строк куска по фильтрам ({столбец: {'min', 'max'} или {'selected'}}), как в FilterIndex."""
+    mask = np.ones(len(frame), dtype=bool)
+    for col, config in filters.items():
+        if col not in frame.columns:
+            continue
+        values = frame[col]
+        if pd.api.types.is_numeric_dtype(values):
+            if config.get('min') is not None:
+                mask &= (values >= config['min']).to_numpy()
+            if config.get('max') is not None:
+                mask &= (values <= config['max']).to_numpy()
+        elif config.get('selected'):
+            mask &= values.isin(config['selected']).to_numpy()
+    return mask
+
+class DiskDataset:
+    """
+    Набор данных на локальном диске для файлов больше оперативной памяти.
+    Хранится одним файлом Arrow IPC, который отображается в память (memory map):
+    пакеты читаются без копирования, ОС сама вытесняет неиспользуемые страницы.
+    Фильтры задаются лениво (where) и применяются при каждом проходе по пакетам;
+    в pandas материализуются только нужная страница строк, выборка или агрегат.
+    """
+
+    def __init__(self, path, filters=None, _reader=None):
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+        self.path = path
+        self.filters = dict(filters or {})
+        self._reader = _reader or ipc.open_file(pa.memory_map(path, "r"))
+        lengths = [self._reader.get_batch(i).num_rows for i in range(self._reader.num_record_batches)]
+        self._starts = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])
+        self._len = None
+
+    @classmethod
+    def from_file(cls, file, fmt=None, columns=None, path=None, on_batch=None):
+        """
+        Переписывает CSV, Parquet или Feather в файл Arrow IPC на диске потоково,
+        пакет за пакетом (файл целиком в память не читается). file — путь или файловый объект.
+        on_batch(batch) вызывается для каждого прочитанного пакета (выборка, прогресс);
+        on_batch(None) — чтение началось заново другим движком.
+        """
+        import pyarrow as pa
+        fmt = detect_format(file, fmt)
+        columns = list(columns) if columns else None
+        path = path or _new_path()
+        observe = (lambda batches: _observed(batches, on_batch)) if on_batch else (lambda batches: batches)
+        try:
+            written = _write_batches(observe(_source_batches(file, fmt, columns)), path)
+        except pa.ArrowInvalid as e:
+            if fmt != "csv" or not hasattr(file, "seek"):
+                raise
+            # Arrow выводит типы по первому блоку; при конфликте переписываем файл через pandas
+            print(f"pyarrow не смог разобрать файл ({e}), повтор движком pandas")
+            file.seek(0)
+            if on_batch:
+                on_batch(None)
+            written = _write_batches(observe(_pandas_csv_batches(file, columns)), path)
+        if not written:
+            raise ValueError("Файл не содержит данных.")
+        return cls(path)
+
+    @staticmethod
+    def store_key(file, fmt=None, columns=None):
+        """Ключ набора в общем хранилище: содержимое исходного файла и выбор столбцов."""
+        return ("disk", content_hash(file), detect_format(file, fmt), tuple(columns) if columns else None)
+
+    @classmethod
+    def acquire(cls, file, fmt=None, columns=None):
+        """
+        Ссылка (utils.store.Lease) на набор в общем хранилище: файл с тем же содержимым
+        переписывается на диск один раз, а все сессии читают один файл через memory map.
+        """
+        return get_store().acquire(cls.store_key(file, fmt, columns), lambda: cls.from_file(file, fmt, columns),
+                                   kind=DISK, label=getattr(file, "name", str(file)))
+
+    @classmethod
+    def adopt(cls, file, dataset, fmt=None, columns=None):
+        """
+        Передаёт готовый набор (например, прогрессивной загрузки) в общее хранилище.
+        Если такой набор там уже есть и им пользуются другие сессии, возвращается ссылка
+        на него, а переданный удаляется; неиспользуемый прежний набор заменяется переданным
+        (у него уже посчитаны точные результаты).
+        """
+        lease = get_store().put(cls.store_key(file, fmt, columns), dataset,
+                                kind=DISK, label=getattr(file, "name", str(file)))
+        if lease.value is not dataset:
+            dataset.remove()
+        return lease
+
+    # --- Описание данных ---
+
+    @property
+    def schema(self):
+        return self._reader.schema
+
+    @property
+    def columns(self):
+        return [name for name in self.schema.names if not name.startswith("__index_level_")]
+
+    @property
+    def meta(self):
+        """Пустой DataFrame с типами столбцов (для выбора виджетов и проверок типов)."""
+        return self.schema.empty_table().to_pandas()[self.columns]
+
+    @property
+    def num_rows(self):
+        """Число строк файла без учёта фильтров."""
+        return int(self._starts[-1])
+
+    def __len__(self):
+        """Число строк с учётом фильтров (считается одним проходом по столбцам фильтров)."""
+        if self._len is None:
+            if not self.filters:
+                self._len = self.num_rows
+            else:
+                self._len = self._memo("len", (), lambda: sum(len(chunk) for chunk in self.scan(columns=[])))
+        return self._len
+
+    def nbytes_on_disk(self):
+        return os.path.getsize(self.path)
+
+    def token(self):
+        """Ключ содержимого для кэшей: файл, время его изменения и фильтры."""
+        stat = os.stat(self.path)
+        return (self.path, stat.st_mtime_ns, repr(sorted(self.filters.items(), key=lambda item: str(item[0]))))
+
+    def _memo(self, name, args, compute):
+        return _scan_cache.get_or_compute((self.token(), name, args), compute)
+
+    def where(self, filters):
+        """Новый набор с дополнительными фильтрами (данные не читаются и не копируются)."""
+        merged = dict(self.filters)
+        merged.update({col: config for col, config in (filters or {}).items() if col in self.columns})
+        return DiskDataset(self.path, merged, _reader=self._reader)
+
+    # --- Сканирование ---
+
+    def _iter_batches(self, columns=None, with_positions=False):
+        """Куски pandas по пакетам файла с применёнными фильтрами; позиции — номера строк в файле."""
+        columns = self.columns if columns is None else [col for col in dict.fromkeys(columns) if col is not None]
+        needed = list(dict.fromkeys(columns + [col for col in self.filters if col in self.columns]))
+        for i in range(self._reader.num_record_batches):
+            frame = self._reader.get_batch(i).select(needed).to_pandas(split_blocks=True)
+            positions = None
+            if self.filters:
+                mask = _filter_mask(frame, self.filters)
+                frame = frame[mask]
+                if with_positions:
+                    positions = self._starts[i] + np.flatnonzero(mask)
+            elif with_positions:
+                positions = np.arange(self._starts[i], self._starts[i + 1])
+            frame = frame[columns]
+            yield (frame, positions) if with_positions else frame
+
+    def scan(self, columns=None):
+        """Генератор отфильтрованных кусков DataFrame (только столбцы columns)."""
+        return self._iter_batches(columns)
+
+    def take(self, positions, columns=None):
+        """Строки с указанными номерами (в заданном порядке); индекс — номера строк в файле."""
+        import pyarrow as pa
+        columns = columns or self.columns
+        positions = np.asarray(positions, dtype=np.int64)
+        batch_ids = np.searchsorted(self._starts, positions, side='right') - 1
+        order = np.argsort(batch_ids, kind='stable')
+        pieces = []
+        for batch_id in np.unique(batch_ids):
+            local = positions[batch_ids == batch_id] - self._starts[batch_id]
+            pieces.append(self._reader.get_batch(int(batch_id)).select(columns).take(pa.array(local)))
+        if not pieces:
+            return self.meta[columns]
+        frame = pa.Table.from_batches(pieces).to_pandas()
+        inverse = np.empty_like(order)
+        inverse[order] = np.arange(len(order))
+        frame = frame.iloc[inverse]
+        frame.index = positions
+        return frame
+
+    def head(self, n=100, columns=None):
+        """Первые n строк (с учётом фильтров)."""
+        pieces, total = [], 0
+        for chunk in self.scan(columns):
+            pieces.append(chunk.head(n - total))
+            total += len(pieces[-1])
+            if total >= n:
+                break
+        return pd.concat(pieces) if pieces else self.meta[columns or self.columns]
+
+    def _sorted_positions(self, sort_config):
+        """Номера строк, упорядоченные по числовому столбцу (NaN в конце), — читается только он."""
+        col, ascending = sort_config['column'], sort_config.get('order', 'asc') == 'asc'
+
+        def compute():
+            keys, positions = [], []
+            for chunk, chunk_positions in self._iter_batches([col], with_positions=True):
+                keys.append(chunk[col].to_numpy(dtype='float64', na_value=np.nan))
+                positions.append(chunk_positions)
+            keys, positions = np.concatenate(keys), np.concatenate(positions)
+            order = np.argsort(keys, kind='stable')
+            n_valid = len(keys) - int(np.isnan(keys).sum())
+            valid, missing = order[:n_valid], order[n_valid:]
+            if not ascending:
+                valid = valid[::-1]
+            return positions[np.concatenate([valid, missing])]
+
+        return self._memo("sorted_positions", (col, ascending), compute)
+
+    def page(self, offset, limit, sort_config=None, columns=None):
+        """Страница строк [offset, offset + limit) после фильтров и сортировки — единственное, что материализуется."""
+        sort_col = (sort_config or {}).get('column')
+        if sort_col in self.columns and pd.api.types.is_numeric_dtype(self.meta[sort_col]):
+            return self.take(self._sorted_positions(sort_config)[offset:offset + limit], columns)
+        pieces, seen = [], 0
+        for chunk in self.scan(columns):
+            if seen + len(chunk) > offset:
+                pieces.append(chunk.iloc[max(offset - seen, 0):offset + limit - seen])
+            seen += len(chunk)
+            if seen >= offset + limit:
+                break
+        if not pieces:
+            return self.meta[columns or self.columns]
+        return pd.concat(pieces)
+
+    def sample_rows(self, max_rows, seed=0, columns=None):
+        """Равномерная выборка не более max_rows строк (бернуллиевская по пакетам, затем усечение)."""
+        total = len(self)
+        if total <= max_rows:
+            return self.to_pandas(columns)
+
+        def compute():
+            rng = np.random.default_rng(seed)
+            rate = min(1.0, max_rows / total * 1.1)
+            pieces = [chunk[rng.random(len(chunk)) < rate] for chunk in self.scan(columns)]
+            sample = pd.concat(pieces)
+            if len(sample) > max_rows:
+                sample = sample.sample(n=max_rows, random_state=seed).sort_index()
+            return sample
+
+        return self._memo("sample", (max_rows, seed, tuple(columns or ())), compute)
+
+    def to_pandas(self, columns=None):
+        """Материализует весь (отфильтрованный) набор — только для данных, помещающихся в память."""
+        pieces = list(self.scan(columns))
+        return pd.concat(pieces) if pieces else self.meta[columns or self.columns]
+
+    def unique_values(self, col, limit=1000):
+        """Самые частые limit значений столбца (для списков выбора в фильтрах)."""
+        def compute():
+            counts = None
+            for chunk in self.scan([col]):
+                part = chunk[col].value_counts(dropna=False)
+                counts = part if counts is None else counts.add(part, fill_value=0)
+            if counts is None:
+                return []
+            return counts.sort_values(ascending=False, kind='stable').index[:limit].tolist()
+        return self._memo("unique", (col, limit), compute)
+
+    def null_counts(self):
+        """Число пропусков по столбцам (null Arrow и NaN)."""
+        def compute():
+            counts = {col: 0 for col in self.columns}
+            for chunk in self.scan():
+                for col, count in chunk.isna().sum().items():
+                    counts[col] += int(count)
+            return counts
+        return self._memo("nulls", (), compute)
+
+    # --- Агрегаты (те же имена и результаты, что у visualizations.aggregation и utils.stats) ---
+
+    def extended_stats(self, selected_cols=None):
+        from utils.stats import extended_stats_from_chunks, _numeric_columns
+        cols = _numeric_columns(self.meta, selected_cols)
+        return self._memo("extended_stats", tuple(cols), lambda: extended_stats_from_chunks(self.scan(cols), cols))
+
+    def outliers(self, selected_cols=None):
+        from utils.stats import outliers_from_chunks, _numeric_columns
+        cols = _numeric_columns(self.meta, selected_cols)
+        return self._memo("outliers", tuple(cols), lambda: outliers_from_chunks(lambda: self.scan(cols), cols))
+
+    def correlations(self, method="pearson"):
+        """Корреляция Пирсона за один проход (ранговые методы требуют всех данных и не поддерживаются)."""
+        from utils.correlation import correlation_from_chunks
+        if method != "pearson":
+            raise ValueError("Для данных на диске доступна только корреляция Пирсона.")
+        cols = self.meta.select_dtypes(include=['number']).columns.tolist()
+        if len(cols) < 2:
+            return None
+        return self._memo("correlations", (), lambda: correlation_from_chunks(self.scan(cols), cols))
+
+    def top_pairs(self, k=20, method="pearson"):
+        from utils.correlation import pairs_from_matrix
+        corr = self.correlations(method)
+        if corr is None:
+            return pd.DataFrame(columns=['Столбец 1', 'Столбец 2', 'Корреляция'])
+        return pairs_from_matrix(corr, k)
+
+    def pivot_table(self, index, columns, values, aggfunc, row_offset=0, max_rows=None):
+        from components.pivot_table import MAX_PIVOT_COLUMNS, pivot_aggregate_from_chunks, wide_pivot
+        index, columns, values = list(index), list(columns or []), list(values)
+        aggfuncs = [aggfunc] if isinstance(aggfunc, str) else list(aggfunc)
+        try:
+            # Длинная таблица агрегатов кэшируется, страницы строятся из неё без повторного чтения
+            long = self._memo(
+                "pivot", (tuple(index), tuple(columns), tuple(values), tuple(aggfuncs)),
+                lambda: pivot_aggregate_from_chunks(self.scan(index + columns + values), index, columns, values, aggfuncs)
+            )
+            return wide_pivot(long, index, columns, values, aggfunc, row_offset, max_rows, MAX_PIVOT_COLUMNS)
+        except Exception as e:
+            return f"Ошибка при построении сводной таблицы: {str(e)}"
+
+    def histogram_frame(self, x_col, nbins=None, color_col=None):
+        from visualizations.aggregation import histogram_from_chunks
+        columns = [x_col, color_col] if color_col else [x_col]
+        return self._memo("histogram", (x_col, nbins, color_col),
+                          lambda: histogram_from_chunks(lambda: self.scan(columns), self.meta, x_col, nbins, color_col))
+
+    def count_frame(self, x_col, color_col=None):
+        from visualizations.aggregation import count_frame_from_chunks
+        columns = [x_col, color_col] if color_col else [x_col]
+        return self._memo("counts", (x_col, color_col),
+                          lambda: count_frame_from_chunks(self.scan(columns), x_col, color_col))
+
+    def box_stats(self, cols):
+        from visualizations.aggregation import box_stats_from_stats
+        stats = self.extended_stats(cols)
+        return self._memo("box", tuple(cols), lambda: box_stats_from_stats(lambda: self.scan(list(stats['Столбец'])), stats))
+
+    def density_grid(self, x_col, y_col, bins=None):
+        from visualizations.aggregation import density_grid_from_chunks, DENSITY_BINS
+        return self._memo("density", (x_col, y_col, bins),
+                          lambda: density_grid_from_chunks(lambda: self.scan([x_col, y_col]), x_col, y_col, bins or DENSITY_BINS))
+
+    def decimate_line(self, x_col, y_col, max_points=None, method="lttb"):
+        from visualizations.aggregation import decimate_line_from_chunks, MAX_LINE_POINTS
+        max_points = max_points or MAX_LINE_POINTS
+        return self._memo("line", (x_col, y_col, max_points, method),
+                          lambda: decimate_line_from_chunks(self.scan([x_col, y_col]), len(self), x_col, y_col, max_points, method))
+
+    def export(self, fmt="csv", name="data"):
+        """Сериализует набор потоково по пакетам; возвращает (байты, имя файла, MIME-тип)."""
+        from utils.export import serialize_chunks
+        return serialize_chunks(self.scan(), fmt, name)
+
+    def remove(self):
+        """Удаляет файл набора с диска."""
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,77 @@
+import io
+import pandas as pd
+from utils.profiling import profiled
+
+# Подпись в интерфейсе -> внутреннее имя формата
+EXPORT_FORMATS = {"CSV": "csv", "Parquet": "parquet", "Feather (Arrow IPC)": "feather"}
+
+_EXTENSIONS = {"csv": "csv", "parquet": "parquet", "feather": "feather"}
+_MIME_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "feather": "application/vnd.apache.arrow.file"
+}
+
+def _columnar_frame(df, index):
+    """Готовит фрейм к записи в Parquet/Feather: строковые имена столбцов, индекс — в столбцы."""
+    if isinstance(df, pd.Series):
+        df = df.to_frame()
+    if index:
+        df = df.reset_index()
+    if isinstance(df.columns, pd.MultiIndex):
+        names = ["_".join(str(level) for level in col if str(level) != "") for col in df.columns]
+    else:
+        names = [str(col) for col in df.columns]
+    if names != list(df.columns):
+        df = df.set_axis(names, axis=1)
+    return df.reset_index(drop=True)
+
+@profiled("export")
+def serialize_frame(df, fmt="csv", index=False, name="data"):
+    """
+    Сериализует DataFrame/Series в CSV, Parquet или Feather.
+    Возвращает (байты, имя файла, MIME-тип).
+    """
+    if fmt == "csv":
+        data = df.to_csv(index=index).encode('utf-8')
+    elif fmt == "parquet":
+        buffer = io.BytesIO()
+        _columnar_frame(df, index).to_parquet(buffer, engine="pyarrow", index=False)
+        data = buffer.getvalue()
+    elif fmt == "feather":
+        buffer = io.BytesIO()
+        _columnar_frame(df, index).to_feather(buffer)
+        data = buffer.getvalue()
+    else:
+        raise ValueError(f"Неизвестный формат экспорта: {fmt}")
+    return data, f"{name}.{_EXTENSIONS[fmt]}", _MIME_TYPES[fmt]
+
+@profiled("export")
+def serialize_chunks(chunks, fmt="csv", name="data"):
+    """
+    Сериализует последовательность кусков DataFrame (например, набора данных на диске)
+    без склейки в один фрейм. Возвращает (байты, имя файла, MIME-тип).
+    """
+    buffer = io.BytesIO()
+    writer, schema = None, None
+    for chunk in chunks:
+        if fmt == "csv":
+            buffer.write(chunk.to_csv(index=False, header=writer is None).encode('utf-8'))
+            writer = True
+            continue
+        import pyarrow as pa
+        table = pa.Table.from_pandas(_columnar_frame(chunk, False), preserve_index=False)
+        if writer is None:
+            schema = table.schema
+            if fmt == "parquet":
+                import pyarrow.parquet as pq
+                writer = pq.ParquetWriter(buffer, table.schema)
+            elif fmt == "feather":
+                import pyarrow.ipc as ipc
+                writer = ipc.new_file(buffer, table.schema)
+            else:
+                raise ValueError(f"Неизвестный формат экспорта: {fmt}")
+        writer.write_table(table.cast(schema))
+    if writer is not None and writer is not True:
+        writer.close()
+    return buffer.getvalue(), f"{name}.{_EXTENSIONS[fmt]}", _MIME_TYPES[fmt]
@@ -1,16 +1,192 @@
+import weakref
+import numpy as np
 import streamlit as st
 import pandas as pd
+from utils.profiling import profiled
 
-def filter_data(df, column, value_range=None, category=None):
+def filter_data(df, column, value_range=None, category=None, index=None):
     """
     Фильтрует DataFrame по колонке.
     value_range: кортеж (min, max) для числовых колонок.
     category: значение для категориальной колонки.
+    index: CategoricalIndex этого фрейма — равенство проверяется по кодам словаря.
     """
+    # Строковые столбцы после загрузки могут быть category — фильтруются так же, как object
+    is_categorical = column in df.select_dtypes(include=['object', 'category']).columns
+    if category and is_categorical and index is not None and index.matches(df) and column in index:
+        return df[index[column].isin_mask([category])]
     filtered_df = df.copy()
     if value_range and column in df.select_dtypes(include=['float64', 'int64']).columns:
         min_val, max_val = value_range
         filtered_df = filtered_df[(filtered_df[column] >= min_val) & (filtered_df[column] <= max_val)]
-    elif category and column in df.select_dtypes(include=['object']).columns:
-        filtered_df = filtered_df[filtered_df[column] == category]
-    return filtered_df
\ No newline at end of file
+    elif category and is_categorical:
+        filtered_df = filtered_df[(filtered_df[column] == category).to_numpy()]
+    return filtered_df
+
+class FilterIndex:
+    """
+    Индекс для фильтрации и сортировки одного датасета. Строится лениво по столбцам
+    один раз и переиспользуется между перезапусками:
+    - числовые столбцы: порядок сортировки и отсортированные значения, диапазон
+      [min, max] находится двумя бинарными поисками;
+    - остальные столбцы: коды словаря (factorize), выбор значений — таблица
+      подстановки по кодам вместо повторного сравнения строк.
+    Маска каждого фильтра кэшируется по предикату, поэтому при изменении одного
+    фильтра пересчитывается только его маска, а строки материализуются один раз.
+    С categorical (CategoricalIndex того же фрейма) коды словаря берутся из него.
+    """
+
+    def __init__(self, df, categorical=None):
+        self._df_ref = weakref.ref(df)
+        self._categorical = categorical if categorical is not None and categorical.matches(df) else None
+        self.n_rows = len(df)
+        self._sorted = {}   # столбец -> (порядок, отсортированные значения без NaN)
+        self._codes = {}    # столбец -> (коды, словарь значений)
+        self._masks = {}    # столбец -> (предикат, маска)
+
+    def matches(self, df):
+        """True, если индекс построен для этого объекта DataFrame."""
+        return self._df_ref() is df
+
+    def _frame(self):
+        df = self._df_ref()
+        if df is None:
+            raise ValueError("Датасет индекса больше не существует.")
+        return df
+
+    def _sorted_column(self, col):
+        if col not in self._sorted:
+            values = self._frame()[col].to_numpy(dtype='float64', na_value=np.nan)
+            order = np.argsort(values, kind='stable')  # NaN попадают в конец
+            n_valid = len(values) - int(np.isnan(values).sum())
+            self._sorted[col] = (order, values[order[:n_valid]])
+        return self._sorted[col]
+
+    def _coded_column(self, col):
+        if col not in self._codes:
+            if self._categorical is not None and col in self._categorical:
+                entry = self._categorical[col]
+                self._codes[col] = (entry.codes, entry.uniques)
+            else:
+                self._codes[col] = pd.factorize(self._frame()[col], use_na_sentinel=True)
+        return self._codes[col]
+
+    def _cached_mask(self, col, predicate, build):
+        cached = self._masks.get(col)
+        if cached is not None and cached[0] == predicate:
+            return cached[1]
+        mask = build()
+        self._masks[col] = (predicate, mask)
+        return mask
+
+    def range_mask(self, col, min_val=None, max_val=None):
+        """Маска строк с min_val <= значение <= max_val (NaN не проходят)."""
+        def build():
+            order, sorted_values = self._sorted_column(col)
+            lo = 0 if min_val is None else np.searchsorted(sorted_values, min_val, side='left')
+            hi = len(sorted_values) if max_val is None else np.searchsorted(sorted_values, max_val, side='right')
+            mask = np.zeros(self.n_rows, dtype=bool)
+            mask[order[lo:hi]] = True
+            return mask
+        return self._cached_mask(col, ('range', min_val, max_val), build)
+
+    def isin_mask(self, col, selected):
+        """Маска строк, значение которых входит в selected (как Series.isin)."""
+        selected = list(selected)
+        def build():
+            codes, uniques = self._coded_column(col)
+            lookup = np.zeros(len(uniques) + 1, dtype=bool)  # последний элемент — для NaN (код -1)
+            positions = pd.Index(uniques).get_indexer(pd.Index(selected))
+            lookup[positions[positions >= 0]] = True
+            if any(pd.isna(value) for value in selected):
+                lookup[-1] = True
+            return lookup[codes]
+        return self._cached_mask(col, ('isin', tuple(sorted(map(repr, selected)))), build)
+
+    @profiled("filter")
+    def extend(self, df, batch, categorical=None):
+        """
+        Индекс для df — этого фрейма с добавленными в конец строками batch. Построенные
+        столбцы дополняются только строками пакета: отсортированные значения — слиянием
+        (np.insert по searchsorted), коды — продолжением словаря, маски диапазонов —
+        проверкой строк пакета. Маски выбора значений пересчитываются лениво по кодам.
+        """
+        extended = FilterIndex(df, categorical)
+        offset = self.n_rows
+        for col, (order, sorted_values) in self._sorted.items():
+            values = batch[col].to_numpy(dtype='float64', na_value=np.nan)
+            batch_order = np.argsort(values, kind='stable')
+            n_valid = len(values) - int(np.isnan(values).sum())
+            added = values[batch_order[:n_valid]]
+            # side='right' сохраняет порядок устойчивой сортировки: старые строки раньше новых
+            at = np.searchsorted(sorted_values, added, side='right')
+            valid = np.insert(order[:len(sorted_values)], at, batch_order[:n_valid] + offset)
+            extended._sorted[col] = (np.concatenate([valid, order[len(sorted_values):], batch_order[n_valid:] + offset]),
+                                     np.insert(sorted_values, at, added))
+        for col, (codes, uniques) in self._codes.items():
+            if extended._categorical is not None and col in extended._categorical:
+                continue  # коды возьмутся из дополненного словарного индекса
+            batch_codes = pd.Index(uniques).get_indexer(batch[col])
+            unknown = (batch_codes < 0) & batch[col].notna().to_numpy()
+            if unknown.any():
+                new_codes, new_values = pd.factorize(batch[col][unknown])
+                batch_codes[unknown] = new_codes + len(uniques)
+                uniques = pd.Index(uniques).append(pd.Index(new_values))
+            extended._codes[col] = (np.concatenate([codes, batch_codes]), uniques)
+        for col, (predicate, mask) in self._masks.items():
+            if predicate[0] != 'range':
+                continue
+            _, min_val, max_val = predicate
+            values = batch[col].to_numpy(dtype='float64', na_value=np.nan)
+            with np.errstate(invalid='ignore'):
+                added = ~np.isnan(values)
+                if min_val is not None:
+                    added &= values >= min_val
+                if max_val is not None:
+                    added &= values <= max_val
+            extended._masks[col] = (predicate, np.concatenate([mask, added]))
+        return extended
+
+    @profiled("filter")
+    def sorted_positions(self, col, ascending=True, mask=None):
+        """Позиции строк (прошедших mask), упорядоченные по столбцу; NaN — в конце."""
+        order, sorted_values = self._sorted_column(col)
+        n_valid = len(sorted_values)
+        valid, missing = order[:n_valid], order[n_valid:]
+        if mask is not None:
+            valid, missing = valid[mask[valid]], missing[mask[missing]]
+        if not ascending:
+            valid = valid[::-1]
+        return np.concatenate([valid, missing])
+
+    def filter_mask(self, filters):
+        """Общая маска фильтров ({столбец: {'min', 'max'} или {'selected'}}); None — фильтров нет."""
+        df = self._frame()
+        masks = []
+        for col, config in filters.items():
+            if col not in df.columns:
+                continue
+            if pd.api.types.is_numeric_dtype(df[col]):
+                min_val, max_val = config.get('min'), config.get('max')
+                if min_val is not None or max_val is not None:
+                    masks.append(self.range_mask(col, min_val, max_val))
+            elif config.get('selected'):
+                masks.append(self.isin_mask(col, config['selected']))
+        return np.logical_and.reduce(masks) if masks else None
+
+    @profiled("filter")
+    def apply(self, filters, sort_config=None):
+        """
+        Применяет фильтры ({столбец: {'min', 'max'} или {'selected'}}) и сортировку
+        ({'column', 'order'}) и материализует результат одной выборкой строк.
+        """
+        df = self._frame()
+        mask = self.filter_mask(filters)
+        sort_col = (sort_config or {}).get('column')
+        if sort_col in df.columns and pd.api.types.is_numeric_dtype(df[sort_col]):
+            positions = self.sorted_positions(sort_col, sort_config.get('order', 'asc') == 'asc', mask)
+        elif mask is not None:
+            positions = np.flatnonzero(mask)
+        else:
+            return df
+        return df.take(positions)
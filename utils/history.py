@@ -0,0 +1,120 @@
+import pandas as pd
+from utils.profiling import profiled
+
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+
+def _series_nbytes(series):
+    return int(series.memory_usage(index=False, deep=True))
+
+class History:
+    """
+    История изменений таблицы с отменой и повтором.
+    Шаг хранит столбцы как отдельные Series: столбцы, не изменившиеся по сравнению
+    с предыдущим шагом, разделяются с ним (copy-on-write), поэтому шаг стоит столько,
+    сколько весят реально изменённые столбцы. Старые шаги вытесняются, когда
+    суммарный объём превышает max_bytes.
+    """
+
+    def __init__(self, df, max_bytes=DEFAULT_MAX_BYTES, label="Исходные данные"):
+        self.max_bytes = max_bytes
+        self._steps = []
+        self.current = -1
+        self.evicted = 0
+        self.push(df, label, copy=False)
+
+    @profiled("history")
+    def push(self, df, label="", copy=True, changed=None):
+        """
+        Добавляет новое состояние, отбрасывая шаги для повтора.
+        copy: изменённые столбцы копируются, чтобы шаг не удерживал весь блок данных df.
+        changed: если известно, какие столбцы изменились (правки ячеек), остальные
+        берутся из предыдущего шага без сравнения значений.
+        """
+        del self._steps[self.current + 1:]
+        prev = self._steps[self.current] if self._steps else None
+        same_index = prev is not None and (prev["index"] is df.index or prev["index"].equals(df.index))
+        index = prev["index"] if same_index else df.index
+        columns, sizes, own_bytes = {}, {}, 0
+        for col in df.columns:
+            series = df[col]
+            old = prev["columns"].get(col) if same_index else None
+            unchanged = changed is not None and col not in changed
+            if old is not None and (unchanged or (old.dtype == series.dtype and old.equals(series))):
+                columns[col], sizes[col] = old, prev["sizes"][col]
+                continue
+            if copy:
+                series = series.copy()
+            columns[col] = series
+            sizes[col] = _series_nbytes(series)
+            own_bytes += sizes[col]
+        if not same_index:
+            own_bytes += int(index.memory_usage(deep=True))
+        self._steps.append({
+            "label": label,
+            "index": index,
+            "order": list(df.columns),
+            "columns": columns,
+            "sizes": sizes,
+            "own_bytes": own_bytes
+        })
+        self.current += 1
+        self._evict()
+
+    def _evict(self):
+        """Удаляет самые старые шаги, пока история не уложится в бюджет (текущий шаг не трогаем)."""
+        while self.current > 0 and self.total_bytes() > self.max_bytes:
+            self._steps.pop(0)
+            self.current -= 1
+            self.evicted += 1
+
+    def _frame(self, step):
+        columns = step["columns"]
+        return pd.DataFrame({col: columns[col] for col in step["order"]}, index=step["index"], copy=False)
+
+    def current_frame(self):
+        """Текущее состояние таблицы."""
+        return self._frame(self._steps[self.current])
+
+    def can_undo(self):
+        return self.current > 0
+
+    def can_redo(self):
+        return self.current < len(self._steps) - 1
+
+    def undo(self):
+        """Возвращает предыдущее состояние или None, если отменять нечего."""
+        if not self.can_undo():
+            return None
+        self.current -= 1
+        return self.current_frame()
+
+    def redo(self):
+        """Возвращает отменённое состояние или None, если повторять нечего."""
+        if not self.can_redo():
+            return None
+        self.current += 1
+        return self.current_frame()
+
+    def set_max_bytes(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def total_bytes(self):
+        """Фактический объём истории: каждый разделяемый столбец учитывается один раз."""
+        seen, total = set(), 0
+        for step in self._steps:
+            if id(step["index"]) not in seen:
+                seen.add(id(step["index"]))
+                total += int(step["index"].memory_usage(deep=True))
+            for col, series in step["columns"].items():
+                if id(series) not in seen:
+                    seen.add(id(series))
+                    total += step["sizes"][col]
+        return total
+
+    def steps_info(self):
+        """Описание шагов для интерфейса: номер, подпись, собственный объём, признак текущего."""
+        return [
+            {"step": i, "label": step["label"], "own_bytes": step["own_bytes"], "current": i == self.current}
+            for i, step in enumerate(self._steps)
+        ]
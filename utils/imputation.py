@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+from utils.cache import ResultCache
+from utils.profiling import profiled
+
+# Действия для пропусков (подписи в интерфейсе)
+DROP, KEEP = "Удалить строки с пропусками", "Оставить пропуски"
+MEAN, MEDIAN, MODE = "Заменить на среднее", "Заменить на медиану", "Заменить на моду"
+GROUP_MEAN, GROUP_MEDIAN = "Заменить на среднее по группе", "Заменить на медиану по группе"
+FORWARD_FILL = "Заполнить предыдущим значением"
+NUMERIC_ACTIONS = [DROP, KEEP, MEAN, MEDIAN, MODE, GROUP_MEAN, GROUP_MEDIAN, FORWARD_FILL]
+CATEGORICAL_ACTIONS = [KEEP, DROP, MODE, FORWARD_FILL]
+GROUP_ACTIONS = (GROUP_MEAN, GROUP_MEDIAN)
+
+# Результаты обработки пропусков и статистики заполнения: ключ — ключ разбора файла и выбор
+_imputed_cache = ResultCache(max_bytes=1024 ** 3)
+_fill_cache = ResultCache(max_bytes=16 * 1024 ** 2)
+
+def columns_with_missing(df, cols, missing_info=None):
+    """Столбцы из cols, где есть пропуски: по профилю загрузчика (без прохода по данным) или по isna."""
+    counts = (missing_info or {}).get("missing_per_col")
+    if counts is not None:
+        return [col for col in cols if counts.get(col, 0)]
+    return [col for col in cols if df[col].hasnans or df[col].isna().any()]
+
+def _median(series):
+    """Медиана выбором (np.partition) без сортировки всего столбца."""
+    values = series.to_numpy(dtype='float64', na_value=np.nan)
+    values = values[~np.isnan(values)]
+    n = len(values)
+    if not n:
+        return np.nan
+    half = n // 2
+    part = np.partition(values, [half - 1, half] if n % 2 == 0 else half)
+    return float(part[half]) if n % 2 else float((part[half - 1] + part[half]) / 2)
+
+def _mode(series):
+    """Самое частое значение подсчётом по хэш-кодам (pd.factorize); при равенстве — наименьшее, как Series.mode."""
+    codes, uniques = pd.factorize(series, sort=False)
+    present = codes[codes >= 0]
+    if not len(present):
+        return np.nan
+    counts = np.bincount(present, minlength=len(uniques))
+    candidates = uniques[counts == counts.max()]
+    try:
+        return candidates.min()
+    except TypeError:  # несравнимые значения в object
+        return candidates[0]
+
+def fill_statistics(df, cols, stat, missing_info=None):
+    """
+    Значения заполнения {столбец: значение} только для столбцов с пропусками.
+    mean берётся из сумм, накопленных загрузчиком за тот же проход, что и счётчики
+    пропусков (missing_info['sums']), иначе считается по столбцу; median — выбором,
+    mode — подсчётом хэш-кодов. С ключом разбора результат кэшируется.
+    """
+    cols = columns_with_missing(df, cols, missing_info)
+    key = (missing_info or {}).get("ingest_key")
+
+    def compute():
+        sums = (missing_info or {}).get("sums", {})
+        values = {}
+        for col in cols:
+            if stat == "mean" and col in sums:
+                total, count = sums[col]
+                values[col] = total / count if count else np.nan
+            elif stat == "mean":
+                values[col] = df[col].mean()
+            elif stat == "median":
+                values[col] = _median(df[col])
+            else:
+                values[col] = _mode(df[col])
+        return values
+    if key is None:
+        return compute()
+    return _fill_cache.get_or_compute((key, stat, tuple(cols)), compute)
+
+def _group_fill(series, codes, n_groups, stat, fallback):
+    """Значения по группам для строк с пропусками; группы без значений (и пропуск в ключе) — fallback."""
+    values = series.to_numpy(dtype='float64', na_value=np.nan, copy=True)
+    missing = np.isnan(values)
+    valid = ~missing & (codes >= 0)
+    if stat == "mean":
+        sums = np.bincount(codes[valid], weights=values[valid], minlength=n_groups)
+        counts = np.bincount(codes[valid], minlength=n_groups)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            per_group = sums / counts
+    else:
+        per_group = pd.Series(values[valid]).groupby(codes[valid]).median().reindex(range(n_groups)).to_numpy()
+    rows = codes[missing]
+    fill = np.where(rows >= 0, per_group[np.maximum(rows, 0)], np.nan)
+    fill = np.where(np.isnan(fill), fallback, fill)
+    values[missing] = fill
+    # Вещественный столбец сохраняет свою ширину (float32 после ужатия типов)
+    dtype = series.dtype if series.dtype.kind == 'f' else 'float64'
+    return pd.Series(values, index=series.index, name=series.name).astype(dtype, copy=False)
+
+def _fill_columns(df, cols, action, missing_info, group_col=None):
+    """Заполняет только столбцы с пропусками; остальные столбцы остаются общими с исходным фреймом."""
+    targets = columns_with_missing(df, cols, missing_info)
+    if not targets:
+        return df
+    if action == FORWARD_FILL:
+        for col in targets:
+            df[col] = df[col].ffill()
+    elif action in (MEAN, MEDIAN, MODE):
+        stat = {MEAN: "mean", MEDIAN: "median", MODE: "mode"}[action]
+        for col, value in fill_statistics(df, targets, stat, missing_info).items():
+            if not pd.isna(value):
+                if isinstance(df[col].dtype, pd.CategoricalDtype) and value not in df[col].cat.categories:
+                    continue
+                df[col] = df[col].fillna(value)
+    elif action in GROUP_ACTIONS and group_col is not None:
+        stat = "mean" if action == GROUP_MEAN else "median"
+        fallback = fill_statistics(df, targets, stat, missing_info)
+        codes, uniques = pd.factorize(df[group_col])
+        for col in targets:
+            df[col] = _group_fill(df[col], codes, len(uniques), stat, fallback.get(col, np.nan))
+    return df
+
+def impute_missing(df, missing_info, numeric_action=None, categorical_action=None, group_col=None):
+    """
+    Применяет выбранные действия к пропускам в числовых и категориальных столбцах.
+    Заполнение меняет только столбцы, где пропуски есть: они заменяются новыми Series,
+    остальные (copy-on-write) разделяются с исходным фреймом без копирования.
+    Удаление строк выполняется одним фильтром по общей маске обеих групп столбцов.
+    """
+    numeric_cols = missing_info["numeric_cols"]
+    categorical_cols = missing_info["categorical_cols"]
+    df = df.copy(deep=False)
+    drop = []
+    if numeric_cols and numeric_action == DROP:
+        drop += columns_with_missing(df, numeric_cols, missing_info)
+    if categorical_cols and categorical_action == DROP:
+        drop += columns_with_missing(df, categorical_cols, missing_info)
+    if numeric_cols and numeric_action not in (None, DROP, KEEP):
+        df = _fill_columns(df, numeric_cols, numeric_action, missing_info, group_col)
+    if categorical_cols and categorical_action not in (None, DROP, KEEP):
+        df = _fill_columns(df, categorical_cols, categorical_action, missing_info)
+    if drop:
+        df = df[df[drop].notna().all(axis=1).to_numpy()]
+    return df
+
+@profiled("loader")
+def cached_impute(df, missing_info, numeric_action=None, categorical_action=None, group_col=None):
+    """
+    impute_missing с кэшем по ключу разбора файла (missing_info['ingest_key']) и действиям:
+    смена выбора туда и обратно не пересчитывает заполнение. Возвращает поверхностную копию.
+    """
+    key = missing_info.get("ingest_key")
+    if key is None:
+        return impute_missing(df, missing_info, numeric_action, categorical_action, group_col)
+    result = _imputed_cache.get_or_compute(
+        (key, numeric_action, categorical_action, group_col),
+        lambda: impute_missing(df, missing_info, numeric_action, categorical_action, group_col)
+    )
+    return result.copy(deep=False)
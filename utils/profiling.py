@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import weakref
+import threading
+import functools
+import tracemalloc
+from collections import deque
+
+MAX_TRACES = 20  # перезапусков, хранимых для панели и экспорта
+
+_local = threading.local()
+
+# tracemalloc общий для процесса: его держат сессии с учётом памяти (MemoryTracing)
+_memory_lock = threading.Lock()
+_memory_users = 0
+_memory_started = False  # запущен этим модулем, а не внешним кодом — только такой и останавливаем
+# Пик tracemalloc тоже общий: интервалы с учётом памяти, открытые во всех потоках, сбрасывают
+# его только вместе (_fold_peak), и каждый хранит собственный максимум
+_peak_lock = threading.Lock()
+_open_spans = set()
+
+class Trace:
+    """
+    Замеры одного перезапуска страницы: вложенные интервалы (span) со временем,
+    приростом и пиком памяти (если включён tracemalloc) и объёмы данных,
+    отправленных в браузер.
+    """
+
+    def __init__(self, label="", track_memory=False):
+        self.label = label
+        self.track_memory = track_memory
+        self.started = time.perf_counter()
+        self.wall_started = time.time()
+        self.finished = None
+        self.thread = threading.get_ident()
+        self.spans = []     # словари: name, category, start, duration, depth, memory, peak, thread
+        self.payloads = []  # словари: name, bytes
+        self._depth = 0
+
+    @property
+    def duration(self):
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return end - self.started
+
+    def finish(self):
+        if self.finished is None:
+            self.finished = time.perf_counter()
+
+    def bytes_sent(self):
+        return sum(payload["bytes"] for payload in self.payloads)
+
+    def breakdown(self):
+        """Сводка по именам интервалов: число вызовов, суммарное и собственное время (без вложенных), память."""
+        rows = {}
+        for i, span in enumerate(self.spans):
+            # Собственное время — без вложенных интервалов следующего уровня
+            nested = sum(
+                other["duration"] for other in self.spans[i + 1:]
+                if other["depth"] == span["depth"] + 1 and other["thread"] == span["thread"]
+                and span["start"] <= other["start"] < span["start"] + span["duration"]
+            )
+            row = rows.setdefault(span["name"], {"name": span["name"], "category": span["category"],
+                                                 "calls": 0, "total": 0.0, "self": 0.0, "memory": 0, "peak": 0})
+            row["calls"] += 1
+            row["total"] += span["duration"]
+            row["self"] += span["duration"] - nested
+            row["memory"] += span["memory"] or 0
+            row["peak"] = max(row["peak"], span["peak"] or 0)
+        return sorted(rows.values(), key=lambda row: row["total"], reverse=True)
+
+def current_trace():
+    """Активная запись текущего потока или None, если профилирование выключено."""
+    return getattr(_local, "trace", None)
+
+def _release_memory_tracing():
+    global _memory_users, _memory_started
+    with _memory_lock:
+        _memory_users = max(_memory_users - 1, 0)
+        if not _memory_users and _memory_started:
+            tracemalloc.stop()
+            _memory_started = False
+
+class MemoryTracing:
+    """
+    Ссылка сессии на tracemalloc. Трассировка памяти общая для процесса: она запускается
+    первой ссылкой и останавливается, когда освобождена последняя (release() или сборка
+    мусора вместе с session_state закрытой сессии). tracemalloc, запущенный не этим
+    модулем (например, бенчмарками), не останавливается.
+    """
+
+    def __init__(self):
+        global _memory_users, _memory_started
+        with _memory_lock:
+            _memory_users += 1
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _memory_started = True
+        self._finalizer = weakref.finalize(self, _release_memory_tracing)
+
+    @property
+    def active(self):
+        return self._finalizer.alive
+
+    def release(self):
+        self._finalizer()
+
+def start_trace(label="", track_memory=False):
+    """
+    Начинает запись перезапуска; незавершённая предыдущая запись потока закрывается.
+    Память учитывается, только если tracemalloc уже работает (сессия держит MemoryTracing).
+    """
+    finish_trace()
+    _local.trace = Trace(label, track_memory and tracemalloc.is_tracing())
+    return _local.trace
+
+def stop_profiling():
+    """Выключает профилирование в потоке: закрывает запись (tracemalloc не трогает)."""
+    finish_trace()
+
+def finish_trace():
+    """Завершает запись текущего потока и возвращает её (или None)."""
+    trace = current_trace()
+    if trace is not None:
+        trace.finish()
+        _local.trace = None
+    return trace
+
+def _fold_peak():
+    """
+    Под _peak_lock: пик tracemalloc с прошлого сброса засчитывается всем открытым
+    интервалам (все они были открыты всё это время), затем счётчик пика сбрасывается.
+    Возвращает текущий объём отслеживаемой памяти.
+    """
+    current, peak = tracemalloc.get_traced_memory()
+    for open_span in _open_spans:
+        open_span.high = max(open_span.high, peak)
+    tracemalloc.reset_peak()
+    return current
+
+class span:
+    """
+    Интервал замера: with span("load_data", "loader"): ...
+    Без активной записи почти ничего не стоит — один поиск в thread-local.
+    """
+
+    def __init__(self, name, category="app"):
+        self.name = name
+        self.category = category
+        self.trace = None
+
+    def __enter__(self):
+        self.trace = current_trace()
+        if self.trace is None:
+            return self
+        self.depth = self.trace._depth
+        self.trace._depth += 1
+        self.memory = None
+        if self.trace.track_memory:
+            with _peak_lock:
+                self.memory = self.high = _fold_peak()
+                _open_spans.add(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.trace is None:
+            return False
+        duration = time.perf_counter() - self.start
+        memory = peak = None
+        if self.memory is not None:
+            with _peak_lock:
+                current = _fold_peak()
+                _open_spans.discard(self)
+            memory, peak = current - self.memory, self.high - self.memory
+        self.trace._depth -= 1
+        self.trace.spans.append({
+            "name": self.name, "category": self.category, "start": self.start - self.trace.started,
+            "duration": duration, "depth": self.depth, "memory": memory, "peak": peak,
+            "thread": threading.get_ident()
+        })
+        return False
+
+def profiled(category, name=None):
+    """Декоратор: каждый вызов функции записывается как интервал категории category."""
+    def decorate(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if current_trace() is None:
+                return func(*args, **kwargs)
+            with span(label, category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def payload_nbytes(obj):
+    """Примерный объём объекта, уходящего в браузер: таблицы — по памяти, графики — по JSON."""
+    import pandas as pd
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return int(obj.memory_usage(deep=True).sum()) if isinstance(obj, pd.DataFrame) else int(obj.memory_usage(deep=True))
+    if hasattr(obj, "to_json"):
+        return len(obj.to_json())
+    if isinstance(obj, (bytes, bytearray)):
+        return len(obj)
+    return len(str(obj).encode('utf-8'))
+
+def record_payload(name, obj):
+    """Учитывает объект, отправляемый в браузер (только при активной записи). Возвращает obj."""
+    trace = current_trace()
+    if trace is not None:
+        trace.payloads.append({"name": name, "bytes": payload_nbytes(obj)})
+    return obj
+
+def chrome_trace(traces):
+    """
+    Записи в формате Chrome Trace Event (JSON), открываются в chrome://tracing и Perfetto.
+    Каждый перезапуск — отдельный интервал верхнего уровня, время в микросекундах.
+    """
+    events, pid = [], os.getpid()
+    for trace in traces:
+        base = trace.wall_started * 1e6
+        events.append({"name": trace.label or "rerun", "cat": "rerun", "ph": "X", "ts": base,
+                       "dur": trace.duration * 1e6, "pid": pid, "tid": trace.thread,
+                       "args": {"bytes_sent": trace.bytes_sent()}})
+        for item in trace.spans:
+            args = {}
+            if item["memory"] is not None:
+                args = {"memory_bytes": item["memory"], "peak_bytes": item["peak"]}
+            events.append({"name": item["name"], "cat": item["category"], "ph": "X",
+                           "ts": base + item["start"] * 1e6, "dur": item["duration"] * 1e6,
+                           "pid": pid, "tid": item["thread"], "args": args})
+        for payload in trace.payloads:
+            events.append({"name": payload["name"], "cat": "payload", "ph": "i", "s": "t",
+                           "ts": base + trace.duration * 1e6, "pid": pid, "tid": trace.thread,
+                           "args": {"bytes": payload["bytes"]}})
+    return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}).encode('utf-8')
+
+class TraceLog:
+    """Последние записи перезапусков одной сессии (кольцевой буфер)."""
+
+    def __init__(self, max_traces=MAX_TRACES):
+        self.traces = deque(maxlen=max_traces)
+
+    def add(self, trace):
+        if trace is None or trace in self.traces:
+            return
+        # Перезапуск, прерванный st.rerun, считается завершённым к началу следующего
+        for previous in self.traces:
+            previous.finish()
+        self.traces.append(trace)
+
+    def last(self):
+        return self.traces[-1] if self.traces else None
+
+    def clear(self):
+        self.traces.clear()
@@ -0,0 +1,120 @@
+import os
+import time
+import threading
+from utils.dataset import DiskDataset, _new_path
+from utils.sampling import DEFAULT_SAMPLE_ROWS, Reservoir
+
+# Этапы прогрессивной загрузки
+LOADING = "loading"  # файл переписывается на диск, выборка наполняется
+EXACT = "exact"      # файл на диске, идёт точный проход по всем строкам
+DONE = "done"        # точные результаты в кэше набора
+FAILED = "error"
+CANCELLED = "cancelled"
+
+PHASE_MESSAGES = {
+    LOADING: "Чтение файла: результаты — оценки по выборке",
+    EXACT: "Файл прочитан, идёт точный расчёт по всем строкам",
+    DONE: "Точные результаты готовы",
+    FAILED: "Ошибка загрузки",
+    CANCELLED: "Загрузка отменена"
+}
+
+class _Cancelled(Exception):
+    pass
+
+class ProgressiveLoad:
+    """
+    Прогрессивная загрузка большого файла в фоновом потоке. Пока файл потоково
+    переписывается в набор на диске (utils.dataset), каждый пакет попадает
+    в резервуарную выборку — по ней интерфейс сразу показывает оценки с погрешностью.
+    Затем тот же поток один раз проходит по всем строкам и кладёт точные статистику,
+    выбросы и корреляции в кэш набора; после этого набор заменяет выборку.
+    """
+
+    def __init__(self, source, fmt=None, columns=None, sample_rows=DEFAULT_SAMPLE_ROWS, strata=None, seed=0):
+        self.source = source
+        self.fmt = fmt
+        self.columns = columns
+        self.reservoir = Reservoir(sample_rows, strata=strata, seed=seed)
+        self.phase = LOADING
+        self.error = None
+        self.dataset = None
+        self.path = _new_path()
+        self._cancelled = threading.Event()
+        self.started = time.monotonic()
+        self.load_seconds = None
+        self.exact_seconds = None
+        self._thread = threading.Thread(target=self._run, name="progressive-load", daemon=True)
+        self._thread.start()
+
+    def _on_batch(self, batch):
+        if self._cancelled.is_set():
+            raise _Cancelled()
+        if batch is None:
+            self.reservoir.reset()
+        else:
+            self.reservoir.update(batch)
+
+    def _run(self):
+        from utils.stats import cached_correlations, cached_extended_stats, cached_outliers
+        try:
+            self.dataset = DiskDataset.from_file(self.source, self.fmt, self.columns, path=self.path,
+                                                 on_batch=self._on_batch)
+            self.load_seconds = time.monotonic() - self.started
+            self.phase = EXACT
+            # Те же вызовы, что у вкладки «Статистика» с выбором по умолчанию — результаты попадут в её кэш
+            numeric_cols = self.dataset.meta.select_dtypes(include=['number']).columns.tolist()
+            cached_extended_stats(self.dataset, numeric_cols)
+            cached_outliers(self.dataset, numeric_cols)
+            cached_correlations(self.dataset, "pearson")
+            self.exact_seconds = time.monotonic() - self.started - self.load_seconds
+            self.phase = CANCELLED if self._cancelled.is_set() else DONE
+        except _Cancelled:
+            self.phase = CANCELLED
+        except Exception as e:
+            self.error = str(e)
+            self.phase = FAILED
+        if self.phase in (CANCELLED, FAILED):
+            self._remove_file()
+
+    def _remove_file(self):
+        if self.dataset is not None:
+            self.dataset.remove()
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+
+    def cancel(self):
+        """Прерывает загрузку; файл на диске удаляется фоновым потоком (или сразу, если он уже завершён)."""
+        self._cancelled.set()
+        if not self._thread.is_alive() and self.phase == DONE:
+            self.phase = CANCELLED
+            self._remove_file()
+
+    @property
+    def rows_read(self):
+        """Строк, прочитанных из источника на текущий момент."""
+        return self.reservoir.seen
+
+    @property
+    def estimating(self):
+        """Показывать ли оценки по выборке (точные результаты ещё не готовы)."""
+        return self.phase in (LOADING, EXACT)
+
+    def sample(self):
+        return self.reservoir.sample()
+
+    def total_rows(self):
+        """Число строк для пересчёта оценок: точное после загрузки, иначе прочитанное на текущий момент."""
+        return self.dataset.num_rows if self.dataset is not None else self.rows_read
+
+    def wait(self, timeout=None):
+        """Ждёт окончания фонового потока; True, если он завершился."""
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def status(self):
+        """Строка состояния для интерфейса."""
+        elapsed = time.monotonic() - self.started
+        if self.phase == FAILED:
+            return f"{PHASE_MESSAGES[FAILED]}: {self.error}"
+        return f"{PHASE_MESSAGES[self.phase]} — прочитано {self.rows_read:,} строк за {elapsed:.1f} с"
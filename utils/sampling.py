@@ -0,0 +1,198 @@
+import threading
+import numpy as np
+import pandas as pd
+
+DEFAULT_SAMPLE_ROWS = 100_000  # строк в выборке прогрессивного режима
+MAX_STRATA = 50                # страт сверх этого объединяются в одну «прочие»
+OTHER_STRATUM = "__other__"
+STRATUM_SLACK = 1.5            # ёмкость резервуара страты относительно её доли в выборке
+
+class _Slots:
+    """Резервуар одной страты (алгоритм R): какие строки частей занимают capacity ячеек."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.seen = 0
+        self.part = np.empty(0, dtype=np.int64)  # номер части для каждой занятой ячейки
+        self.row = np.empty(0, dtype=np.int64)   # строка внутри части
+
+    def resize(self, capacity, rng):
+        """
+        Меняет ёмкость. При уменьшении остаётся случайное подмножество занятых ячеек —
+        снова равномерная выборка. При увеличении свободные ячейки заполняют следующие
+        строки потока (если резервуар был полон, страта смещается к концу потока).
+        """
+        if capacity < len(self.part):
+            keep = np.sort(rng.choice(len(self.part), capacity, replace=False))
+            self.part, self.row = self.part[keep], self.row[keep]
+        self.capacity = capacity
+
+    def offer(self, n, rng):
+        """
+        Предлагает n новых строк потока. Возвращает (номера строк среди n, ячейки):
+        строка i попадает в ячейку j; при повторе ячейки побеждает последняя строка,
+        как при последовательном алгоритме R.
+        """
+        filled = len(self.part)
+        free = min(n, self.capacity - filled)
+        index = self.seen + np.arange(free, n, dtype=np.int64)
+        self.seen += n
+        slots = np.concatenate([filled + np.arange(free, dtype=np.int64), rng.integers(0, index + 1)])
+        accepted = np.flatnonzero(slots < self.capacity)
+        slots = slots[accepted]
+        # Оставляем последнее попадание в каждую ячейку
+        last = len(slots) - 1 - np.unique(slots[::-1], return_index=True)[1]
+        return accepted[last], slots[last]
+
+class Reservoir:
+    """
+    Выборка фиксированного размера из потока пакетов (pyarrow.RecordBatch или DataFrame),
+    не знающая заранее длины потока. Равномерная — векторный алгоритм R по пакетам;
+    стратифицированная — отдельный резервуар на каждое значение strata, итоговая выборка
+    распределяется между стратами пропорционально их доле в потоке (каждая представлена
+    хотя бы одной строкой). Ёмкость резервуара страты — STRATUM_SLACK её доли в выборке:
+    она уменьшается, когда доля падает, и растёт, когда доля превышает ёмкость, поэтому
+    в памяти держится порядка size строк при любом числе страт. Из пакета в pandas
+    переводятся только принятые строки.
+    Потокобезопасна: update вызывается фоновым потоком, sample — интерфейсом.
+    """
+
+    def __init__(self, size=DEFAULT_SAMPLE_ROWS, strata=None, seed=0, max_strata=MAX_STRATA):
+        self.size = size
+        self.strata = strata
+        self.max_strata = max_strata
+        self.seed = seed
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Начинает выборку заново (например, если источник перечитывается другим движком)."""
+        with self._lock:
+            self._rng = np.random.default_rng(self.seed)
+            self._parts = []      # принятые строки пакетов (DataFrame)
+            self._slots = {}      # страта -> _Slots
+            self._version = 0
+            self._snapshot = None
+            self.seen = 0
+
+    def _strata_labels(self, batch):
+        values = batch.column(self.strata).to_pandas() if not isinstance(batch, pd.DataFrame) else batch[self.strata]
+        labels = values.astype(object).where(values.notna(), "NaN").to_numpy()
+        known = set(self._slots)
+        # Новые значения сверх предела попадают в общую страту
+        for value in pd.unique(labels):
+            if value not in known and len(known) < self.max_strata:
+                known.add(value)
+        mask = np.isin(labels, list(known))
+        return np.where(mask, labels, OTHER_STRATUM)
+
+    def update(self, batch):
+        """Добавляет пакет потока."""
+        n = batch.num_rows if not isinstance(batch, pd.DataFrame) else len(batch)
+        if not n:
+            return
+        with self._lock:
+            if self.strata is None:
+                groups = {None: np.arange(n)}
+            else:
+                labels = self._strata_labels(batch)
+                codes, uniques = pd.factorize(labels)
+                order = np.argsort(codes, kind='stable')
+                bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+                groups = {uniques[i]: order[bounds[i]:bounds[i + 1]] for i in range(len(uniques))}
+            taken, targets = [], []
+            if self.strata is not None:
+                self._rebalance({key: len(rows) for key, rows in groups.items()}, self.seen + n)
+            for key, rows in groups.items():
+                slots = self._slots.setdefault(key, _Slots(self.size))
+                accepted, cells = slots.offer(len(rows), self._rng)
+                taken.append(rows[accepted])
+                targets.append((slots, cells))
+            positions = np.concatenate(taken)
+            if len(positions):
+                if isinstance(batch, pd.DataFrame):
+                    part = batch.take(positions).reset_index(drop=True)
+                else:
+                    part = batch.take(positions).to_pandas()
+                part_id = len(self._parts)
+                self._parts.append(part)
+                offset = 0
+                for slots, cells in targets:
+                    rows = np.arange(offset, offset + len(cells))
+                    offset += len(cells)
+                    grow = max(0, int(cells.max()) + 1 - len(slots.part)) if len(cells) else 0
+                    if grow:
+                        slots.part = np.concatenate([slots.part, np.full(grow, -1, dtype=np.int64)])
+                        slots.row = np.concatenate([slots.row, np.full(grow, -1, dtype=np.int64)])
+                    slots.part[cells] = part_id
+                    slots.row[cells] = rows
+            self.seen += n
+            self._version += 1
+            self._snapshot = None
+            if sum(len(part) for part in self._parts) > 2 * self.size:
+                self._compact()
+
+    def _rebalance(self, incoming, total):
+        """
+        Ёмкости резервуаров по долям страт после пакета (incoming — строк страты в пакете,
+        total — строк потока): страта, чья доля превысила ёмкость, получает STRATUM_SLACK
+        доли, слишком большой резервуар уменьшается до неё.
+        """
+        for key in list(self._slots) + [key for key in incoming if key not in self._slots]:
+            seen = self._slots[key].seen if key in self._slots else 0
+            seen += incoming.get(key, 0)
+            share = self.size * seen / total
+            target = min(self.size, max(1, int(np.ceil(STRATUM_SLACK * share))))
+            slots = self._slots.get(key)
+            if slots is None:
+                self._slots[key] = _Slots(target)
+            elif slots.capacity > target or slots.capacity < min(self.size, np.ceil(share)):
+                slots.resize(target, self._rng)
+
+    def _compact(self):
+        """Склеивает занятые строки в одну часть, освобождая вытесненные."""
+        frames, offset = [], 0
+        for slots in self._slots.values():
+            rows = self._gather(slots)
+            frames.append(rows)
+            slots.part = np.zeros(len(rows), dtype=np.int64)
+            slots.row = np.arange(offset, offset + len(rows), dtype=np.int64)
+            offset += len(rows)
+        self._parts = [pd.concat(frames, ignore_index=True)] if frames else []
+
+    def _gather(self, slots):
+        """Строки ячеек страты одним DataFrame."""
+        frames = []
+        for part_id in np.unique(slots.part):
+            rows = slots.row[slots.part == part_id]
+            frames.append(self._parts[part_id].iloc[rows])
+        if not frames:
+            return self._parts[0].iloc[:0] if self._parts else pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    def sample(self):
+        """Текущая выборка (DataFrame, не больше size строк); снимок кэшируется до следующего пакета."""
+        with self._lock:
+            if self._snapshot is not None:
+                return self._snapshot
+            if not self._parts:
+                return pd.DataFrame()
+            if self.strata is None:
+                snapshot = self._gather(self._slots[None])
+            else:
+                # Пропорциональное распределение объёма выборки по стратам
+                frames = []
+                for slots in self._slots.values():
+                    share = max(1, int(round(self.size * slots.seen / self.seen)))
+                    rows = self._gather(slots)
+                    if len(rows) > share:
+                        rows = rows.sample(n=share, random_state=self.seed)
+                    frames.append(rows)
+                snapshot = pd.concat(frames, ignore_index=True)
+            self._snapshot = snapshot
+            return snapshot
+
+    @property
+    def version(self):
+        """Номер состояния выборки: меняется с каждым принятым пакетом."""
+        return self._version
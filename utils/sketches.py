@@ -0,0 +1,98 @@
+import numpy as np
+
+DEFAULT_K = 1000  # ёмкость верхнего уровня; ошибка ранга порядка 1/k
+
+class QuantileSketch:
+    """
+    Сливаемый скетч квантилей в духе KLL. Значения хранятся по уровням: элемент
+    уровня h весит 2**h. Переполненный уровень сортируется, и каждый второй его
+    элемент (со случайным сдвигом) поднимается на уровень выше. Память — O(k·log n)
+    независимо от числа строк; скетчи частей данных сливаются через merge.
+    """
+
+    def __init__(self, k=DEFAULT_K, seed=0):
+        self.k = k
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # При нечётном числе элементов последний остаётся на своём уровне
+                even = len(items) - len(items) % 2
+                offset = int(self._rng.integers(2))
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], items[offset:even:2]])
+                self.levels[level] = items[even:]
+            level += 1
+
+    def update(self, values):
+        """Добавляет массив значений (NaN пропускаются). Возвращает self."""
+        values = np.asarray(values, dtype='float64').ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        self.n += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Сливает другой скетч в этот (порядок слияния не важен). Возвращает self."""
+        if not other.n:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def quantiles(self, qs):
+        """Приближённые квантили (массив той же длины, что qs); NaN, если скетч пуст."""
+        qs = np.asarray(qs, dtype='float64')
+        if not self.n:
+            return np.full(len(qs), np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items, cumulative = items[order], np.cumsum(weights[order])
+        positions = np.searchsorted(cumulative, qs * cumulative[-1], side='left')
+        result = items[np.minimum(positions, len(items) - 1)]
+        # Крайние квантили известны точно
+        result[qs <= 0] = self.min
+        result[qs >= 1] = self.max
+        return result
+
+    def quantile(self, q):
+        return float(self.quantiles([q])[0])
+
+    def nbytes(self):
+        return sum(level.nbytes for level in self.levels)
+
+def column_sketches(frames, cols, k=DEFAULT_K):
+    """
+    Скетчи квантилей для столбцов cols по последовательности кусков DataFrame
+    (например, частей большого файла): каждый кусок читается один раз и не хранится.
+    """
+    sketches = {col: QuantileSketch(k) for col in cols}
+    for frame in frames:
+        for col in cols:
+            sketches[col].update(frame[col].to_numpy(dtype='float64', na_value=np.nan))
+    return sketches
@@ -1,49 +1,760 @@
 import pandas as pd
 import numpy as np
-from scipy import stats
+from utils.cache import ResultCache, dataframe_fingerprint
+from utils.correlation import correlation_matrix, pairs_from_matrix, top_correlated_pairs
+from utils.dataset import DiskDataset
+from utils.profiling import profiled
 
+STATS_COLUMNS = [
+    'Столбец', 'Среднее', 'Медиана', 'Минимум', 'Максимум', 'Стд. отклонение',
+    'Коэф. вариации (%)', 'Q1 (25%)', 'Q3 (75%)', 'Асимметрия', 'Эксцесс'
+]
+
+def _numeric_columns(df, selected_cols=None):
+    """Возвращает список числовых столбцов из выбранных (или всех числовых)."""
+    if selected_cols is None:
+        return df.select_dtypes(include=['number']).columns.tolist()
+    return [col for col in selected_cols if pd.api.types.is_numeric_dtype(df[col])]
+
+def _numeric_block(df, cols):
+    """Собирает выбранные столбцы в непрерывный 2-D массив float64 (столбец на столбец)."""
+    return np.asfortranarray(df[cols].to_numpy(dtype='float64', na_value=np.nan))
+
+def _column_moments(block):
+    """
+    Считает моменты всех столбцов блока за один проход.
+    Возвращает словарь массивов: count, mean, min, max, std (ddof=1), skew, kurtosis.
+    Асимметрия и эксцесс совпадают с scipy.stats.skew/kurtosis (смещённые оценки,
+    NaN распространяется, при нулевой дисперсии — NaN).
+    """
+    n_rows = block.shape[0]
+    nan_mask = np.isnan(block)
+    has_nan = nan_mask.any(axis=0)
+    if has_nan.any():
+        count = n_rows - nan_mask.sum(axis=0)
+        values = np.where(nan_mask, 0.0, block)
+    else:
+        count = np.full(block.shape[1], n_rows)
+        values = block
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = values.sum(axis=0) / count
+        centered = values - mean
+        if has_nan.any():
+            centered[nan_mask] = 0.0
+        sq = centered * centered
+        m2 = sq.sum(axis=0) / count
+        sq *= centered
+        m3 = sq.sum(axis=0) / count
+        sq *= centered
+        m4 = sq.sum(axis=0) / count
+        std = np.where(count > 1, np.sqrt(m2 * count / (count - 1)), np.nan)
+        # То же условие «почти постоянных данных», что и в scipy.stats
+        zero = m2 <= (np.finfo(np.float64).resolution * mean) ** 2
+        skew = np.where(zero | has_nan, np.nan, m3 / m2 ** 1.5)
+        kurtosis = np.where(zero | has_nan, np.nan, m4 / m2 ** 2 - 3.0)
+    if n_rows:
+        # fmin/fmax пропускают NaN, столбцы целиком из NaN дают NaN
+        minimum = np.fmin.reduce(block, axis=0)
+        maximum = np.fmax.reduce(block, axis=0)
+    else:
+        minimum = maximum = np.full(block.shape[1], np.nan)
+    return {
+        'count': count, 'mean': mean, 'min': minimum, 'max': maximum,
+        'std': std, 'skew': skew, 'kurtosis': kurtosis
+    }
+
+def _select_quantiles(block, qs):
+    """Квантили столбцов без NaN: один np.partition по всем столбцам сразу."""
+    n = block.shape[0]
+    pos = np.asarray(qs, dtype='float64') * (n - 1)
+    lo = np.floor(pos).astype(np.intp)
+    hi = np.minimum(lo + 1, n - 1)
+    part = np.partition(block, np.unique(np.concatenate([lo, hi])), axis=0)
+    frac = (pos - lo)[:, None]
+    return part[lo] + (part[hi] - part[lo]) * frac
+
+def _column_quantiles(block, qs):
+    """Квантили всех столбцов блока (линейная интерполяция, как в pandas), NaN пропускаются."""
+    result = np.full((len(qs), block.shape[1]), np.nan)
+    if not block.shape[0]:
+        return result
+    has_nan = np.isnan(block).any(axis=0)
+    dense = np.flatnonzero(~has_nan)
+    if len(dense) == block.shape[1]:
+        return _select_quantiles(block, qs)
+    if len(dense):
+        result[:, dense] = _select_quantiles(block[:, dense], qs)
+    for j in np.flatnonzero(has_nan):
+        column = block[:, j]
+        column = column[~np.isnan(column)]
+        if len(column):
+            result[:, j] = _select_quantiles(column[:, None], qs)[:, 0]
+    return result
+
+def quartiles(df, selected_cols=None):
+    """Q1, медиана и Q3 числовых столбцов одним проходом выбора. Возвращает (столбцы, q1, медиана, q3)."""
+    cols = _numeric_columns(df, selected_cols)
+    if not cols:
+        empty = np.empty(0)
+        return cols, empty, empty, empty
+    q1, median, q3 = _column_quantiles(_numeric_block(df, cols), [0.25, 0.5, 0.75])
+    return cols, q1, median, q3
+
+def _stats_frame(cols, mean, median, minimum, maximum, std, q1, q3, skew, kurtosis):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cv = np.where(mean != 0, std / mean * 100, np.nan)
+    return pd.DataFrame({
+        'Столбец': cols,
+        'Среднее': mean,
+        'Медиана': median,
+        'Минимум': minimum,
+        'Максимум': maximum,
+        'Стд. отклонение': std,
+        'Коэф. вариации (%)': cv,
+        'Q1 (25%)': q1,
+        'Q3 (75%)': q3,
+        'Асимметрия': skew,
+        'Эксцесс': kurtosis
+    }, columns=STATS_COLUMNS)
+
+@profiled("stats")
 def get_extended_stats(df, selected_cols=None):
     """Возвращает расширенную статистику для выбранных числовых столбцов."""
-    if selected_cols is None:
-        selected_cols = df.select_dtypes(include=['number']).columns
-    stats_df = pd.DataFrame()
-    for col in selected_cols:
-        if pd.api.types.is_numeric_dtype(df[col]):
-            stats_dict = {
-                'Столбец': col,
-                'Среднее': df[col].mean(),
-                'Медиана': df[col].median(),
-                'Минимум': df[col].min(),
-                'Максимум': df[col].max(),
-                'Стд. отклонение': df[col].std(),
-                'Коэф. вариации (%)': (df[col].std() / df[col].mean() * 100) if df[col].mean() != 0 else np.nan,
-                'Q1 (25%)': df[col].quantile(0.25),
-                'Q3 (75%)': df[col].quantile(0.75),
-                'Асимметрия': stats.skew(df[col]),
-                'Эксцесс': stats.kurtosis(df[col])
-            }
-            stats_df = pd.concat([stats_df, pd.DataFrame([stats_dict])], ignore_index=True)
-    return stats_df
-
-def detect_outliers(df, selected_cols=None):
-    """Обнаруживает аномалии в числовых столбцах с использованием метода IQR."""
-    if selected_cols is None:
-        selected_cols = df.select_dtypes(include=['number']).columns
+    cols = _numeric_columns(df, selected_cols)
+    if not cols:
+        return pd.DataFrame()
+    block = _numeric_block(df, cols)
+    moments = _column_moments(block)
+    q1, median, q3 = _column_quantiles(block, [0.25, 0.5, 0.75])
+    return _stats_frame(cols, moments['mean'], median, moments['min'], moments['max'], moments['std'],
+                        q1, q3, moments['skew'], moments['kurtosis'])
+
+# --- Статистика по частям данных (наборы на диске, потоковые источники) ---
+
+def _partial_moments(block):
+    """
+    Сливаемое состояние моментов блока: count, mean, суммы центральных степеней
+    m2..m4, min, max и число пропусков по столбцам.
+    """
+    nan_mask = np.isnan(block)
+    count = (~nan_mask).sum(axis=0).astype('float64')
+    values = np.where(nan_mask, 0.0, block)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(count > 0, values.sum(axis=0) / count, 0.0)
+    centered = np.where(nan_mask, 0.0, block - mean)
+    sq = centered * centered
+    m2 = sq.sum(axis=0)
+    sq *= centered
+    m3 = sq.sum(axis=0)
+    sq *= centered
+    m4 = sq.sum(axis=0)
+    if block.shape[0]:
+        minimum, maximum = np.fmin.reduce(block, axis=0), np.fmax.reduce(block, axis=0)
+    else:
+        minimum = maximum = np.full(block.shape[1], np.nan)
+    return {'count': count, 'mean': mean, 'm2': m2, 'm3': m3, 'm4': m4,
+            'min': minimum, 'max': maximum, 'nan': nan_mask.sum(axis=0)}
+
+def _merge_moments(a, b):
+    """Объединяет два состояния _partial_moments (формулы Чана/Пебе, порядок не важен)."""
+    na, nb = a['count'], b['count']
+    n = na + nb
+    with np.errstate(invalid='ignore', divide='ignore'):
+        delta = np.where(n > 0, b['mean'] - a['mean'], 0.0)
+        share = np.where(n > 0, nb / n, 0.0)
+        mean = a['mean'] + delta * share
+        cross = np.where(n > 0, na * nb / n, 0.0)
+        m2 = a['m2'] + b['m2'] + delta ** 2 * cross
+        m3 = (a['m3'] + b['m3'] + delta ** 3 * cross * np.where(n > 0, (na - nb) / n, 0.0)
+              + 3 * delta * np.where(n > 0, (na * b['m2'] - nb * a['m2']) / n, 0.0))
+        m4 = (a['m4'] + b['m4'] + delta ** 4 * cross * np.where(n > 0, (na * na - na * nb + nb * nb) / n ** 2, 0.0)
+              + 6 * delta ** 2 * np.where(n > 0, (na * na * b['m2'] + nb * nb * a['m2']) / n ** 2, 0.0)
+              + 4 * delta * np.where(n > 0, (na * b['m3'] - nb * a['m3']) / n, 0.0))
+    return {'count': n, 'mean': mean, 'm2': m2, 'm3': m3, 'm4': m4,
+            'min': np.fmin(a['min'], b['min']), 'max': np.fmax(a['max'], b['max']), 'nan': a['nan'] + b['nan']}
+
+def _finalize_moments(state):
+    """Среднее, std (ddof=1), асимметрия и эксцесс из состояния — с теми же правилами NaN, что _column_moments."""
+    n = state['count']
+    has_nan = state['nan'] > 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(n > 0, state['mean'], np.nan)
+        m2 = state['m2'] / n
+        std = np.where(n > 1, np.sqrt(state['m2'] / (n - 1)), np.nan)
+        zero = m2 <= (np.finfo(np.float64).resolution * mean) ** 2
+        skew = np.where(zero | has_nan, np.nan, state['m3'] / n / m2 ** 1.5)
+        kurtosis = np.where(zero | has_nan, np.nan, state['m4'] / n / m2 ** 2 - 3.0)
+    return mean, std, skew, kurtosis
+
+def extended_stats_from_chunks(chunks, cols):
+    """
+    get_extended_stats по последовательности кусков DataFrame за один проход: моменты
+    сливаются точно, квартили и медиана — приближённо, по скетчам utils.sketches.
+    """
+    from utils.sketches import QuantileSketch
+    if not cols:
+        return pd.DataFrame()
+    state = None
+    sketches = [QuantileSketch() for _ in cols]
+    for chunk in chunks:
+        block = _numeric_block(chunk, cols)
+        part = _partial_moments(block)
+        state = part if state is None else _merge_moments(state, part)
+        for j, sketch in enumerate(sketches):
+            sketch.update(block[:, j])
+    if state is None:
+        state = _partial_moments(np.empty((0, len(cols))))
+    mean, std, skew, kurtosis = _finalize_moments(state)
+    q1, median, q3 = np.array([sketch.quantiles([0.25, 0.5, 0.75]) for sketch in sketches]).T
+    return _stats_frame(cols, mean, median, state['min'], state['max'], std, q1, q3, skew, kurtosis)
+
+OUTLIER_BLOCK_COLS = 64         # столбцов в одном блоке float64 при поиске выбросов
+OUTLIER_CHUNK_ROWS = 1_000_000  # строк в куске для приближённого (потокового) режима
+
+def _iqr_bounds(q1, q3):
+    iqr = q3 - q1
+    return q1 - 1.5 * iqr, q3 + 1.5 * iqr
+
+def _row_chunks(df, chunk_rows):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+def _outlier_entry(q1, q3, mask, count):
+    lower, upper = _iqr_bounds(q1, q3)
+    return {"count": int(count), "q1": q1, "q3": q3, "lower": lower, "upper": upper,
+            "mask": np.packbits(mask)}
+
+def unpack_outlier_mask(entry, n_rows):
+    """Булева маска выбросов длины n_rows из упакованного представления."""
+    return np.unpackbits(entry["mask"], count=n_rows).astype(bool)
+
+def outliers_from_chunks(make_chunks, cols):
+    """
+    Выбросы по IQR для данных, не помещающихся в память: make_chunks() возвращает
+    новый проход по кускам DataFrame. Первый проход строит скетчи квартилей,
+    второй считает выбросы; маски упаковываются по ходу, без булевых массивов на все строки.
+    """
+    from utils.sketches import column_sketches
+    sketches = column_sketches(make_chunks(), cols)
+    bounds = {col: sketches[col].quantiles([0.25, 0.75]) for col in cols}
+    counts = {col: 0 for col in cols}
+    packed = {col: [] for col in cols}
+    carry = {col: np.zeros(0, dtype=bool) for col in cols}
+    for chunk in make_chunks():
+        for col in cols:
+            lower, upper = _iqr_bounds(*bounds[col])
+            values = chunk[col].to_numpy(dtype='float64', na_value=np.nan)
+            mask = (values < lower) | (values > upper)
+            counts[col] += int(mask.sum())
+            # Упаковываем целыми байтами, остаток (< 8 строк) переносим в следующий кусок
+            pending = np.concatenate([carry[col], mask])
+            cut = len(pending) - len(pending) % 8
+            packed[col].append(np.packbits(pending[:cut]))
+            carry[col] = pending[cut:]
     outliers = {}
-    for col in selected_cols:
-        if pd.api.types.is_numeric_dtype(df[col]):
-            Q1 = df[col].quantile(0.25)
-            Q3 = df[col].quantile(0.75)
-            IQR = Q3 - Q1
-            lower_bound = Q1 - 1.5 * IQR
-            upper_bound = Q3 + 1.5 * IQR
-            outlier_mask = (df[col] < lower_bound) | (df[col] > upper_bound)
-            outliers[col] = df[outlier_mask][col].index.tolist()
+    for col in cols:
+        q1, q3 = bounds[col]
+        lower, upper = _iqr_bounds(q1, q3)
+        outliers[col] = {"count": counts[col], "q1": q1, "q3": q3, "lower": lower, "upper": upper,
+                         "mask": np.concatenate(packed[col] + [np.packbits(carry[col])])}
     return outliers
 
+@profiled("stats")
+def detect_outliers(df, selected_cols=None, return_indices=False, approximate=False,
+                    chunk_rows=OUTLIER_CHUNK_ROWS):
+    """
+    Обнаруживает аномалии в числовых столбцах методом IQR.
+    Для каждого столбца возвращает словарь: count, q1, q3, lower, upper и mask —
+    упакованную битовую маску строк (np.packbits, 1 бит на строку). Списки индексов
+    строятся только при return_indices=True (ключ indices).
+    Точный режим: квартили всех столбцов блока находятся одним np.partition.
+    approximate=True: квартили по сливаемым скетчам (utils.sketches), данные
+    просматриваются кусками по chunk_rows строк без полной копии в float64.
+    """
+    cols = _numeric_columns(df, selected_cols)
+    n_rows = len(df)
+    outliers = {}
+    if approximate:
+        outliers = outliers_from_chunks(lambda: _row_chunks(df, chunk_rows), cols)
+    else:
+        for first in range(0, len(cols), OUTLIER_BLOCK_COLS):
+            block_cols = cols[first:first + OUTLIER_BLOCK_COLS]
+            block = _numeric_block(df, block_cols)
+            q1, q3 = _column_quantiles(block, [0.25, 0.75])
+            lower, upper = _iqr_bounds(q1, q3)
+            with np.errstate(invalid='ignore'):
+                mask = (block < lower) | (block > upper)
+            counts = mask.sum(axis=0)
+            for j, col in enumerate(block_cols):
+                outliers[col] = _outlier_entry(q1[j], q3[j], mask[:, j], counts[j])
+    if return_indices:
+        for entry in outliers.values():
+            entry["indices"] = df.index[unpack_outlier_mask(entry, n_rows)].tolist()
+    return outliers
+
+@profiled("stats")
 def get_correlations(df, method="pearson"):
-    """Возвращает корреляционную матрицу для числовых столбцов."""
+    """Возвращает корреляционную матрицу для числовых столбцов (блочный движок utils.correlation)."""
     numeric_df = df.select_dtypes(include=['number'])
     if len(numeric_df.columns) > 1:
-        return numeric_df.corr(method=method)
-    return None
\ No newline at end of file
+        return correlation_matrix(numeric_df, method=method)
+    return None
+
+# --- Инкрементальное состояние статистики (правки, фильтры, удаление столбцов) ---
+
+def _subtract_moments(total, part):
+    """Обратная операция к _merge_moments: состояние без строк part (формулы Чана/Пебе, решённые относительно a)."""
+    n, nb = total['count'], part['count']
+    na = n - nb
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(na > 0, (n * total['mean'] - nb * part['mean']) / na, 0.0)
+        delta = np.where(na > 0, part['mean'] - mean, 0.0)
+        cross = np.where(n > 0, na * nb / n, 0.0)
+        m2 = np.where(na > 0, np.maximum(total['m2'] - part['m2'] - delta ** 2 * cross, 0.0), 0.0)
+        m3 = np.where(na > 0, total['m3'] - part['m3'] - delta ** 3 * cross * np.where(n > 0, (na - nb) / n, 0.0)
+                      - 3 * delta * np.where(n > 0, (na * part['m2'] - nb * m2) / n, 0.0), 0.0)
+        m4 = np.where(na > 0, total['m4'] - part['m4']
+                      - delta ** 4 * cross * np.where(n > 0, (na * na - na * nb + nb * nb) / n ** 2, 0.0)
+                      - 6 * delta ** 2 * np.where(n > 0, (na * na * part['m2'] + nb * nb * m2) / n ** 2, 0.0)
+                      - 4 * delta * np.where(n > 0, (na * part['m3'] - nb * m3) / n, 0.0), 0.0)
+    # min и max не вычитаются — их восстанавливают по отсортированным значениям
+    return {'count': na, 'mean': mean, 'm2': m2, 'm3': m3, 'm4': m4,
+            'min': total['min'], 'max': total['max'], 'nan': total['nan'] - part['nan']}
+
+def _sorted_quantiles(values, qs):
+    """Квантили отсортированного массива без NaN (линейная интерполяция, как в pandas)."""
+    if not len(values):
+        return np.full(len(qs), np.nan)
+    pos = np.asarray(qs, dtype='float64') * (len(values) - 1)
+    lo = np.floor(pos).astype(np.intp)
+    hi = np.minimum(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+def _sorted_replace(values, removed, added):
+    """Отсортированный массив, из которого удалены значения removed и вставлены added (NaN пропускаются)."""
+    removed = np.sort(removed[~np.isnan(removed)])
+    added = np.sort(added[~np.isnan(added)])
+    if len(removed):
+        # Для повторяющихся значений удаляем разные экземпляры: сдвиг на номер внутри серии
+        run = np.arange(len(removed)) - np.searchsorted(removed, removed, side='left')
+        values = np.delete(values, np.searchsorted(values, removed, side='left') + run)
+    if len(added):
+        values = np.insert(values, np.searchsorted(values, added), added)
+    return values
+
+def _take_moments(state, idx):
+    return {key: value[idx] for key, value in state.items()}
+
+class StatsState:
+    """
+    Сливаемое состояние статистики числовых столбцов одного фрейма: моменты
+    (count, mean, m2..m4), отсортированные значения столбцов (квартили, min/max),
+    суммы для корреляции Пирсона и записи выбросов. Части строятся лениво при первом
+    запросе; apply() переносит построенные части на изменённый фрейм по дельте —
+    за время, пропорциональное числу изменённых строк, а не всей таблицы.
+    Состояние не изменяется на месте: apply() возвращает новое.
+    """
+
+    def __init__(self, df):
+        self.cols = _numeric_columns(df)
+        self.n_rows = len(df)
+        self._moments = None     # состояние _partial_moments по self.cols
+        self._quartiles = None   # массив 3×k: q1, медиана, q3
+        self._sorted = {}        # столбец -> отсортированные значения без NaN
+        self._comoments = None   # (сдвиг, суммы comoment_sums)
+        self._outliers = {}      # столбец -> запись detect_outliers
+
+    def nbytes(self):
+        arrays = list(self._sorted.values())
+        if self._comoments is not None:
+            arrays += [self._comoments[0], *self._comoments[1]]
+        return sum(array.nbytes for array in arrays) + sum(entry["mask"].nbytes for entry in self._outliers.values())
+
+    def _summary(self, df):
+        if self._moments is None:
+            block = _numeric_block(df, self.cols)
+            self._moments = _partial_moments(block)
+            self._quartiles = _column_quantiles(block, [0.25, 0.5, 0.75])
+        return self._moments, self._quartiles
+
+    def extended_stats(self, df, selected_cols=None):
+        """То же, что get_extended_stats(df, selected_cols), из состояния."""
+        cols = _numeric_columns(df, selected_cols)
+        if not cols:
+            return pd.DataFrame()
+        moments, quartiles = self._summary(df)
+        idx = [self.cols.index(col) for col in cols]
+        state = _take_moments(moments, idx)
+        mean, std, skew, kurtosis = _finalize_moments(state)
+        q1, median, q3 = quartiles[:, idx]
+        return _stats_frame(cols, mean, median, state['min'], state['max'], std, q1, q3, skew, kurtosis)
+
+    def outliers(self, df, selected_cols=None):
+        """То же, что detect_outliers(df, selected_cols): квартили берутся из состояния."""
+        _, quartiles = self._summary(df)
+        result = {}
+        for col in _numeric_columns(df, selected_cols):
+            if col not in self._outliers:
+                j = self.cols.index(col)
+                q1, q3 = quartiles[0, j], quartiles[2, j]
+                lower, upper = _iqr_bounds(q1, q3)
+                values = df[col].to_numpy(dtype='float64', na_value=np.nan)
+                with np.errstate(invalid='ignore'):
+                    mask = (values < lower) | (values > upper)
+                self._outliers[col] = _outlier_entry(q1, q3, mask, mask.sum())
+            result[col] = self._outliers[col]
+        return result
+
+    def correlations(self, df):
+        """То же, что get_correlations(df) для метода Пирсона, из накопленных сумм."""
+        from utils.correlation import comoment_shift, comoment_sums, correlation_from_sums
+        if len(self.cols) < 2:
+            return None
+        if self._comoments is None:
+            block = _numeric_block(df, self.cols)
+            shift = comoment_shift(block)
+            self._comoments = (shift, comoment_sums(block, shift))
+        return correlation_from_sums(self._comoments[1], self.cols)
+
+    def top_pairs(self, df, k=20):
+        from utils.correlation import pairs_from_matrix
+        corr = self.correlations(df)
+        if corr is None:
+            return pd.DataFrame(columns=['Столбец 1', 'Столбец 2', 'Корреляция'])
+        return pairs_from_matrix(corr, k)
+
+    @profiled("stats")
+    def apply(self, old_df, new_df, delta):
+        """
+        Состояние для new_df, полученного из old_df (фрейма этого состояния) по дельте:
+        edited — позиции изменённых строк в old_df, deleted — позиции удалённых строк,
+        added — число строк, добавленных в конец, columns — изменённые столбцы
+        (None — неизвестно), reordered — строки переставлены. Удалённые столбцы
+        просто отбрасываются. Возвращает None, если дельта не согласуется с фреймами
+        или появились новые числовые столбцы (тогда статистику нужно считать заново).
+        """
+        edited = np.asarray(delta.get("edited", []), dtype=np.int64)
+        deleted = np.unique(np.asarray(delta.get("deleted", []), dtype=np.int64))
+        added = int(delta.get("added", 0))
+        cols = _numeric_columns(new_df)
+        if len(new_df) != self.n_rows - len(deleted) + added or not set(cols) <= set(self.cols):
+            return None
+        rows_changed = bool(len(deleted) or added or delta.get("reordered"))
+        changed = delta.get("columns")
+        affected = cols if rows_changed or changed is None else [col for col in cols if col in changed]
+        idx = [self.cols.index(col) for col in cols]
+
+        # Строки, уходящие из old_df, и строки, приходящие в new_df
+        edited = np.setdiff1d(edited, deleted)
+        removed_pos = np.concatenate([edited, deleted])
+        added_pos = np.concatenate([edited - np.searchsorted(deleted, edited),
+                                    np.arange(len(new_df) - added, len(new_df))]).astype(np.int64)
+        removed = _numeric_block(old_df.iloc[removed_pos], cols)
+        inserted = _numeric_block(new_df.iloc[added_pos], cols)
+
+        state = StatsState.__new__(StatsState)
+        state.cols, state.n_rows = cols, len(new_df)
+        state._moments, state._quartiles, state._comoments = None, None, None
+        state._sorted, state._outliers = {}, {}
+        touched = np.isin(cols, affected)
+
+        if self._moments is not None:
+            kept = _take_moments(self._moments, idx)
+            updated = _merge_moments(_subtract_moments(kept, _partial_moments(removed)), _partial_moments(inserted))
+            quartiles = self._quartiles[:, idx].copy()
+            for j, col in enumerate(cols):
+                if not touched[j]:
+                    state._sorted[col] = self._sorted[col] if col in self._sorted else None
+                    continue
+                values = self._sorted.get(col)
+                if values is None:
+                    # Первая правка столбца: один раз сортируем его значения
+                    values = old_df[col].to_numpy(dtype='float64', na_value=np.nan)
+                    values = np.sort(values[~np.isnan(values)])
+                values = _sorted_replace(values, removed[:, j], inserted[:, j])
+                state._sorted[col] = values
+                quartiles[:, j] = _sorted_quantiles(values, [0.25, 0.5, 0.75])
+                updated['min'][j] = values[0] if len(values) else np.nan
+                updated['max'][j] = values[-1] if len(values) else np.nan
+            # После вычитания у постоянного столбца (в том числе из одной строки) остаётся
+            # погрешность округления в m2..m4 вместо нуля — обнуляем, иначе асимметрия огромна
+            constant = touched & ~(updated['max'] > updated['min'])
+            for key in ('m2', 'm3', 'm4'):
+                updated[key] = np.where(constant, 0.0, updated[key])
+            state._sorted = {col: values for col, values in state._sorted.items() if values is not None}
+            state._moments = {key: np.where(touched, updated[key], kept[key]) for key in kept}
+            state._quartiles = quartiles
+
+        if self._comoments is not None:
+            from utils.correlation import comoment_sums
+            shift, sums = self._comoments
+            shift = shift[idx]
+            sums = tuple(total[np.ix_(idx, idx)] for total in sums)
+            minus, plus = comoment_sums(removed, shift), comoment_sums(inserted, shift)
+            state._comoments = (shift, tuple(total - old + new for total, old, new in zip(sums, minus, plus)))
+
+        if not rows_changed:
+            # Маски выбросов нетронутых столбцов по-прежнему соответствуют строкам
+            state._outliers = {col: entry for col, entry in self._outliers.items()
+                               if col in cols and col not in affected}
+        return state
+
+_states = ResultCache(max_bytes=512 * 1024 ** 2)
+
+def stats_state(df):
+    """Состояние статистики фрейма (создаётся пустым и наполняется по мере запросов)."""
+    return _states.get_or_compute(dataframe_fingerprint(df), lambda: StatsState(df))
+
+@profiled("stats")
+def record_delta(old_df, new_df, delta):
+    """
+    Сообщает, что new_df получен из old_df правкой (формат дельты — StatsState.apply).
+    Если для old_df уже есть состояние статистики, оно переносится на new_df, и
+    вкладка «Статистика» не пересчитывает всё с нуля. Возвращает True при переносе.
+    """
+    if isinstance(old_df, DiskDataset) or isinstance(new_df, DiskDataset):
+        return False
+    state = _states.get(dataframe_fingerprint(old_df))
+    if state is None:
+        return False
+    new_state = state.apply(old_df, new_df, delta)
+    if new_state is None:
+        return False
+    _states.put(dataframe_fingerprint(new_df), new_state)
+    return True
+
+# --- Оценки по выборке (прогрессивный режим) с доверительными интервалами ---
+
+def _z_value(level):
+    from statistics import NormalDist
+    return NormalDist().inv_cdf(0.5 + level / 2)
+
+def _finite_correction(n, total):
+    """Поправка на конечную совокупность: выборка из всех строк даёт нулевую погрешность."""
+    total = np.maximum(np.asarray(total, dtype='float64'), n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.sqrt(np.where(total > 1, (total - n) / np.maximum(total - 1, 1), 0.0))
+
+def _quantile_margins(block, counts, qs, z):
+    """
+    Полуширины интервалов квантилей по порядковым статистикам выборки
+    (номера границ — из нормального приближения биномиального распределения).
+    """
+    ordered = np.sort(block, axis=0)  # NaN уходят в конец столбца
+    margins = []
+    for q in qs:
+        spread = z * np.sqrt(counts * q * (1 - q))
+        lo = np.clip(np.floor(counts * q - spread), 0, np.maximum(counts - 1, 0)).astype(np.int64)
+        hi = np.clip(np.ceil(counts * q + spread), 0, np.maximum(counts - 1, 0)).astype(np.int64)
+        cols = np.arange(block.shape[1])
+        margins.append(np.where(counts > 0, (ordered[hi, cols] - ordered[lo, cols]) / 2, np.nan))
+    return margins
+
+@profiled("stats")
+def estimated_stats(sample, total_rows, selected_cols=None, level=0.95):
+    """
+    Расширенная статистика по выборке из total_rows строк с полуширинами
+    доверительных интервалов уровня level (столбцы «± ...»). Минимум и максимум
+    выборки — лишь оценки снизу/сверху и интервалов не имеют.
+    """
+    stats = get_extended_stats(sample, selected_cols)
+    if stats.empty:
+        return stats
+    cols = list(stats['Столбец'])
+    block = _numeric_block(sample, cols)
+    counts = (~np.isnan(block)).sum(axis=0)
+    z = _z_value(level)
+    # Строк со значением в столбце во всём наборе — пропорционально доле в выборке
+    correction = _finite_correction(counts, total_rows * counts / max(len(sample), 1))
+    std = stats['Стд. отклонение'].to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Погрешность стандартного отклонения зависит от эксцесса (у нормального — std / sqrt(2n));
+        # эксцесс здесь считается без пропусков, в отличие от столбца «Эксцесс»
+        centered = block - np.nanmean(block, axis=0)
+        squared = centered * centered
+        excess = np.nan_to_num(np.nanmean(squared * squared, axis=0) / np.nanmean(squared, axis=0) ** 2 - 3, nan=0.0)
+        stats['± Среднее'] = z * std / np.sqrt(counts) * correction
+        stats['± Стд. отклонение'] = z * std * np.sqrt(np.maximum(excess + 2, 0) / (4 * counts)) * correction
+    q1, median, q3 = _quantile_margins(block, counts, [0.25, 0.5, 0.75], z)
+    stats['± Медиана'] = median * correction
+    stats['± Q1'] = q1 * correction
+    stats['± Q3'] = q3 * correction
+    return stats
+
+@profiled("stats")
+def estimated_outliers(sample, total_rows, selected_cols=None, level=0.95):
+    """
+    detect_outliers по выборке с пересчётом на total_rows строк: count — оценка
+    числа выбросов во всём наборе, margin — полуширина интервала уровня level,
+    sample_count — выбросы в самой выборке (маска относится к строкам выборки).
+    """
+    outliers = detect_outliers(sample, selected_cols)
+    n = len(sample)
+    if not n:
+        return outliers
+    z = _z_value(level)
+    correction = float(_finite_correction(n, total_rows))
+    for entry in outliers.values():
+        share = entry["count"] / n
+        entry["sample_count"] = entry["count"]
+        entry["count"] = int(round(share * total_rows))
+        entry["margin"] = z * total_rows * np.sqrt(share * (1 - share) / n) * correction
+    return outliers
+
+def _pair_counts(sample, cols):
+    valid = sample[cols].notna().to_numpy(dtype='float64')
+    return valid.T @ valid
+
+@profiled("stats")
+def estimated_correlations(sample, level=0.95):
+    """
+    Корреляция Пирсона по выборке и границы интервалов уровня level
+    (преобразование Фишера, n — число строк, где заданы оба столбца пары).
+    Возвращает (corr, lower, upper) или None, если числовых столбцов меньше двух.
+    """
+    corr = get_correlations(sample)
+    if corr is None:
+        return None
+    counts = _pair_counts(sample, list(corr.columns))
+    spread = _z_value(level) / np.sqrt(np.maximum(counts - 3, 1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        center = np.arctanh(np.clip(corr.to_numpy(), -1 + 1e-12, 1 - 1e-12))
+    lower = pd.DataFrame(np.tanh(center - spread), index=corr.index, columns=corr.columns)
+    upper = pd.DataFrame(np.tanh(center + spread), index=corr.index, columns=corr.columns)
+    return corr, lower, upper
+
+@profiled("stats")
+def estimated_top_pairs(sample, k=20, level=0.95):
+    """Сильнейшие пары по выборке с границами интервалов корреляции."""
+    estimate = estimated_correlations(sample, level)
+    if estimate is None:
+        return pd.DataFrame(columns=['Столбец 1', 'Столбец 2', 'Корреляция', 'Нижняя граница', 'Верхняя граница'])
+    corr, lower, upper = estimate
+    pairs = pairs_from_matrix(corr, k)
+    pairs['Нижняя граница'] = [lower.at[a, b] for a, b in zip(pairs['Столбец 1'], pairs['Столбец 2'])]
+    pairs['Верхняя граница'] = [upper.at[a, b] for a, b in zip(pairs['Столбец 1'], pairs['Столбец 2'])]
+    return pairs
+
+# --- Категориальные столбцы (по словарному индексу utils.categorical) ---
+
+CATEGORICAL_STATS_COLUMNS = ['Столбец', 'Уникальных', 'Пропусков', 'Самое частое', 'Частота', 'Доля (%)', 'Топ значений']
+
+def _categorical_table(index, top_n):
+    rows = []
+    for col, entry in index.columns.items():
+        top = entry.top(top_n)
+        count = top[0][1] if top else 0
+        rows.append({
+            'Столбец': col,
+            'Уникальных': entry.cardinality,
+            'Пропусков': entry.missing,
+            'Самое частое': str(top[0][0]) if top else None,  # столбцы разных типов — строкой для отображения
+            'Частота': count,
+            'Доля (%)': count / index.n_rows * 100 if index.n_rows else np.nan,
+            'Топ значений': ", ".join(f"{value} ({n})" for value, n in top)
+        })
+    return pd.DataFrame(rows, columns=CATEGORICAL_STATS_COLUMNS)
+
+@profiled("stats")
+def categorical_stats(df, index=None, top_n=5):
+    """
+    Кардинальность, число пропусков и самые частые значения нечисловых столбцов.
+    Частоты берутся из словарного индекса (CategoricalIndex) — без value_counts по строкам;
+    без индекса этого фрейма он строится заново, а таблица кэшируется по отпечатку данных.
+    """
+    if index is not None and index.matches(df):
+        return _categorical_table(index, top_n)
+    from utils.categorical import CategoricalIndex
+    key = ("categorical_stats", dataframe_fingerprint(df), top_n)
+    return _results_cache.get_or_compute(key, lambda: _categorical_table(CategoricalIndex(df), top_n))
+
+# --- Кэш результатов вкладки «Статистика» ---
+_results_cache = ResultCache(max_bytes=128 * 1024 ** 2)
+
+def _apply_min_filter(df, filter_col=None, filter_value=None):
+    """Фильтр вкладки «Статистика»: строки, где filter_col >= filter_value."""
+    if filter_col is None or filter_value is None:
+        return df
+    return df[df[filter_col] >= filter_value]
+
+# Те же расчёты для набора данных на диске (utils.dataset): методы сканируют файл по пакетам
+_DISK_METHODS = {
+    "extended_stats": lambda dataset, cols: dataset.extended_stats(cols),
+    "outliers": lambda dataset, cols, return_indices, approximate: dataset.outliers(cols),
+    "correlations": lambda dataset, method: dataset.correlations(method),
+    "top_pairs": lambda dataset, k, method: dataset.top_pairs(k, method)
+}
+
+# Расчёты, которые умеет отдавать StatsState (для корреляций — только метод Пирсона)
+_STATE_METHODS = {
+    "extended_stats": lambda state, df, cols: state.extended_stats(df, cols),
+    "outliers": lambda state, df, cols, return_indices, approximate: (
+        None if return_indices or approximate else state.outliers(df, cols)),
+    "correlations": lambda state, df, method: state.correlations(df) if method == "pearson" else None,
+    "top_pairs": lambda state, df, k, method: state.top_pairs(df, k) if method == "pearson" else None
+}
+
+def _filtered_state(df, filter_col, filter_value):
+    """
+    Фрейм после фильтра, его состояние и ключ состояния. Если отфильтровано меньше
+    половины строк, состояние выводится из состояния всего фрейма удалением отброшенных строк.
+    """
+    state = stats_state(df)
+    if filter_col is None or filter_value is None:
+        return df, state, dataframe_fingerprint(df)
+    keep = (df[filter_col] >= filter_value).to_numpy()
+    filtered = df[keep]
+    key = dataframe_fingerprint(filtered)
+    cached = _states.get(key)
+    if cached is not None:
+        return filtered, cached, key
+    dropped = np.flatnonzero(~keep)
+    derived = state.apply(df, filtered, {"deleted": dropped}) if len(dropped) * 2 <= len(df) else None
+    return filtered, derived if derived is not None else StatsState(filtered), key
+
+def _compute(name, func, df, filter_col, filter_value, args):
+    frame, state, key = _filtered_state(df, filter_col, filter_value)
+    result = _STATE_METHODS[name](state, frame, *args)
+    # Состояние дорастает лениво — сохраняем заново, чтобы кэш знал его текущий размер
+    _states.put(key, state)
+    return result if result is not None else func(frame, *args)
+
+def _cached(name, func, df, filter_col, filter_value, *args):
+    if isinstance(df, DiskDataset):
+        # Фильтр применяется лениво при сканировании, результаты кэширует сам набор
+        if filter_col is not None and filter_value is not None:
+            df = df.where({filter_col: {'min': filter_value, 'max': None}})
+        return _DISK_METHODS[name](df, *args)
+    key = (name, dataframe_fingerprint(df), filter_col, filter_value, args)
+    return _results_cache.get_or_compute(key, lambda: _compute(name, func, df, filter_col, filter_value, args))
+
+@profiled("stats")
+def cached_extended_stats(df, selected_cols=None, filter_col=None, filter_value=None):
+    """get_extended_stats с кэшированием по отпечатку данных, выбору столбцов и фильтру."""
+    cols = tuple(selected_cols) if selected_cols is not None else None
+    return _cached("extended_stats", get_extended_stats, df, filter_col, filter_value, cols)
+
+@profiled("stats")
+def cached_outliers(df, selected_cols=None, filter_col=None, filter_value=None, approximate=False):
+    """detect_outliers (счётчики и маски) с кэшированием по отпечатку данных, выбору столбцов и фильтру."""
+    cols = tuple(selected_cols) if selected_cols is not None else None
+    return _cached("outliers", detect_outliers, df, filter_col, filter_value, cols, False, approximate)
+
+@profiled("stats")
+def cached_correlations(df, method="pearson", filter_col=None, filter_value=None):
+    """get_correlations с кэшированием по отпечатку данных, фильтру и методу."""
+    return _cached("correlations", get_correlations, df, filter_col, filter_value, method)
+
+@profiled("stats")
+def cached_top_pairs(df, k=20, method="pearson", filter_col=None, filter_value=None):
+    """top_correlated_pairs с кэшированием по отпечатку данных, фильтру, k и методу."""
+    return _cached("top_pairs", top_correlated_pairs, df, filter_col, filter_value, k, method)
+
+def get_cache_info():
+    """Счётчики попаданий/промахов и объём кэша статистики."""
+    return _results_cache.info()
+
+def clear_cache():
+    """Очищает кэш статистики и состояния статистики."""
+    _results_cache.clear()
+    _states.clear()
@@ -0,0 +1,205 @@
+import time
+import weakref
+import threading
+from utils.cache import estimate_nbytes
+
+IDLE_SECONDS = 15 * 60              # неиспользуемый набор живёт столько после последнего освобождения
+MAX_IDLE_BYTES = 2 * 1024 ** 3      # и вытесняется раньше, если неиспользуемые наборы в памяти больше
+
+# Виды наборов: фрейм в памяти процесса или файл Arrow IPC на диске (memory map)
+MEMORY, DISK = "memory", "disk"
+
+class Lease:
+    """
+    Ссылка сессии на набор хранилища. Набор не вытесняется, пока на него есть
+    хотя бы одна ссылка; ссылка освобождается release() или при сборке мусора
+    (сессия Streamlit закрылась вместе со своим session_state).
+    """
+
+    def __init__(self, store, key, value, built):
+        self.key = key
+        self.value = value
+        self.built = built  # набор создан этим вызовом, а не взят из хранилища
+        self._finalizer = weakref.finalize(self, store._release, key)
+
+    @property
+    def active(self):
+        return self._finalizer.alive
+
+    def release(self):
+        self._finalizer()
+
+class _Entry:
+    def __init__(self, value, kind, label):
+        self.value = value
+        self.kind = kind
+        self.label = label
+        self.nbytes = _entry_nbytes(value, kind)
+        self.refs = 0
+        self.created = self.last_used = time.time()
+
+def _entry_nbytes(value, kind):
+    if kind == DISK:
+        return value.nbytes_on_disk()
+    return estimate_nbytes(value)
+
+class DatasetStore:
+    """
+    Общее для всех сессий процесса хранилище неизменяемых наборов данных с ключом
+    по содержимому файла: одинаковый файл, открытый в нескольких сессиях, разбирается
+    и хранится один раз. Сессии держат ссылки (Lease) и работают с видами набора —
+    поверхностными копиями фрейма (copy-on-write) или отфильтрованными видами
+    DiskDataset, — а собственные правки хранят сами (История). Набор без ссылок
+    удаляется через idle_seconds или раньше, если неиспользуемые наборы в памяти
+    превышают max_idle_bytes; файл набора на диске при этом удаляется (value.remove()).
+    """
+
+    def __init__(self, idle_seconds=IDLE_SECONDS, max_idle_bytes=MAX_IDLE_BYTES):
+        self.idle_seconds = idle_seconds
+        self.max_idle_bytes = max_idle_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._entries = {}
+        self._building = {}  # ключ -> блокировка: набор строится одной сессией, остальные ждут
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def acquire(self, key, build, kind=MEMORY, label=""):
+        """
+        Ссылка на набор по ключу; если его нет, он создаётся build() (один раз,
+        даже при одновременных запросах из разных сессий). build может вернуть None —
+        тогда и acquire возвращает None, ничего не сохраняя.
+        """
+        self.evict_idle()
+        lease = self._lease(key)
+        if lease is not None:
+            return lease
+        with self._lock:
+            building = self._building.setdefault(key, threading.Lock())
+        with building:
+            lease = self._lease(key)
+            if lease is not None:
+                return lease
+            try:
+                value = build()
+                if value is None:
+                    return None
+                entry = _Entry(value, kind, label)
+                # Запись появляется до снятия блокировки построения: сессия, пришедшая
+                # после, найдёт набор и не вызовет build() повторно
+                with self._lock:
+                    self.misses += 1
+                    entry.refs += 1
+                    self._entries[key] = entry
+            finally:
+                with self._lock:
+                    if self._building.get(key) is building:
+                        del self._building[key]
+        return Lease(self, key, value, built=True)
+
+    def put(self, key, value, kind=MEMORY, label=""):
+        """
+        Кладёт готовый набор. Если под ключом уже есть набор, которым пользуются сессии,
+        возвращается ссылка на него (переданный не сохраняется); неиспользуемый заменяется.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.refs:
+                entry.refs += 1
+                entry.last_used = time.time()
+                self.hits += 1
+                return Lease(self, key, entry.value, built=False)
+            replaced = self._drop([key]) if entry is not None and entry.value is not value else []
+            entry = self._entries[key] = _Entry(value, kind, label)
+            entry.refs += 1
+        for old in replaced:
+            if callable(getattr(old, "remove", None)):
+                old.remove()
+        return Lease(self, key, value, built=True)
+
+    def _lease(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self.hits += 1
+            entry.refs += 1
+            entry.last_used = time.time()
+        return Lease(self, key, entry.value, built=False)
+
+    def _release(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.refs = max(entry.refs - 1, 0)
+                entry.last_used = time.time()
+
+    def _drop(self, keys):
+        """Удаляет записи (под блокировкой) и возвращает их значения для освобождения ресурсов."""
+        values = []
+        for key in keys:
+            entry = self._entries.pop(key)
+            values.append(entry.value)
+            self.evicted += 1
+        return values
+
+    def evict_idle(self, now=None):
+        """Удаляет наборы без ссылок: простаивающие дольше idle_seconds и сверх бюджета памяти."""
+        now = time.time() if now is None else now
+        with self._lock:
+            idle = sorted(((entry.last_used, key) for key, entry in self._entries.items() if not entry.refs),
+                          key=lambda item: item[0])
+            expired = [key for last_used, key in idle if now - last_used >= self.idle_seconds]
+            resident = [key for _, key in idle if key not in expired and self._entries[key].kind == MEMORY]
+            idle_bytes = sum(self._entries[key].nbytes for key in resident)
+            for key in resident:  # сначала самые давно освобождённые
+                if idle_bytes <= self.max_idle_bytes:
+                    break
+                idle_bytes -= self._entries[key].nbytes
+                expired.append(key)
+            values = self._drop(expired)
+        for value in values:
+            if callable(getattr(value, "remove", None)):
+                value.remove()
+        return len(values)
+
+    def clear(self):
+        """Удаляет все наборы без ссылок (используемые сессиями остаются)."""
+        return self.evict_idle(now=float("inf"))
+
+    def stats(self):
+        """Строки для страницы администратора: наборы, их объём, число ссылок и время простоя."""
+        now = time.time()
+        with self._lock:
+            return [{
+                "key": key,
+                "label": entry.label,
+                "kind": entry.kind,
+                "nbytes": entry.nbytes,
+                "refs": entry.refs,
+                "age_s": now - entry.created,
+                "idle_s": 0.0 if entry.refs else now - entry.last_used
+            } for key, entry in self._entries.items()]
+
+    def info(self):
+        """Итоги: число наборов, байты в памяти и на диске, попадания, промахи и вытеснения."""
+        rows = self.stats()
+        return {
+            "entries": len(rows),
+            "in_use": sum(1 for row in rows if row["refs"]),
+            "memory_bytes": sum(row["nbytes"] for row in rows if row["kind"] == MEMORY),
+            "disk_bytes": sum(row["nbytes"] for row in rows if row["kind"] == DISK),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted
+        }
+
+# Единое хранилище процесса (все сессии Streamlit работают в одном процессе)
+_store = DatasetStore()
+
+def get_store():
+    return _store
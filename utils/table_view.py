@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+from utils.profiling import profiled
+
+PAGE_SIZES = [50, 100, 500, 1000]
+
+def page_count(n_rows, page_size):
+    """Число страниц (не меньше одной)."""
+    return max(1, -(-n_rows // page_size))
+
+def page_positions(n_rows, page, page_size, order=None):
+    """Позиции строк страницы page (с 1) в исходном фрейме; order — порядок сортировки просмотра."""
+    start = (page - 1) * page_size
+    stop = min(start + page_size, n_rows)
+    if order is None:
+        return np.arange(start, stop)
+    return np.asarray(order[start:stop])
+
+def _patched_column(series, positions, values):
+    """Новый столбец с заменёнными значениями в позициях; тип расширяется только если значения в него не помещаются."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        new = pd.Index([value for value in values if not pd.isna(value)]).difference(series.cat.categories)
+        if len(new):
+            series = series.cat.add_categories(new)
+    updated = series.copy()
+    try:
+        updated.iloc[positions] = pd.array(values, dtype=series.dtype)
+    except (TypeError, ValueError):
+        updated = series.astype(object)
+        updated.iloc[positions] = values
+        updated = updated.infer_objects()
+    return updated
+
+@profiled("table")
+def apply_patches(df, positions, editor_state):
+    """
+    Применяет правки st.data_editor к фрейму без сравнения таблиц целиком.
+    positions — позиции строк показанной страницы в df; editor_state — состояние
+    виджета (edited_rows, added_rows, deleted_rows), номера строк в нём — позиции на странице.
+    Изменённые ячейки пишутся в неглубокую копию df: благодаря copy-on-write копируются
+    только затронутые столбцы. Возвращает (новый фрейм, изменённые столбцы, описание)
+    или (df, пустое множество, None), если правок нет.
+    """
+    edited = editor_state.get("edited_rows") or {}
+    added = editor_state.get("added_rows") or []
+    deleted = editor_state.get("deleted_rows") or []
+    if not (edited or added or deleted):
+        return df, set(), None
+    patched = df.copy(deep=False)
+    changed = set()
+
+    by_column = {}
+    for row, cells in edited.items():
+        for col, value in cells.items():
+            if col in patched.columns:
+                by_column.setdefault(col, ([], []))
+                by_column[col][0].append(positions[int(row)])
+                by_column[col][1].append(value)
+    for col, (rows, values) in by_column.items():
+        patched[col] = _patched_column(patched[col], np.asarray(rows), values)
+        changed.add(col)
+
+    if deleted:
+        keep = np.ones(len(patched), dtype=bool)
+        keep[positions[np.asarray(deleted, dtype=np.int64)]] = False
+        patched = patched[keep]
+        changed.update(patched.columns)
+    if added:
+        new_rows = pd.DataFrame(added, columns=patched.columns)
+        for col in new_rows.columns:
+            # Приводим к типам таблицы, чтобы склейка не превращала столбцы в object
+            try:
+                new_rows[col] = new_rows[col].astype(patched[col].dtype)
+            except (TypeError, ValueError):
+                pass
+        if isinstance(patched.index, pd.RangeIndex) or pd.api.types.is_integer_dtype(patched.index):
+            start = int(patched.index.max()) + 1 if len(patched) else 0
+            new_rows.index = pd.RangeIndex(start, start + len(new_rows))
+        patched = pd.concat([patched, new_rows])
+        changed.update(patched.columns)
+
+    summary = []
+    if edited:
+        summary.append(f"изменено ячеек: {sum(len(cells) for cells in edited.values())}")
+    if added:
+        summary.append(f"добавлено строк: {len(added)}")
+    if deleted:
+        summary.append(f"удалено строк: {len(deleted)}")
+    return patched, changed, ", ".join(summary)
+
+def patch_delta(positions, editor_state):
+    """
+    Дельта правок st.data_editor для utils.stats.record_delta: позиции изменённых
+    и удалённых строк в исходном фрейме, число добавленных строк и изменённые столбцы.
+    """
+    edited = editor_state.get("edited_rows") or {}
+    return {
+        "edited": [positions[int(row)] for row in edited],
+        "deleted": [positions[int(row)] for row in editor_state.get("deleted_rows") or []],
+        "added": len(editor_state.get("added_rows") or []),
+        "columns": {col for cells in edited.values() for col in cells}
+    }
@@ -0,0 +1,282 @@
+import numpy as np
+import pandas as pd
+from utils.stats import quartiles
+
+AGGREGATE_ROWS = 50_000     # начиная с этого числа строк графики агрегируются на сервере
+MAX_LINE_POINTS = 5_000     # точек линейного графика после прореживания
+DENSITY_BINS = 200          # ячеек по каждой оси у карты плотности
+MAX_CATEGORIES = 50         # столбцов/групп, остальное сводится в «Другие»
+OTHER_LABEL = "Другие"
+
+def should_aggregate(df, aggregate=None):
+    """aggregate=None — решение по числу строк, True/False — принудительно. Данные на диске агрегируются всегда."""
+    if not isinstance(df, pd.DataFrame):
+        return True
+    if aggregate is None:
+        return len(df) > AGGREGATE_ROWS
+    return aggregate
+
+def is_continuous(series):
+    """Числовой (не bool) или datetime столбец — его можно биннить."""
+    return (pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)) \
+        or pd.api.types.is_datetime64_any_dtype(series)
+
+def _as_float(series):
+    """Числовой или datetime столбец как float64 (datetime — наносекунды)."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series.to_numpy(dtype='datetime64[ns]').astype(np.int64).astype('float64')
+        values[series.isna().to_numpy()] = np.nan
+        return values
+    return series.to_numpy(dtype='float64', na_value=np.nan)
+
+def _replace_rare(series, keep):
+    """Значения вне keep заменяются на «Другие»; категориальному столбцу эта категория добавляется."""
+    if isinstance(series.dtype, pd.CategoricalDtype) and OTHER_LABEL not in series.cat.categories:
+        series = series.cat.add_categories([OTHER_LABEL])
+    return series.where(series.isin(keep) | series.isna(), OTHER_LABEL)
+
+def limit_categories(series, max_categories=MAX_CATEGORIES):
+    """Оставляет самые частые max_categories значений, остальные заменяет на «Другие»."""
+    counts = series.value_counts(dropna=True)
+    if len(counts) <= max_categories:
+        return series
+    return _replace_rare(series, counts.index[:max_categories])
+
+def histogram_frame(df, x_col, nbins=None, color_col=None):
+    """
+    Счётчики гистограммы, посчитанные через NumPy. Для числового x возвращает
+    центры бинов, для остальных — число строк по значениям. Столбцы: x_col, 'count'
+    [, color_col] и ширина бина (None для нечисловых).
+    """
+    series = df[x_col]
+    if not is_continuous(series):
+        return count_frame(df, x_col, color_col), None
+    values = _as_float(series)
+    finite = np.isfinite(values)
+    if not finite.any():
+        return pd.DataFrame({x_col: [], 'count': []}), None
+    edges = np.histogram_bin_edges(values[finite], bins=nbins or 50)
+    centers = (edges[:-1] + edges[1:]) / 2
+    if pd.api.types.is_datetime64_any_dtype(series):
+        centers = pd.to_datetime(centers.astype(np.int64))
+    if not color_col:
+        counts, _ = np.histogram(values[finite], bins=edges)
+        return pd.DataFrame({x_col: centers, 'count': counts}), edges[1] - edges[0]
+    groups = limit_categories(df[color_col]).astype(object).where(df[color_col].notna(), "NaN").to_numpy()
+    frames = []
+    for group in pd.unique(groups[finite]):
+        in_group = finite & (groups == group)
+        counts, _ = np.histogram(values[in_group], bins=edges)
+        frames.append(pd.DataFrame({x_col: centers, 'count': counts, color_col: group}))
+    return pd.concat(frames, ignore_index=True), edges[1] - edges[0]
+
+def count_frame(df, x_col, color_col=None):
+    """Число строк по значениям x (и цвету) с ограничением числа категорий."""
+    keys = [x_col] if not color_col or color_col == x_col else [x_col, color_col]
+    data = pd.DataFrame({col: limit_categories(df[col]) for col in keys})
+    counts = data.groupby(keys, dropna=False, observed=True).size().rename('count').reset_index()
+    return counts.sort_values('count', ascending=False, kind='stable').reset_index(drop=True)
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: индексы n_out точек, сохраняющих форму ряда.
+    x должен быть неубывающим, без NaN.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_stop = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[stop:next_stop].mean() if next_stop > stop else x[-1]
+        avg_y = y[stop:next_stop].mean() if next_stop > stop else y[-1]
+        bucket_x, bucket_y = x[start:stop], y[start:stop]
+        area = np.abs((x[prev] - avg_x) * (bucket_y - y[prev]) - (x[prev] - bucket_x) * (avg_y - y[prev]))
+        prev = start + int(np.argmax(area))
+        selected[i + 1] = prev
+    return selected
+
+def minmax_indices(y, n_buckets):
+    """Индексы минимума и максимума в каждом из n_buckets равных отрезков ряда."""
+    n = len(y)
+    if 2 * n_buckets >= n:
+        return np.arange(n)
+    bounds = np.linspace(0, n, n_buckets + 1).astype(np.int64)
+    starts = bounds[:-1]
+    filled = np.where(np.isnan(y), np.inf, y)
+    mins = starts + np.array([np.argmin(filled[a:b]) for a, b in zip(starts, bounds[1:])])
+    filled = np.where(np.isnan(y), -np.inf, y)
+    maxs = starts + np.array([np.argmax(filled[a:b]) for a, b in zip(starts, bounds[1:])])
+    return np.unique(np.concatenate([mins, maxs]))
+
+def decimate_line(df, x_col, y_col, max_points=MAX_LINE_POINTS, method="lttb"):
+    """Прореживает ряд до max_points точек (LTTB или min/max по отрезкам), сортируя по x при необходимости."""
+    data = df[[x_col, y_col]].dropna()
+    x = data[x_col]
+    if (pd.api.types.is_numeric_dtype(x) or pd.api.types.is_datetime64_any_dtype(x)) and not x.is_monotonic_increasing:
+        data = data.sort_values(x_col, kind='stable')
+    y_values = _as_float(data[y_col])
+    if method == "minmax" or not (pd.api.types.is_numeric_dtype(x) or pd.api.types.is_datetime64_any_dtype(x)):
+        positions = minmax_indices(y_values, max_points // 2)
+    else:
+        positions = lttb_indices(_as_float(data[x_col]), y_values, max_points)
+    return data.iloc[positions]
+
+def box_stats(df, cols):
+    """
+    Статистики ящика с усами для каждого числового столбца: квартили считаются
+    одним проходом выбора, усы — крайние значения в пределах 1.5·IQR, как у plotly.
+    """
+    cols, q1, median, q3 = quartiles(df, cols)
+    result = []
+    for i, col in enumerate(cols):
+        values = _as_float(df[col])
+        values = values[~np.isnan(values)]
+        iqr = q3[i] - q1[i]
+        inside = values[(values >= q1[i] - 1.5 * iqr) & (values <= q3[i] + 1.5 * iqr)]
+        result.append({
+            "name": col,
+            "q1": q1[i], "median": median[i], "q3": q3[i],
+            "lowerfence": inside.min() if len(inside) else q1[i],
+            "upperfence": inside.max() if len(inside) else q3[i],
+            "mean": values.mean() if len(values) else np.nan
+        })
+    return result
+
+def density_grid(df, x_col, y_col, bins=DENSITY_BINS):
+    """Двумерная гистограмма (плотность точек) для карты вместо облака точек."""
+    x, y = _as_float(df[x_col]), _as_float(df[y_col])
+    valid = np.isfinite(x) & np.isfinite(y)
+    counts, x_edges, y_edges = np.histogram2d(x[valid], y[valid], bins=bins)
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    return counts.T, x_centers, y_centers
+
+def sample_rows(df, max_rows, seed=0):
+    """Равномерная случайная выборка не более max_rows строк."""
+    if len(df) <= max_rows:
+        return df
+    return df.sample(n=max_rows, random_state=seed)
+
+# --- Те же агрегаты по частям данных (наборы на диске): make_chunks() — новый проход по кускам ---
+
+def _value_counts(chunks, col):
+    counts = None
+    for chunk in chunks:
+        part = chunk[col].value_counts(dropna=True)
+        counts = part if counts is None else counts.add(part, fill_value=0)
+    return counts if counts is not None else pd.Series(dtype='float64')
+
+def _group_labels(series, keep):
+    """Метки групп цвета: частые значения как есть, остальные — «Другие», пропуски — «NaN»."""
+    labels = _replace_rare(series, keep).astype(object)
+    return labels.where(series.notna(), "NaN").to_numpy()
+
+def histogram_from_chunks(make_chunks, meta, x_col, nbins=None, color_col=None):
+    """histogram_frame за два прохода: диапазон (и частоты цвета), затем счётчики по общим бинам."""
+    if not is_continuous(meta[x_col]):
+        return count_frame_from_chunks(make_chunks(), x_col, color_col), None
+    lo, hi, color_counts = np.inf, -np.inf, None
+    for chunk in make_chunks():
+        values = _as_float(chunk[x_col])
+        if np.isfinite(values).any():
+            lo, hi = min(lo, np.nanmin(values)), max(hi, np.nanmax(values))
+        if color_col:
+            part = chunk[color_col].value_counts(dropna=True)
+            color_counts = part if color_counts is None else color_counts.add(part, fill_value=0)
+    if not np.isfinite(lo):
+        return pd.DataFrame({x_col: [], 'count': []}), None
+    edges = np.histogram_bin_edges(np.array([lo, hi]), bins=nbins or 50)
+    centers = (edges[:-1] + edges[1:]) / 2
+    if pd.api.types.is_datetime64_any_dtype(meta[x_col]):
+        centers = pd.to_datetime(centers.astype(np.int64))
+    keep = color_counts.sort_values(ascending=False, kind='stable').index[:MAX_CATEGORIES] if color_col else None
+    totals = {}
+    for chunk in make_chunks():
+        values = _as_float(chunk[x_col])
+        finite = np.isfinite(values)
+        groups = _group_labels(chunk[color_col], keep)[finite] if color_col else np.full(finite.sum(), None)
+        values = values[finite]
+        for group in pd.unique(groups):
+            counts, _ = np.histogram(values[groups == group], bins=edges)
+            totals[group] = totals.get(group, 0) + counts
+    if not color_col:
+        return pd.DataFrame({x_col: centers, 'count': totals.get(None, np.zeros(len(centers), dtype=np.int64))}), edges[1] - edges[0]
+    frames = [pd.DataFrame({x_col: centers, 'count': counts, color_col: group}) for group, counts in totals.items()]
+    return pd.concat(frames, ignore_index=True), edges[1] - edges[0]
+
+def count_frame_from_chunks(chunks, x_col, color_col=None):
+    """count_frame по кускам: частичные счётчики складываются, затем редкие x сводятся в «Другие»."""
+    keys = [x_col] if not color_col or color_col == x_col else [x_col, color_col]
+    total = None
+    for chunk in chunks:
+        part = chunk.groupby(keys, dropna=False, observed=True).size()
+        total = part if total is None else total.add(part, fill_value=0)
+    if total is None:
+        return pd.DataFrame(columns=keys + ['count'])
+    counts = total.rename('count').reset_index()
+    for col in keys:
+        by_value = counts.groupby(col, dropna=True, observed=True)['count'].sum().sort_values(ascending=False, kind='stable')
+        if len(by_value) > MAX_CATEGORIES:
+            counts[col] = _replace_rare(counts[col], by_value.index[:MAX_CATEGORIES])
+    counts = counts.groupby(keys, dropna=False, observed=True)['count'].sum().astype(np.int64).reset_index()
+    return counts.sort_values('count', ascending=False, kind='stable').reset_index(drop=True)
+
+def box_stats_from_stats(make_chunks, stats):
+    """box_stats по готовой статистике (квартили, среднее) и одному проходу для усов."""
+    cols = list(stats['Столбец'])
+    q1, q3 = stats['Q1 (25%)'].to_numpy(), stats['Q3 (75%)'].to_numpy()
+    iqr = q3 - q1
+    lower_limit, upper_limit = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+    low, high = np.full(len(cols), np.inf), np.full(len(cols), -np.inf)
+    for chunk in make_chunks():
+        for j, col in enumerate(cols):
+            values = _as_float(chunk[col])
+            inside = values[(values >= lower_limit[j]) & (values <= upper_limit[j])]
+            if len(inside):
+                low[j], high[j] = min(low[j], inside.min()), max(high[j], inside.max())
+    return [{
+        "name": col, "q1": q1[j], "median": stats['Медиана'].iloc[j], "q3": q3[j],
+        "lowerfence": low[j] if np.isfinite(low[j]) else q1[j],
+        "upperfence": high[j] if np.isfinite(high[j]) else q3[j],
+        "mean": stats['Среднее'].iloc[j]
+    } for j, col in enumerate(cols)]
+
+def density_grid_from_chunks(make_chunks, x_col, y_col, bins=DENSITY_BINS):
+    """density_grid за два прохода: диапазоны осей, затем histogram2d с общими границами."""
+    x_lo = y_lo = np.inf
+    x_hi = y_hi = -np.inf
+    for chunk in make_chunks():
+        x, y = _as_float(chunk[x_col]), _as_float(chunk[y_col])
+        valid = np.isfinite(x) & np.isfinite(y)
+        if valid.any():
+            x_lo, x_hi = min(x_lo, x[valid].min()), max(x_hi, x[valid].max())
+            y_lo, y_hi = min(y_lo, y[valid].min()), max(y_hi, y[valid].max())
+    if not np.isfinite(x_lo):
+        return np.zeros((bins, bins)), np.zeros(bins), np.zeros(bins)
+    x_edges = np.histogram_bin_edges(np.array([x_lo, x_hi]), bins=bins)
+    y_edges = np.histogram_bin_edges(np.array([y_lo, y_hi]), bins=bins)
+    counts = np.zeros((bins, bins))
+    for chunk in make_chunks():
+        x, y = _as_float(chunk[x_col]), _as_float(chunk[y_col])
+        valid = np.isfinite(x) & np.isfinite(y)
+        counts += np.histogram2d(x[valid], y[valid], bins=[x_edges, y_edges])[0]
+    return counts.T, (x_edges[:-1] + x_edges[1:]) / 2, (y_edges[:-1] + y_edges[1:]) / 2
+
+def decimate_line_from_chunks(chunks, total_rows, x_col, y_col, max_points=MAX_LINE_POINTS, method="lttb"):
+    """
+    Прореживание ряда в два этапа: каждый кусок сокращается min/max-прореживанием
+    пропорционально своей доле строк, затем decimate_line по объединённым точкам.
+    """
+    pieces = []
+    for chunk in chunks:
+        budget = max(2, int(4 * max_points * len(chunk) / max(total_rows, 1)))
+        data = chunk[[x_col, y_col]].dropna()
+        pieces.append(data.iloc[minmax_indices(_as_float(data[y_col]), budget // 2)])
+    if not pieces:
+        return pd.DataFrame(columns=[x_col, y_col])
+    return decimate_line(pd.concat(pieces), x_col, y_col, max_points, method)
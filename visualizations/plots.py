@@ -1,31 +1,134 @@
+import numpy as np
+import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
+from visualizations.aggregation import (
+    should_aggregate, histogram_frame, count_frame, decimate_line, box_stats,
+    density_grid, sample_rows, is_continuous, MAX_LINE_POINTS
+)
+from visualizations.trendline import compute_trendlines, SAMPLE_SIZE
+from utils.dataset import DiskDataset
+from utils.profiling import profiled
 
-def plot_histogram(df, x_col, nbins=None, color_col=None, title=None):
-    """Создает гистограмму для указанного столбца."""
-    fig = px.histogram(df, x=x_col, nbins=nbins, color=color_col if color_col else None, title=title or f"Гистограмма: {x_col}")
+MAX_SCATTER_POINTS = 20_000  # точек на точечной диаграмме с цветом в агрегированном режиме
+
+def _aggregated_title(title, df):
+    return f"{title} (агрегировано на сервере, {len(df):,} строк)"
+
+def _aggregate(func, df, *args, **kwargs):
+    """Агрегат по DataFrame (функция aggregation) или по набору на диске (одноимённый метод, сканирование по пакетам)."""
+    if isinstance(df, DiskDataset):
+        return getattr(df, func.__name__)(*args, **kwargs)
+    return func(df, *args, **kwargs)
+
+def _meta(df):
+    """Фрейм для проверки типов столбцов: сам DataFrame или пустой фрейм со схемой набора на диске."""
+    return df.meta if isinstance(df, DiskDataset) else df
+
+@profiled("plot")
+def plot_histogram(df, x_col, nbins=None, color_col=None, title=None, aggregate=None):
+    """Создает гистограмму для указанного столбца (на больших данных бины считаются на сервере)."""
+    title = title or f"Гистограмма: {x_col}"
+    if not should_aggregate(df, aggregate):
+        fig = px.histogram(df, x=x_col, nbins=nbins, color=color_col if color_col else None, title=title)
+    else:
+        counts, width = _aggregate(histogram_frame, df, x_col, nbins=nbins, color_col=color_col)
+        fig = px.bar(counts, x=x_col, y='count', color=color_col if color_col else None, title=_aggregated_title(title, df))
+        if width is not None:
+            fig.update_traces(width=width)
+            fig.update_layout(bargap=0)
     fig.update_layout(showlegend=True)
     return fig
 
-def plot_boxplot(df, y_cols, title=None):
-    """Создает ящик с усами для указанных столбцов."""
-    fig = px.box(df, y=y_cols, title=title or "Ящик с усами")
+@profiled("plot")
+def plot_boxplot(df, y_cols, title=None, aggregate=None):
+    """Создает ящик с усами для указанных столбцов (на больших данных — по заранее посчитанным квартилям)."""
+    title = title or "Ящик с усами"
+    if not should_aggregate(df, aggregate):
+        fig = px.box(df, y=y_cols, title=title)
+    else:
+        fig = go.Figure()
+        for stats in _aggregate(box_stats, df, list(y_cols)):
+            fig.add_trace(go.Box(
+                name=str(stats["name"]), x=[str(stats["name"])],
+                q1=[stats["q1"]], median=[stats["median"]], q3=[stats["q3"]],
+                lowerfence=[stats["lowerfence"]], upperfence=[stats["upperfence"]], mean=[stats["mean"]]
+            ))
+        fig.update_layout(title=_aggregated_title(title, df))
     fig.update_layout(showlegend=True)
     return fig
 
-def plot_scatter(df, x_col, y_col, color_col=None, title=None):
-    """Создает точечную диаграмму с опциональной регрессионной линией."""
-    fig = px.scatter(df, x=x_col, y=y_col, color=color_col if color_col else None, trendline="ols", title=title or f"Точечная диаграмма: {x_col} vs {y_col}")
+def _add_trendlines(fig, df, x_col, y_col, color_col, trendline, sample, show_band):
+    """Добавляет линии тренда (и доверительные полосы) цветом соответствующей группы."""
+    colors = {trace.name: trace.marker.color for trace in fig.data if isinstance(trace, (go.Scatter, go.Scattergl))}
+    # Числовой цвет plotly рисует непрерывной шкалой — тогда линия тренда одна на все точки
+    group_col = color_col if color_col and not pd.api.types.is_numeric_dtype(df[color_col]) else None
+    for fit in compute_trendlines(df, x_col, y_col, group_col, trendline, sample):
+        name = fit["name"]
+        color = colors.get(name) if name is not None else None
+        label = "Тренд" + (f" ({name})" if name is not None else "")
+        if show_band and "lower" in fit:
+            fig.add_trace(go.Scatter(
+                x=np.concatenate([fit["x"], fit["x"][::-1]]), y=np.concatenate([fit["upper"], fit["lower"][::-1]]),
+                fill="toself", mode="lines", line={"width": 0, "color": color}, opacity=0.2,
+                name=f"95% ДИ{f' ({name})' if name is not None else ''}", hoverinfo="skip"
+            ))
+        fig.add_trace(go.Scatter(x=fit["x"], y=fit["y"], mode="lines", name=label, line={"color": color}))
+
+@profiled("plot")
+def plot_scatter(df, x_col, y_col, color_col=None, title=None, aggregate=None,
+                 trendline="linear", trend_sample=False, show_band=False):
+    """
+    Создает точечную диаграмму с опциональной линией тренда: trendline "off", "linear"
+    (МНК по замкнутой формуле, по всем данным или по выборке) или "lowess" (по выборке).
+    На больших данных без цвета строится карта плотности, с цветом — выборка точек.
+    """
+    title = title or f"Точечная диаграмма: {x_col} vs {y_col}"
+    if not should_aggregate(df, aggregate):
+        fig = px.scatter(df, x=x_col, y=y_col, color=color_col if color_col else None, title=title)
+    elif color_col or not (is_continuous(_meta(df)[x_col]) and is_continuous(_meta(df)[y_col])):
+        fig = px.scatter(_aggregate(sample_rows, df, MAX_SCATTER_POINTS), x=x_col, y=y_col, color=color_col if color_col else None,
+                         title=_aggregated_title(title, df))
+    else:
+        counts, x_centers, y_centers = _aggregate(density_grid, df, x_col, y_col)
+        fig = go.Figure(go.Heatmap(
+            x=x_centers, y=y_centers, z=np.where(counts > 0, counts, np.nan),
+            colorscale="Viridis", colorbar={"title": "Точек"}
+        ))
+        fig.update_layout(title=_aggregated_title(title, df), xaxis_title=x_col, yaxis_title=y_col)
+    # Для данных на диске тренд оценивается по выборке строк
+    trend_df = df.sample_rows(10 * SAMPLE_SIZE, columns=[x_col, y_col, color_col]) if isinstance(df, DiskDataset) else df
+    _add_trendlines(fig, trend_df, x_col, y_col, color_col, trendline, trend_sample, show_band)
     fig.update_layout(showlegend=True)
     return fig
 
-def plot_line(df, x_col, y_col, title=None):
-    """Создает линейный график."""
-    fig = px.line(df, x=x_col, y=y_col, title=title or f"Линейный график: {x_col} vs {y_col}")
+@profiled("plot")
+def plot_line(df, x_col, y_col, title=None, aggregate=None, max_points=MAX_LINE_POINTS, method="lttb"):
+    """Создает линейный график (на больших данных ряд прореживается LTTB или min/max)."""
+    title = title or f"Линейный график: {x_col} vs {y_col}"
+    if not should_aggregate(df, aggregate):
+        fig = px.line(df, x=x_col, y=y_col, title=title)
+    else:
+        fig = px.line(_aggregate(decimate_line, df, x_col, y_col, max_points, method), x=x_col, y=y_col,
+                      title=_aggregated_title(title, df))
     fig.update_layout(showlegend=True)
     return fig
 
-def plot_bar(df, x_col, color_col=None, title=None):
-    """Создает столбчатую диаграмму."""
-    fig = px.bar(df, x=x_col, color=color_col if color_col else None, title=title or f"Столбчатая диаграмма: {x_col}")
+@profiled("plot")
+def plot_bar(df, x_col, color_col=None, title=None, aggregate=None):
+    """Создает столбчатую диаграмму (на больших данных — по числу строк на значение)."""
+    title = title or f"Столбчатая диаграмма: {x_col}"
+    if not should_aggregate(df, aggregate):
+        fig = px.bar(df, x=x_col, color=color_col if color_col else None, title=title)
+    else:
+        counts = _aggregate(count_frame, df, x_col, color_col)
+        fig = px.bar(counts, x=x_col, y='count', color=color_col if color_col and color_col != x_col else None,
+                     title=_aggregated_title(title, df))
     fig.update_layout(showlegend=True)
-    return fig
\ No newline at end of file
+    return fig
+
+def mark_estimate(fig, sample_rows, total_rows):
+    """Подписывает график, построенный по выборке (прогрессивный режим): n из N строк."""
+    title = fig.layout.title.text or ""
+    fig.update_layout(title=f"{title} (оценка по выборке {sample_rows:,} из {total_rows:,} строк)")
+    return fig
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+from utils.cache import ResultCache, dataframe_fingerprint
+
+# Подпись в интерфейсе -> режим линии тренда
+TRENDLINE_MODES = {"Нет": "off", "Линейная (МНК)": "linear", "LOWESS по выборке": "lowess"}
+SAMPLE_SIZE = 10_000   # строк в стратифицированной выборке
+BAND_POINTS = 50       # точек на линии с доверительной полосой
+
+_trend_cache = ResultCache(max_bytes=32 * 1024 ** 2)
+
+def _xy_groups(df, x_col, y_col, color_col=None):
+    """Числовые x, y без пропусков и коды групп по цвету (одна группа, если цвета нет)."""
+    x = df[x_col].to_numpy(dtype='float64', na_value=np.nan)
+    y = df[y_col].to_numpy(dtype='float64', na_value=np.nan)
+    valid = np.isfinite(x) & np.isfinite(y)
+    if color_col:
+        codes, groups = pd.factorize(df[color_col], use_na_sentinel=True)
+        valid &= codes >= 0
+        groups = [str(group) for group in groups]
+    else:
+        codes, groups = np.zeros(len(df), dtype=np.int64), [None]
+    return x[valid], y[valid], codes[valid], groups
+
+def stratified_sample(df, color_col=None, size=SAMPLE_SIZE, seed=0):
+    """Выборка около size строк с сохранением долей групп по color_col."""
+    if len(df) <= size:
+        return df
+    if not color_col:
+        return df.sample(n=size, random_state=seed)
+    return df.groupby(color_col, observed=True).sample(frac=size / len(df), random_state=seed)
+
+def _t_quantile(dof, level):
+    """Квантиль Стьюдента; scipy подгружается только здесь, для больших выборок — нормальное приближение."""
+    if dof >= 200:
+        from statistics import NormalDist
+        return NormalDist().inv_cdf(0.5 + level / 2)
+    from scipy import stats
+    return float(stats.t.ppf(0.5 + level / 2, dof))
+
+def fit_linear(x, y, codes, n_groups, level=0.95):
+    """
+    МНК по замкнутой формуле для всех групп сразу: суммы по группам через bincount
+    (данные предварительно центрируются для устойчивости). Возвращает список словарей
+    с наклоном, сдвигом и линией с доверительной полосой для среднего отклика.
+    """
+    x_shift, y_shift = x.mean(), y.mean()
+    xc, yc = x - x_shift, y - y_shift
+    n = np.bincount(codes, minlength=n_groups).astype('float64')
+    sx = np.bincount(codes, weights=xc, minlength=n_groups)
+    sy = np.bincount(codes, weights=yc, minlength=n_groups)
+    sxx = np.bincount(codes, weights=xc * xc, minlength=n_groups)
+    sxy = np.bincount(codes, weights=xc * yc, minlength=n_groups)
+    syy = np.bincount(codes, weights=yc * yc, minlength=n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mx, my = sx / n, sy / n
+        cxx, cxy, cyy = sxx - n * mx * mx, sxy - n * mx * my, syy - n * my * my
+        slope = cxy / cxx
+        intercept = (my + y_shift) - slope * (mx + x_shift)
+        residual_var = np.maximum(cyy - slope * cxy, 0.0) / (n - 2)
+    x_min = np.full(n_groups, np.inf)
+    x_max = np.full(n_groups, -np.inf)
+    np.minimum.at(x_min, codes, x)
+    np.maximum.at(x_max, codes, x)
+
+    fits = []
+    for g in range(n_groups):
+        if n[g] < 3 or not np.isfinite(slope[g]) or cxx[g] <= 0:
+            continue
+        line_x = np.linspace(x_min[g], x_max[g], BAND_POINTS)
+        line_y = intercept[g] + slope[g] * line_x
+        half = _t_quantile(n[g] - 2, level) * np.sqrt(
+            residual_var[g] * (1 / n[g] + (line_x - (mx[g] + x_shift)) ** 2 / cxx[g])
+        )
+        fits.append({
+            "group": g, "n": int(n[g]), "slope": slope[g], "intercept": intercept[g],
+            "x": line_x, "y": line_y, "lower": line_y - half, "upper": line_y + half
+        })
+    return fits
+
+def fit_lowess(x, y, codes, n_groups, frac=0.3):
+    """LOWESS по каждой группе (statsmodels подгружается только в этом режиме)."""
+    from statsmodels.nonparametric.smoothers_lowess import lowess
+    fits = []
+    for g in range(n_groups):
+        in_group = codes == g
+        if in_group.sum() < 3:
+            continue
+        smoothed = lowess(y[in_group], x[in_group], frac=frac, return_sorted=True)
+        fits.append({"group": g, "n": int(in_group.sum()), "x": smoothed[:, 0], "y": smoothed[:, 1]})
+    return fits
+
+def compute_trendlines(df, x_col, y_col, color_col=None, mode="linear", sample=False, level=0.95):
+    """
+    Линии тренда для точечной диаграммы, кэшируются по (данные, x, y, цвет, режим, выборка).
+    mode: "linear" — МНК по всем данным (или по стратифицированной выборке при sample=True),
+    "lowess" — LOWESS всегда по выборке. Возвращает список словарей с подписью группы.
+    """
+    if mode == "off" or df[x_col].dtype.kind not in "biuf" or df[y_col].dtype.kind not in "biuf":
+        return []
+    key = (dataframe_fingerprint(df), x_col, y_col, color_col, mode, sample, level)
+
+    def compute():
+        data = stratified_sample(df, color_col) if (sample or mode == "lowess") else df
+        x, y, codes, groups = _xy_groups(data, x_col, y_col, color_col)
+        if not len(x):
+            return []
+        fits = fit_lowess(x, y, codes, len(groups)) if mode == "lowess" else fit_linear(x, y, codes, len(groups), level)
+        for fit in fits:
+            fit["name"] = groups[fit["group"]]
+        return fits
+
+    return _trend_cache.get_or_compute(key, compute)
+
+def ols_summary(df, x_col, y_col, sample=True):
+    """Полная диагностика OLS из statsmodels (по выборке) — только по явному запросу."""
+    import statsmodels.api as sm
+    data = (stratified_sample(df) if sample else df)[[x_col, y_col]].dropna()
+    model = sm.OLS(data[y_col].astype('float64'), sm.add_constant(data[x_col].astype('float64'))).fit()
+    return model.summary().as_text()